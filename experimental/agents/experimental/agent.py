@@ -8,6 +8,7 @@ from langgraph.store.memory import InMemoryStore
 from experimental.utilities.models import select_model
 from experimental.agents.experimental.tooling import tools
 from experimental.agents.experimental.prompt import AGENT_SYSTEM_PROMPT
+from experimental.agents.utils.agent_utils import TableauAgentState
 
 
 """
@@ -45,6 +46,7 @@ else:
 analytics_agent = create_react_agent(
     model=llm,
     tools=tools,
+    state_schema=TableauAgentState,
     debug=debugging,
     prompt=AGENT_SYSTEM_PROMPT
 )
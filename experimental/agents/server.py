@@ -0,0 +1,258 @@
+"""
+Self-hosted HTTP endpoint for the analytics agents, streaming tokens and tool events as Server-Sent Events.
+
+    pip install ".[server]"
+    uvicorn experimental.agents.server:app --host 0.0.0.0 --port 8080
+
+    curl -N -X POST localhost:8080/agents/superstore/stream -H 'Content-Type: application/json' -d '{
+        "user_message": "sales by region",
+        "agent_inputs": {
+            "tableau_credentials": {"session": "...", "site": "..."},
+            "datasource": {"luid": "..."}
+        }
+    }'
+
+Requests use the same contract as `stream_graph_updates` (see `agent_input`). Each response is a stream
+of `token`, `tool_start`, `tool_end` and `message` events (see `_agent_events`) closed by `done`, or
+`error`. Comment lines are sent while tools run so proxies keep idle connections open.
+
+Callers that do not authenticate run queries with the Tableau `session` they send, obtained by their own
+sign-in, against the configured TABLEAU_DOMAIN: their `url` is dropped so they cannot point the server at
+other hosts. A `user` to sign in as through the Connected App is only honoured for trusted callers sending
+`Authorization: Bearer <AGENT_API_KEY>`, such as the backend of a client app that authenticated its users.
+Requests without a session from other callers are rejected with 401 since they would run as the service
+user or as any user they name, bypassing row-level security.
+
+Runs are limited to AGENT_MAX_CONCURRENT_RUNS at once with at most AGENT_MAX_QUEUED_RUNS waiting,
+further requests are rejected immediately with 503 rather than piling up. Events of a run go through a
+bounded buffer, a slow client pauses its run instead of growing memory.
+"""
+import os
+import hmac
+import json
+import asyncio
+import importlib
+from typing import Any, Dict, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from experimental.agents.utils.agent_utils import agent_input, astream_agent_events
+
+
+# agents served by default, loaded on first use since importing one initializes its models and tools
+AGENTS = {
+    "experimental": "experimental.agents.experimental.agent:analytics_agent",
+    "superstore": "experimental.agents.superstore.agent:analytics_agent",
+    "keynote": "experimental.agents.keynote.agent:analytics_agent",
+}
+
+# marks the end of a run in its event buffer
+_END = object()
+
+
+def sse(event: str, data: Any) -> bytes:
+    """One Server-Sent Event, data is JSON on a single line"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str, separators=(',', ':'))}\n\n".encode("utf-8")
+
+
+class AgentServer:
+    """
+    Holds the agent graphs and run admission state of one process.
+
+    Args:
+        graphs (Optional[Dict[str, Any]]): Compiled graphs or "module:attribute" paths by name, defaults to `AGENTS`.
+            Any LangGraph graph accepting the `TableauAgentState` input can be served, such as one wired
+            to a local VDS endpoint for benchmarks.
+        max_concurrent_runs (int): Agent runs executing at once.
+        max_queued_runs (int): Runs waiting for a slot before new requests are rejected.
+        buffer_size (int): Events buffered per run ahead of a slow client.
+        keep_alive (float): Seconds without events after which a keep-alive comment is sent.
+        api_key (Optional[str]): Bearer token of trusted callers allowed to name the Tableau `user` to run
+            as. Without one, every request must carry its own Tableau `session`.
+    """
+
+    def __init__(
+        self,
+        graphs: Optional[Dict[str, Any]] = None,
+        max_concurrent_runs: int = int(os.getenv("AGENT_MAX_CONCURRENT_RUNS", 32)),
+        max_queued_runs: int = int(os.getenv("AGENT_MAX_QUEUED_RUNS", 128)),
+        buffer_size: int = 256,
+        keep_alive: float = 15.0,
+        api_key: Optional[str] = os.getenv("AGENT_API_KEY")
+    ):
+        self.graphs = dict(graphs or AGENTS)
+        self.max_concurrent_runs = max_concurrent_runs
+        self.max_queued_runs = max_queued_runs
+        self.buffer_size = buffer_size
+        self.keep_alive = keep_alive
+        self.api_key = api_key
+        self.admitted = 0
+        self.running = 0
+        self.rejected = 0
+        self.completed = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def graph(self, name: str):
+        graph = self.graphs[name]
+        if isinstance(graph, str):
+            module, attribute = graph.split(":")
+            graph = getattr(importlib.import_module(module), attribute)
+            self.graphs[name] = graph
+        return graph
+
+    def trusted(self, request: Request) -> bool:
+        """Whether the caller sent the server's API key and may choose the Tableau user to run as"""
+        if not self.api_key:
+            return False
+        header = request.headers.get("authorization", "")
+        return hmac.compare_digest(header.encode("utf-8"), f"Bearer {self.api_key}".encode("utf-8"))
+
+    @property
+    def queued(self) -> int:
+        """Admitted runs waiting for a slot"""
+        return self.admitted - self.running
+
+    def admit(self) -> bool:
+        """Reserves a place for a run until `release`, False when every running and queued place is taken"""
+        if self._slots is None:
+            # created lazily so it binds to the server's event loop
+            self._slots = asyncio.Semaphore(self.max_concurrent_runs)
+        if self.admitted >= self.max_concurrent_runs + self.max_queued_runs:
+            self.rejected += 1
+            return False
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        """Frees the place reserved by `admit`, once per admitted request"""
+        self.admitted -= 1
+        self.completed += 1
+
+    async def _produce(self, graph, input_stream: dict, config: dict, buffer: asyncio.Queue) -> None:
+        try:
+            async for event in astream_agent_events(graph, input_stream, config=config):
+                # waits while the buffer is full: a slow client pauses the run
+                await buffer.put(sse(event["event"], event))
+            await buffer.put(sse("done", {}))
+        except Exception as e:
+            await buffer.put(sse("error", {"error": str(e)}))
+        await buffer.put(_END)
+
+    async def run(self, graph, input_stream: dict, config: dict, request: Request):
+        """Admitted run: waits for a slot, then streams the agent's events"""
+        await self._slots.acquire()
+        self.running += 1
+
+        buffer: asyncio.Queue = asyncio.Queue(maxsize=self.buffer_size)
+        producer = asyncio.create_task(self._produce(graph, input_stream, config, buffer))
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(buffer.get(), timeout=self.keep_alive)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield b": keep-alive\n\n"
+                    continue
+                if item is _END:
+                    break
+                yield item
+        finally:
+            # client went away or the run finished, stop the agent either way
+            producer.cancel()
+            self.running -= 1
+            self._slots.release()
+
+
+class RunResponse(StreamingResponse):
+    """
+    Streams a run and releases its admission once the response ends, including when the client
+    disconnects before the run started and its generator never ran
+    """
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self.release = release
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                await self.body_iterator.aclose()
+            finally:
+                self.release()
+
+
+server = AgentServer()
+
+
+async def stream(request: Request):
+    name = request.path_params["agent"]
+    if name not in server.graphs:
+        return JSONResponse({"error": f"Unknown agent '{name}'", "agents": list(server.graphs)}, status_code=404)
+
+    try:
+        body = await request.json()
+        input_stream = agent_input(body)
+    except (ValueError, KeyError, TypeError) as e:
+        return JSONResponse(
+            {"error": f"Expected {{'user_message': str, 'agent_inputs': {{'tableau_credentials': {{}}, 'datasource': {{}}}}}}: {e}"},
+            status_code=400
+        )
+
+    tableau_credentials = input_stream["tableau_credentials"] or {}
+    if not server.trusted(request):
+        if not tableau_credentials.get("session"):
+            return JSONResponse(
+                {"error": "Send a Tableau session in tableau_credentials, or authenticate with the server's API key to run as a user"},
+                status_code=401,
+                headers={"WWW-Authenticate": "Bearer"}
+            )
+        # untrusted callers only ever run as the owner of the session they sent, on the configured server
+        input_stream["tableau_credentials"] = {
+            k: v for k, v in tableau_credentials.items() if k not in ("user", "url")
+        }
+
+    if not server.admit():
+        return JSONResponse({"error": "Too many agent runs in progress"}, status_code=503, headers={"Retry-After": "1"})
+
+    try:
+        config = {"configurable": {"thread_id": body.get("thread_id")}} if body.get("thread_id") else {}
+        return RunResponse(
+            server.run(server.graph(name), input_stream, config, request),
+            release=server.release,
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "Connection": "keep-alive",
+                # disables response buffering in nginx so tokens reach clients immediately
+                "X-Accel-Buffering": "no",
+            }
+        )
+    except BaseException:
+        # the response will never be sent, e.g. the agent failed to import
+        server.release()
+        raise
+
+
+async def health(request: Request):
+    return JSONResponse({
+        "status": "ok",
+        "agents": list(server.graphs),
+        "running": server.running,
+        "queued": server.queued,
+        "rejected": server.rejected,
+        "completed": server.completed,
+        "max_concurrent_runs": server.max_concurrent_runs,
+        "max_queued_runs": server.max_queued_runs,
+    })
+
+
+app = Starlette(routes=[
+    Route("/agents/{agent}/stream", stream, methods=["POST"]),
+    Route("/health", health, methods=["GET"]),
+])
@@ -1,8 +1,23 @@
 
 import os
 import json
+from typing import Any, AsyncIterator, Iterator, List, Optional
 
 from IPython.display import Image, display
+from langgraph.prebuilt.chat_agent_executor import AgentState
+
+
+class TableauAgentState(AgentState):
+    """
+    Agent graph state extended with the operating parameters client apps send alongside user messages
+    (see `stream_graph_updates`). Tools read these via `InjectedState` to act on behalf of the end user.
+
+    tableau_credentials: {"session": str, "url": str, "site": str, "user": str}, a `session` token is used
+    as is, otherwise tools obtain a session for `user` through a Connected App session pool
+    datasource: {"luid": str, "name": str, "description": str}
+    """
+    tableau_credentials: dict
+    datasource: dict
 
 
 def _visualize_graph(graph):
@@ -29,22 +44,97 @@ def _visualize_graph(graph):
         print(f"Failed to generate PNG: {str(e)}")
 
 
+def agent_input(message: dict) -> dict:
+    """
+    Builds the graph input from a client message: {"user_message": str, "agent_inputs":
+    {"tableau_credentials": dict, "datasource": dict}}, see `TableauAgentState`
+    """
+    message_string = json.dumps(message['user_message'])
+
+    tableau_credentials = message['agent_inputs']['tableau_credentials']
+    datasource = message['agent_inputs']['datasource']
+
+    # this is how client apps should format their requests to the Agent API
+    return {
+        "messages": [("user", message_string)],
+        "tableau_credentials": tableau_credentials,
+        "datasource": datasource
+    }
+
+
+def _text(content: Any) -> str:
+    """Text of a message content, which some providers send as a list of typed blocks"""
+    if isinstance(content, str):
+        return content
+    return "".join(
+        block.get("text", "") if isinstance(block, dict) else str(block)
+        for block in content or []
+        if not isinstance(block, dict) or block.get("type") == "text"
+    )
+
+
+def _agent_events(mode: str, chunk: Any) -> List[dict]:
+    """
+    Translates one item of `graph.stream(..., stream_mode=["messages", "updates"])` into client events:
+
+    - {"event": "token", "content"}: a piece of the agent's answer as the model generates it
+    - {"event": "tool_start", "id", "name", "args"}: the agent called a tool
+    - {"event": "tool_end", "id", "name", "content", "status"}: a tool returned
+    - {"event": "message", "content"}: the agent's complete answer for this turn
+
+    Tokens of models running inside tools (such as the query writer) are not forwarded.
+    """
+    if mode == "messages":
+        message_chunk, metadata = chunk
+        content = _text(message_chunk.content)
+        if metadata.get("langgraph_node") == "agent" and content:
+            return [{"event": "token", "content": content}]
+        return []
+
+    events = []
+    for node, update in (chunk or {}).items():
+        for message in (update or {}).get("messages", []) if isinstance(update, dict) else []:
+            if node == "agent":
+                tool_calls = getattr(message, "tool_calls", None) or []
+                for call in tool_calls:
+                    events.append({"event": "tool_start", "id": call.get("id"), "name": call["name"], "args": call.get("args")})
+                if not tool_calls and _text(message.content):
+                    events.append({"event": "message", "content": _text(message.content)})
+            elif node == "tools":
+                events.append({
+                    "event": "tool_end",
+                    "id": getattr(message, "tool_call_id", None),
+                    "name": getattr(message, "name", None),
+                    "content": _text(message.content),
+                    "status": getattr(message, "status", None)
+                })
+    return events
+
+
+async def astream_agent_events(graph, input_stream: dict, config: Optional[dict] = None) -> AsyncIterator[dict]:
+    """Streams tokens and tool events of an agent run, see `_agent_events` for the event shapes"""
+    async for mode, chunk in graph.astream(input_stream, config=config, stream_mode=["messages", "updates"]):
+        for event in _agent_events(mode, chunk):
+            yield event
+
+
+def stream_agent_events(graph, input_stream: dict, config: Optional[dict] = None) -> Iterator[dict]:
+    """Synchronous `astream_agent_events`, for clients such as Streamlit"""
+    for mode, chunk in graph.stream(input_stream, config=config, stream_mode=["messages", "updates"]):
+        yield from _agent_events(mode, chunk)
+
+
 async def stream_graph_updates(message: dict, graph):
     """
     This function streams responses from Agents to clients, such as chat interfaces, by processing
     user inputs and dynamically updating the conversation.
 
-    The function takes a string input from the user and passes it to the state graph's streaming interface.
-    It initiates a stream of events based on the provided user input, which is wrapped in a dictionary with
-    a key "messages" containing a tuple of the user role and content.
-
-    As each event is generated by the graph, the function iterates over the values returned. Within each event,
-    it specifically looks for messages associated with the 'messages' key. The function extracts and prints the
-    content of the last message in the sequence, which is assumed to be the assistant's most recent response.
-    This enables a real-time conversation-like interaction where responses are generated and displayed immediately
-    based on user input.
+    The function takes a string input from the user and passes it to the state graph's streaming interface
+    (see `agent_input` for the request format). The agent's answer is printed token by token as the model
+    generates it, so users see the first words as soon as the final response starts rather than after
+    the whole pipeline completed. Tool calls are announced as they happen.
 
-    if debugging is enabled (checked via an environment variable), it prints out the content of the last message
+    if debugging is enabled (checked via an environment variable), it prints out every raw graph event
     for further inspection.
 
     Parameters:
@@ -54,29 +144,26 @@ async def stream_graph_updates(message: dict, graph):
     Returns:
     - None. The function's primary side effect is to print the assistant's response to the console.
     """
-
-    message_string = json.dumps(message['user_message'])
-
-    tableau_credentials = message['agent_inputs']['tableau_credentials']
-    datasource = message['agent_inputs']['datasource']
-
-    # this is how client apps should format their requests to the Agent API
-    input_stream = {
-        "messages": [("user", message_string)],
-        "tableau_credentials": tableau_credentials,
-        "datasource": datasource
-    }
+    input_stream = agent_input(message)
 
     # gets value DEBUG value or sets it to empty string, condition applies if string is empty or 0
     if os.environ.get("DEBUG", "") in ["0", ""]:
-        # streams events from the agent graph started by the client input containing user queries
-        async for event in graph.astream(input_stream):
-            agent_output = event.get('agent')
-            if event.get('agent'):
-                agent_message = agent_output["messages"][0].content
-                if len(agent_message) > 0:
+        answering = False
+        # streams tokens from the agent graph started by the client input containing user queries
+        async for event in astream_agent_events(graph, input_stream):
+            if event["event"] == "token":
+                if not answering:
                     print("\nAgent:")
-                    print(f"{agent_message} \n")
+                    answering = True
+                print(event["content"], end="", flush=True)
+            elif event["event"] == "tool_start":
+                if answering:
+                    print()
+                    answering = False
+                print(f"\n[calling {event['name']}]")
+            elif event["event"] == "message" and answering:
+                print(" \n")
+                answering = False
 
     elif (os.environ["DEBUG"] == "1"):
         # display tableau credentials to prove access to the environment
@@ -0,0 +1,115 @@
+import queue
+import threading
+
+from modules import graphql
+
+# content type -> (query file, connection, prepare function applied to every node)
+CONTENT_TYPES = {
+    'datasources': ('tab_datasources_paged.graphql', 'publishedDatasourcesConnection', graphql.prepare_datasource),
+    'sheets': ('tab_sheets_paged.graphql', 'sheetsConnection', None),
+    'dashboards': ('tab_dashboards_paged.graphql', 'dashboardsConnection', None)
+}
+
+# marks the end of one content type in the page queue
+_DONE = object()
+
+
+class ContentCrawler:
+    """
+    Crawls Tableau content through the Metadata API for indexing: signs in once for the whole crawl,
+    pages through every content type with cursors, fetches the content types concurrently and streams
+    pages to the caller as they arrive instead of returning everything at the end.
+
+        with ContentCrawler(server, auth) as crawler:
+            for content_type, items in crawler.crawl():
+                index(content_type, items)
+
+    Args:
+        server: Tableau Server Client server, see `graphql.get_tableau_client`.
+        auth: Tableau Server Client authentication.
+        page_sizes: Nodes per page by content type, defaults to `graphql.PAGE_SIZES`.
+        max_pending_pages: Pages buffered ahead of a slow consumer before the fetch threads wait.
+    """
+
+    def __init__(self, server, auth, page_sizes=None, max_pending_pages=8):
+        self.server = server
+        self.auth = auth
+        self.page_sizes = {**graphql.PAGE_SIZES, **(page_sizes or {})}
+        self.max_pending_pages = max_pending_pages
+        self._signed_in = False
+
+    def __enter__(self):
+        self.server.auth.sign_in(self.auth)
+        self._signed_in = True
+        return self
+
+    def __exit__(self, *exc):
+        if self._signed_in:
+            self.server.auth.sign_out()
+            self._signed_in = False
+
+    def pages(self, content_type):
+        """Yields the pages of one content type as lists of (prepared) nodes"""
+        file_name, connection, prepare = CONTENT_TYPES[content_type]
+        query = graphql.read_query(file_name)
+        page = []
+        for node in graphql.paginated_nodes(self.server, query, connection, page_size=self.page_sizes[content_type]):
+            page.append(prepare(node) if prepare else node)
+            if len(page) >= self.page_sizes[content_type]:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def crawl(self, content_types=tuple(CONTENT_TYPES)):
+        """
+        Fetches the content types concurrently, one thread each, and yields (content_type, page) in
+        arrival order. An error in any fetch is raised to the caller once the pages before it are consumed.
+        """
+        if not self._signed_in:
+            with self:
+                yield from self.crawl(content_types)
+            return
+
+        pages = queue.Queue(maxsize=self.max_pending_pages)
+        stop = threading.Event()
+
+        def put(item):
+            """Queues an item unless the consumer went away, returns False then"""
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def fetch(content_type):
+            try:
+                for page in self.pages(content_type):
+                    if not put((content_type, page)):
+                        return
+                put((content_type, _DONE))
+            except Exception as e:
+                put((content_type, e))
+
+        threads = [
+            threading.Thread(target=fetch, args=(content_type,), name=f"crawl-{content_type}", daemon=True)
+            for content_type in content_types
+        ]
+        for thread in threads:
+            thread.start()
+
+        remaining = len(threads)
+        try:
+            while remaining:
+                content_type, page = pages.get()
+                if page is _DONE:
+                    remaining -= 1
+                elif isinstance(page, Exception):
+                    raise page
+                else:
+                    yield content_type, page
+        finally:
+            # lets the other fetch threads exit when the consumer stops early or an error is raised
+            stop.set()
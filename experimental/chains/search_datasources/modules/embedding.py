@@ -1,18 +1,203 @@
+import hashlib
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
 import numpy as np
+import openai
 from openai import OpenAI
 from dotenv import load_dotenv
 import os
 load_dotenv()
 
+from experimental.utilities.vector_index import cosine_scores
+
+try:
+    import tiktoken
+except ImportError:  # optional, tokens are estimated from the text length instead
+    tiktoken = None
+
 client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
 
-def get_embedding_openai(text, model="text-embedding-3-small"):
-   text = text.replace("\n", " ")
-   return client.embeddings.create(input = [text], model=model).data[0].embedding
+# errors worth retrying with backoff, anything else is raised immediately
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
 
-def cosine_similarity(vec1, vec2):
-    """Calculate the cosine similarity between two vectors."""
-    return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
 
+class BatchEmbedder:
+    """
+    Embeds many texts with few requests: texts are grouped into batches bounded by token count and
+    size, batches run on a bounded number of concurrent requests, and rate limits and transient
+    errors are retried with exponential backoff.
+
+    Embeddings are cached on disk in SQLite keyed by the SHA-256 of model and text, so unchanged
+    datasource descriptions are never embedded twice, across runs and processes.
+
+    Instances can be passed to Chroma as `embedding_function`.
+
+    Args:
+        openai_client: OpenAI client, defaults to the module client.
+        model: Embedding model name.
+        cache_path: SQLite file of the embedding cache, None disables the disk cache.
+        max_batch_tokens: Tokens per request, the embeddings API accepts up to 300,000.
+        max_input_tokens: Tokens per text, the embeddings API rejects longer inputs and the rest of their
+            batch with them. Longer texts are truncated to their first `max_input_tokens` tokens.
+        max_batch_size: Texts per request, the embeddings API accepts up to 2,048.
+        max_concurrency: Requests in flight at once.
+        max_retries: Attempts per batch before the error is raised.
+    """
+
+    def __init__(
+        self,
+        openai_client=None,
+        model="text-embedding-3-small",
+        cache_path="embedding_cache.sqlite",
+        max_batch_tokens=250_000,
+        max_input_tokens=8191,
+        max_batch_size=2048,
+        max_concurrency=4,
+        max_retries=6
+    ):
+        self.client = openai_client or client
+        self.model = model
+        self.cache_path = cache_path
+        self.max_batch_tokens = max_batch_tokens
+        self.max_input_tokens = max_input_tokens
+        self.max_batch_size = max_batch_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self._local = threading.local()
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+
+        if cache_path:
+            connection = self._connection()
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            connection.commit()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.cache_path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def count_tokens(self, text):
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        # about 4 characters per token for English text, rounded up to stay under the limit
+        return len(text) // 3 + 1
 
+    def _cached(self, keys):
+        if not self.cache_path or not keys:
+            return {}
+        found = {}
+        connection = self._connection()
+        # SQLite limits the number of bound parameters per statement
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.update({key: np.frombuffer(vector, dtype=np.float32).tolist() for key, vector in rows})
+        return found
 
+    def _store(self, items):
+        if not self.cache_path or not items:
+            return
+        connection = self._connection()
+        connection.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+            [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+        )
+        connection.commit()
+
+    def truncate(self, text):
+        """The text cut to `max_input_tokens` tokens, unchanged when it fits"""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            if len(tokens) <= self.max_input_tokens:
+                return text
+            return self._encoding.decode(tokens[:self.max_input_tokens])
+        # the same estimate as `count_tokens`
+        return text[:3 * (self.max_input_tokens - 1)]
+
+    def _batches(self, texts):
+        """Groups texts into batches under the token and size limits, oversized texts are truncated"""
+        batch, tokens = [], 0
+        for text in texts:
+            count = self.count_tokens(text)
+            if count > self.max_input_tokens:
+                text = self.truncate(text)
+                count = self.count_tokens(text)
+            if batch and (tokens + count > self.max_batch_tokens or len(batch) >= self.max_batch_size):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(text)
+            tokens += count
+        if batch:
+            yield batch
+
+    def _embed_batch(self, batch):
+        for attempt in range(self.max_retries):
+            try:
+                response = self.client.embeddings.create(input=batch, model=self.model)
+                return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+            except RETRYABLE_ERRORS:
+                if attempt == self.max_retries - 1:
+                    raise
+                # exponential backoff with jitter so concurrent batches do not retry in lockstep
+                time.sleep(min(60, 2 ** attempt) * (0.5 + random.random()))
+
+    def embed(self, texts):
+        """Embeds texts, in order, requesting only those not already cached"""
+        texts = [text.replace("\n", " ") for text in texts]
+        keys = [self._key(text) for text in texts]
+        vectors = self._cached(list(set(keys)))
+
+        # distinct texts still to embed
+        missing = list({key: text for key, text in zip(keys, texts) if key not in vectors}.items())
+        if missing:
+            batches = list(self._batches([text for _, text in missing]))
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                results = list(executor.map(self._embed_batch, batches))
+            embedded = [vector for result in results for vector in result]
+            new = [(key, vector) for (key, _), vector in zip(missing, embedded)]
+            self._store(new)
+            vectors.update(new)
+
+        return [vectors[key] for key in keys]
+
+    def __call__(self, input):
+        """Chroma embedding function interface"""
+        return self.embed(list(input))
+
+
+@lru_cache(maxsize=None)
+def get_embedder(model="text-embedding-3-small"):
+    """Shared `BatchEmbedder` of a model, created on first use so importing this module has no side effects"""
+    return BatchEmbedder(model=model)
+
+def get_embedding_openai(text, model="text-embedding-3-small"):
+   return get_embedder(model).embed([text])[0]
+
+def cosine_similarity(vec1, vec2):
+    """
+    Calculate the cosine similarity between two vectors, or between a vector and every row of a
+    matrix at once (one matrix product instead of a Python loop over pairs).
+    """
+    if np.ndim(vec2) == 2:
+        return cosine_scores(vec1, vec2)
+    return np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2))
@@ -1,6 +1,7 @@
 import tableauserverclient as TSC
 from dotenv import load_dotenv
 import os
+from functools import lru_cache
 
 def get_tableau_client():
     load_dotenv()
@@ -14,94 +15,123 @@ def get_tableau_client():
 
 def fetch_dashboard_data(server, auth):
     with server.auth.sign_in(auth):
-        # Read the GraphQL query from the file
-        query_file_path = os.path.join('query_data_chain','modules','prompts', 'tab_dashboard_fields.graphql')
-        with open(query_file_path, 'r') as f:
-            query = f.read()
-        # Query the Metadata API and store the response in resp
-        resp = server.metadata.query(query)
-        return resp['data']['dashboards']
+        # Page through the Metadata API, one unpaginated query times out on large sites
+        return list(paginated_nodes(server, read_query('tab_dashboards_paged.graphql'), 'dashboardsConnection', page_size=PAGE_SIZES['dashboards']))
     
 def fetch_sheets_data(server, auth):
     with server.auth.sign_in(auth):
-        # Read the GraphQL query from the file
-        query_file_path = os.path.join('query_data_chain','modules','prompts','tab_sheets.graphql')
-        with open(query_file_path, 'r') as f:
-            query = f.read()
-        # Query the Metadata API and store the response in resp
-        resp = server.metadata.query(query)
-        return resp['data']['sheets']
+        return list(paginated_nodes(server, read_query('tab_sheets_paged.graphql'), 'sheetsConnection', page_size=PAGE_SIZES['sheets']))
     
 def fetch_datasources(server, auth):
     with server.auth.sign_in(auth):
+        # Prepare datasources for RAG
+        datasources = paginated_nodes(server, read_query('tab_datasources_paged.graphql'), 'publishedDatasourcesConnection', page_size=PAGE_SIZES['datasources'])
 
-        # Read the GraphQL query from the file
-        query_file_path = os.path.join('query_data_chain','modules','prompts','tab_datasources.graphql')
-        with open(query_file_path, 'r') as f:
-            query = f.read()
+        return [prepare_datasource(datasource) for datasource in datasources]
 
-        # Query the Metadata API and store the response in resp
-        resp = server.metadata.query(query)
-        
-        # Prepare datasources for RAG
-        datasources = resp['data']['publishedDatasources']
-
-        for datasource in datasources:
-
-            # Combine datasource columns (is not hidden) to one cell for RAG
-            fields = datasource['fields']
-
-            field_entries = []
-            for field in fields:
-                # Exclude columns that are hidden
-                if not field.get('isHidden', True):
-                    name = field.get('name', '')
-                    description = field.get('description', '')
-                    # If there's a description include it
-                    if description:
-                        # Remove newlines and extra spaces
-                        description = ' '.join(description.split())
-                        field_entry = f"- {name}: [{description}]"
-                    else:
-                        field_entry = "- " + name
-                    field_entries.append(field_entry)
-
-            # Combining Datasource columns
-            concatenated_field_entries = '\n'.join(field_entries)
-
-            # Datasource RAG headers
-            datasource_name = datasource['name']
-            datasource_desc = datasource['description']
-            datasource_project = datasource['projectName']
-
-            # Formating Output for readability
-            rag_column = f"Datasource: {datasource_name}\n{datasource_desc}\n{datasource_project}\n\nDatasource Columns:\n{concatenated_field_entries}"
-            
-            datasource['dashboard_overview'] = rag_column
-
-            # Simplifying output schema 
-            keys_to_extract = [
-                'dashboard_overview',
-                'id',
-                'luid',
-                'uri',
-                'vizportalId',
-                'vizportalUrlId',
-                'name',
-                'hasExtracts',
-                'createdAt',
-                'updatedAt',
-                'extractLastUpdateTime',
-                'extractLastRefreshTime',
-                'extractLastIncrementalUpdateTime',
-                'projectName',
-                'containerName',
-                'isCertified',
-                'description'
-            ]
-
-            # Create a new dictionary with only the specified keys
-            datasource = {key: datasource.get(key) for key in keys_to_extract}
-
-        return datasources
+def prepare_datasource(datasource):
+    """Builds the RAG document of a published datasource and keeps only the keys stored with it"""
+    # Combine datasource columns (is not hidden) to one cell for RAG
+    fields = datasource['fields']
+
+    field_entries = []
+    for field in fields:
+        # Exclude columns that are hidden
+        if not field.get('isHidden', True):
+            name = field.get('name', '')
+            description = field.get('description', '')
+            # If there's a description include it
+            if description:
+                # Remove newlines and extra spaces
+                description = ' '.join(description.split())
+                field_entry = f"- {name}: [{description}]"
+            else:
+                field_entry = "- " + name
+            field_entries.append(field_entry)
+
+    # Combining Datasource columns
+    concatenated_field_entries = '\n'.join(field_entries)
+
+    # Datasource RAG headers
+    datasource_name = datasource['name']
+    datasource_desc = datasource['description']
+    datasource_project = datasource['projectName']
+
+    # Formating Output for readability
+    rag_column = f"Datasource: {datasource_name}\n{datasource_desc}\n{datasource_project}\n\nDatasource Columns:\n{concatenated_field_entries}"
+    
+    datasource['dashboard_overview'] = rag_column
+
+    # Simplifying output schema 
+    keys_to_extract = [
+        'dashboard_overview',
+        'id',
+        'luid',
+        'uri',
+        'vizportalId',
+        'vizportalUrlId',
+        'name',
+        'hasExtracts',
+        'createdAt',
+        'updatedAt',
+        'extractLastUpdateTime',
+        'extractLastRefreshTime',
+        'extractLastIncrementalUpdateTime',
+        'projectName',
+        'containerName',
+        'isCertified',
+        'description'
+    ]
+
+    # Create a new dictionary with only the specified keys
+    return {key: datasource.get(key) for key in keys_to_extract}
+
+
+PROMPTS_DIR = os.path.join(os.path.dirname(__file__), 'prompts')
+
+# nodes per page by content type, dashboards carry every sheet and field of their workbook
+PAGE_SIZES = {
+    'dashboards': 20,
+    'sheets': 500,
+    'datasources': 100
+}
+
+@lru_cache(maxsize=None)
+def read_query(file_name):
+    """GraphQL query text from the prompts folder, read from disk once per process"""
+    with open(os.path.join(PROMPTS_DIR, file_name), 'r') as f:
+        return f.read()
+
+def paginated_nodes(server, query, connection, variables=None, page_size=100):
+    """
+    Yields the nodes of a Metadata API connection page by page, following `endCursor`
+    until `hasNextPage` is false. The server must already be signed in.
+    """
+    cursor = None
+    while True:
+        page_variables = {**(variables or {}), 'first': page_size, 'after': cursor}
+        resp = server.metadata.query(query, variables=page_variables)
+        if resp.get('errors'):
+            raise RuntimeError(f"GraphQL errors: {resp['errors']}")
+        page = resp['data'][connection]
+        yield from page['nodes']
+        if not page['pageInfo']['hasNextPage']:
+            break
+        cursor = page['pageInfo']['endCursor']
+
+def fetch_datasource_versions(server, page_size=1000):
+    """Maps the id of every published datasource on the site to its `updatedAt`, without fields"""
+    query = read_query('tab_datasources_updated.graphql')
+    return {
+        node['id']: node['updatedAt']
+        for node in paginated_nodes(server, query, 'publishedDatasourcesConnection', page_size=page_size)
+    }
 
+def fetch_datasources_by_id(server, ids, page_size=100, chunk_size=500):
+    """Fetches and prepares only the given published datasources, in pages of `page_size`"""
+    query = read_query('tab_datasources_by_id.graphql')
+    ids = list(ids)
+    for start in range(0, len(ids), chunk_size):
+        variables = {'ids': ids[start:start + chunk_size]}
+        for node in paginated_nodes(server, query, 'publishedDatasourcesConnection', variables, page_size):
+            yield prepare_datasource(node)
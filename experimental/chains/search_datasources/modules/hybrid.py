@@ -0,0 +1,100 @@
+import re
+
+from experimental.utilities.lexical_index import LexicalIndex, reciprocal_rank_fusion
+
+# "- Field Name: [description]" or "- Field Name" lines of a datasource RAG document
+FIELD_LINE = re.compile(r"^- (.*?)(?:: \[(.*)\])?$")
+
+
+def parse_fields(document):
+    """Field names and descriptions from the 'Datasource Columns' section built by graphql.prepare_datasource"""
+    names, descriptions = [], []
+    _, _, columns = (document or '').partition('Datasource Columns:\n')
+    for line in columns.splitlines():
+        match = FIELD_LINE.match(line)
+        if match:
+            names.append(match.group(1))
+            if match.group(2):
+                descriptions.append(match.group(2))
+    return names, descriptions
+
+def lexical_fields(document, metadata):
+    field_names, field_descriptions = parse_fields(document)
+    return {
+        'name': metadata.get('name'),
+        'description': metadata.get('description'),
+        'field_names': field_names,
+        'field_descriptions': field_descriptions
+    }
+
+def build_lexical_index(collection, page_size=5000):
+    """BM25 index over the name, description and field names of every datasource in the collection"""
+    lexical = LexicalIndex(
+        weights={'name': 3.0, 'field_names': 2.0, 'description': 1.0, 'field_descriptions': 0.5},
+        exact_fields=('name', 'field_names')
+    )
+    offset = 0
+    while True:
+        page = collection.get(include=['documents', 'metadatas'], limit=page_size, offset=offset)
+        for unique_id, document, metadata in zip(page['ids'], page['documents'], page['metadatas']):
+            lexical.upsert(unique_id, lexical_fields(document, metadata or {}), metadata or {})
+        if len(page['ids']) < page_size:
+            return lexical
+        offset += page_size
+
+
+class HybridSearcher:
+    """
+    Datasource search fusing BM25 over names, descriptions and field names with the collection's
+    vector search by Reciprocal Rank Fusion, so exact field names and acronyms are found even when
+    their embeddings are not close.
+
+    When the whole query is exactly the name of a datasource or field and that matches at most
+    `n_results` datasources, the lexical results are returned without embedding the query.
+    """
+
+    def __init__(self, collection, lexical=None, candidates=4):
+        self.collection = collection
+        self.lexical = lexical or build_lexical_index(collection)
+        self.candidates = candidates
+        self.fast_path_hits = 0
+        self.hybrid_hits = 0
+
+    def lexical_search(self, query, n_results=5):
+        """
+        Lexical candidates for a query, and the final results if they are confident enough to skip
+        vector search (otherwise None)
+        """
+        lexical = self.lexical.search(query, k=n_results * self.candidates)
+        exact = [hit for hit in lexical if hit['exact']]
+        if 0 < len(exact) <= n_results:
+            self.fast_path_hits += 1
+            return lexical, [
+                {'id': hit['id'], 'metadata': hit['metadata'], 'distance': None, 'score': hit['score']}
+                for hit in lexical[:n_results]
+            ]
+        self.hybrid_hits += 1
+        return lexical, None
+
+    def fuse(self, lexical, vector_results, n_results=5):
+        """RRF of lexical hits with one query's Chroma style results (ids, metadatas, distances lists)"""
+        vector_ids = vector_results['ids']
+        metadatas = dict(zip(vector_ids, vector_results['metadatas']))
+        distances = dict(zip(vector_ids, vector_results['distances']))
+        metadatas.update({hit['id']: hit['metadata'] for hit in lexical if hit['id'] not in metadatas})
+
+        fused = reciprocal_rank_fusion([vector_ids, [hit['id'] for hit in lexical]])
+        return [
+            {'id': id_, 'metadata': metadatas[id_], 'distance': distances.get(id_), 'score': score}
+            for id_, score in fused[:n_results]
+        ]
+
+    def search(self, query, n_results=5):
+        """Returns up to n_results {'id', 'metadata', 'distance', 'score'}, best first"""
+        lexical, results = self.lexical_search(query, n_results)
+        if results is not None:
+            return results
+
+        results = self.collection.query(query_texts=[query], n_results=n_results * self.candidates)
+        vector_results = {key: results[key][0] for key in ('ids', 'metadatas', 'distances')}
+        return self.fuse(lexical, vector_results, n_results)
@@ -0,0 +1,46 @@
+from experimental.utilities.vector_index import VectorIndex, as_where
+
+
+class LocalCollection:
+    """
+    Drop-in for the subset of the Chroma collection API used by the search chain (`get`, `upsert`,
+    `delete`, `query`) on top of an in-process `VectorIndex`, so the demos run without Chroma.
+    Documents are embedded with `embedding_function`, such as `embedding.BatchEmbedder`.
+    """
+
+    def __init__(self, path, embedding_function):
+        self.index = VectorIndex(path)
+        self.embedding_function = embedding_function
+
+    def count(self):
+        return len(self.index)
+
+    def get(self, ids=None, include=None, limit=None, offset=0):
+        records = self.index.get(ids)
+        records = records[offset:offset + limit] if limit is not None else records[offset:]
+        return {
+            'ids': [r['id'] for r in records],
+            'documents': [r['text'] for r in records],
+            'metadatas': [r['metadata'] for r in records]
+        }
+
+    def upsert(self, ids, documents, metadatas=None):
+        self.index.upsert(ids, self.embedding_function(documents), texts=documents, metadatas=metadatas)
+
+    add = upsert
+
+    def delete(self, ids):
+        self.index.delete(ids)
+
+    def query(self, query_texts=None, query_embeddings=None, n_results=10, where=None, include=None):
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        results = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        for vector in query_embeddings:
+            matches = self.index.search(vector, k=n_results, where=as_where(where))
+            results['ids'].append([r['id'] for r, _ in matches])
+            results['documents'].append([r['text'] for r, _ in matches])
+            results['metadatas'].append([r['metadata'] for r, _ in matches])
+            # cosine distance, as Chroma reports for cosine collections
+            results['distances'].append([1 - score for _, score in matches])
+        return results
@@ -0,0 +1,100 @@
+import asyncio
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests into batches: callers `await submit(item)`, a background task
+    collects items for at most `max_wait` seconds or until `max_batch` are queued, then runs
+    `batch_fn(items)` once on `executor` and hands every caller its own result.
+
+    Used to embed and vector search many queries with one embeddings request and one index query.
+
+    Args:
+        batch_fn: Blocking callable mapping a list of items to a list of results in the same order.
+        executor: concurrent.futures executor the batches run on.
+        max_batch: Items per batch.
+        max_wait: Seconds the first item of a batch waits for others.
+        max_pending: Items queued before `submit` waits, bounds memory under overload.
+    """
+
+    def __init__(self, batch_fn, executor, max_batch=64, max_wait=0.005, max_pending=10_000):
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        self._queue = asyncio.Queue(maxsize=max_pending)
+        self._task = None
+        # batches in flight, referenced so they are not garbage collected before they finish
+        self._running = set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # items never collected into a batch are failed rather than left waiting forever
+        while not self._queue.empty():
+            _, future = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("MicroBatcher stopped before the item was processed"))
+        # let batches already handed to the executor deliver their results
+        if self._running:
+            await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            try:
+                while len(batch) < self.max_batch:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                # stopped while collecting, the items already taken off the queue still run
+                self._dispatch(batch)
+                raise
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        # run the batch without blocking collection of the next one
+        task = asyncio.create_task(self._execute(batch))
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def _execute(self, batch):
+        items = [item for item, _ in batch]
+        self.batches += 1
+        self.items += len(items)
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, self.batch_fn, items)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+        for _, future in batch[len(results):]:
+            if not future.done():
+                future.set_exception(RuntimeError(f"batch_fn returned {len(results)} results for {len(items)} items"))
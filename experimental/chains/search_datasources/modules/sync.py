@@ -0,0 +1,106 @@
+from modules import graphql
+from modules.crawler import ContentCrawler
+
+
+def convert_to_string(value):
+    if isinstance(value, dict):
+        return str(value)
+    elif isinstance(value, list):
+        return ', '.join(map(str, value))
+    else:
+        return str(value)
+
+def to_record(datasource):
+    """Splits a prepared datasource into the (id, document, metadata) stored in Chroma"""
+    # Prepare metadata (exclude 'dashboard_overview' and 'id')
+    metadata = {k: v for k, v in datasource.items() if k not in ['dashboard_overview', 'id']}
+
+    # Remove any nested data structures from metadata (e.g., lists, dicts)
+    metadata = {k: convert_to_string(v) for k, v in metadata.items() if isinstance(v, (str, int, float, bool, dict, list))}
+
+    return datasource['id'], datasource['dashboard_overview'], metadata
+
+def indexed_versions(collection, page_size=5000):
+    """Maps the id of every datasource in the collection to the `updatedAt` it was indexed at"""
+    versions = {}
+    offset = 0
+    while True:
+        page = collection.get(include=['metadatas'], limit=page_size, offset=offset)
+        for unique_id, metadata in zip(page['ids'], page['metadatas']):
+            versions[unique_id] = (metadata or {}).get('updatedAt')
+        if len(page['ids']) < page_size:
+            return versions
+        offset += page_size
+
+def index_datasources(server, auth, collection, indexed=None):
+    """
+    Full (re)index of the published datasources of the site: a `ContentCrawler` pages through them and
+    every page is upserted into the collection as soon as it arrives, so embedding overlaps with the
+    crawl and no more than a few pages are held in memory. Documents of datasources no longer on the
+    site are deleted.
+
+    Returns the number of datasources upserted, deleted and left unchanged.
+    """
+    indexed = indexed_versions(collection) if indexed is None else indexed
+
+    seen = set()
+    with ContentCrawler(server, auth) as crawler:
+        for _, page in crawler.crawl(('datasources',)):
+            ids, documents, metadatas = map(list, zip(*(to_record(datasource) for datasource in page)))
+            collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+            seen.update(ids)
+
+    removed = [i for i in indexed if i not in seen]
+    if removed:
+        collection.delete(ids=removed)
+
+    return {
+        'upserted': len(seen),
+        'deleted': len(removed),
+        'unchanged': 0
+    }
+
+def sync_datasources(server, auth, collection, batch_size=100):
+    """
+    Brings the Chroma collection in line with the published datasources of the site.
+
+    An empty collection is built with `index_datasources`, streaming the crawl into the collection in
+    one pass. Otherwise only `id` and `updatedAt` are listed for the whole site, the datasources that are new or whose
+    `updatedAt` differs from the one stored with their document are then fetched with their fields
+    and upserted (the collection's embedding function embeds only those), and documents of
+    datasources no longer on the site are deleted.
+
+    Returns the number of datasources upserted, deleted and left unchanged.
+    """
+    indexed = indexed_versions(collection)
+    if not indexed:
+        return index_datasources(server, auth, collection, indexed)
+
+    with server.auth.sign_in(auth):
+        site = graphql.fetch_datasource_versions(server)
+        changed = [i for i, updated_at in site.items() if indexed.get(i) != convert_to_string(updated_at)]
+
+        ids, documents, metadatas = [], [], []
+        upserted = 0
+        for datasource in graphql.fetch_datasources_by_id(server, changed, page_size=batch_size):
+            unique_id, document, metadata = to_record(datasource)
+            ids.append(unique_id)
+            documents.append(document)
+            metadatas.append(metadata)
+            if len(ids) >= batch_size:
+                collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+                upserted += len(ids)
+                ids, documents, metadatas = [], [], []
+        if ids:
+            collection.upsert(ids=ids, documents=documents, metadatas=metadatas)
+            upserted += len(ids)
+
+    removed = [i for i in indexed if i not in site]
+    if removed:
+        collection.delete(ids=removed)
+
+    return {
+        'upserted': upserted,
+        'deleted': len(removed),
+        'unchanged': len(site) - len(changed)
+    }
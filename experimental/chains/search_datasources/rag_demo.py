@@ -1,76 +1,39 @@
-from modules import graphql
+from modules import graphql, sync
+from modules.embedding import BatchEmbedder
+from modules.local_collection import LocalCollection
 import chromadb
 import numpy as np
 from openai import OpenAI
 from dotenv import load_dotenv
 import os
 load_dotenv()
-import chromadb.utils.embedding_functions as embedding_functions
 
 openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
 
-def get_embedding_openai(text, model="text-embedding-3-small"):
-   text = text.replace("\n", " ")
-   return openai_client.embeddings.create(input = [text], model=model).data[0].embedding
-
-
-openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-                api_key=os.getenv('OPENAI_API_KEY'),
-                model_name="text-embedding-3-small"
-            )
+# Batched, cached embeddings: only datasource descriptions not embedded before are sent to OpenAI
+openai_ef = BatchEmbedder(openai_client, model="text-embedding-3-small")
 
-def convert_to_string(value):
-    if isinstance(value, dict):
-        return str(value)
-    elif isinstance(value, list):
-        return ', '.join(map(str, value))
-    else:
-        return str(value)
+def get_embedding_openai(text, model="text-embedding-3-small"):
+   return openai_ef.embed([text])[0]
 
 server, auth = graphql.get_tableau_client()
-datasources = graphql.fetch_datasources(server, auth)
 
-# Initialise Chroma
-chroma_client = chromadb.PersistentClient(path="data")
 collection_name = 'tableau_datasource_RAG_search'
-collection = chroma_client.get_collection(name=collection_name, embedding_function=openai_ef)
-
-if collection:
-    print("Collection exists.")
-    # Run your series of code here
+if os.getenv('VECTOR_BACKEND', 'chroma') == 'local':
+    # In-process memory-mapped NumPy index, no external vector store needed
+    collection = LocalCollection(os.path.join("data", collection_name), embedding_function=openai_ef)
 else:
-    print("Collection does not exist. Creating collection...")
-    documents = []
-    embeddings = []
-    ids = []
-    metadatas = []
-
-    for datasource in datasources:
-        # Extract the text to embed
-        text_to_embed = datasource['dashboard_overview']
-
-        # Extract the unique identifier
-        unique_id = datasource['id']
-
-        # Prepare metadata (exclude 'dashboard_overview' and 'id')
-        metadata = {k: v for k, v in datasource.items() if k not in ['dashboard_overview', 'id']}
-
-        # Remove any nested data structures from metadata (e.g., lists, dicts)
-        metadata = {k: convert_to_string(v) for k, v in metadata.items() if isinstance(v, (str, int, float, bool, dict, list))}
-
-        documents.append(text_to_embed)
-        ids.append(unique_id)
-        
-        metadatas.append(metadata)
-    
-    # Create vector db with openai embedding
+    # Initialise Chroma
+    chroma_client = chromadb.PersistentClient(path="data")
     collection = chroma_client.get_or_create_collection(name=collection_name, embedding_function=openai_ef)
 
-    collection.add(
-        documents=documents,
-        metadatas=metadatas,
-        ids=ids
-    )
+if os.getenv('REINDEX') == '1':
+    # Full rebuild: crawled pages are embedded and upserted as they arrive
+    stats = sync.index_datasources(server, auth, collection)
+else:
+    # Incremental sync: only new or updated datasources are fetched and re-embedded, removed ones are deleted
+    stats = sync.sync_datasources(server, auth, collection)
+print(f"Collection synced: {stats['upserted']} upserted, {stats['deleted']} deleted, {stats['unchanged']} unchanged.")
 
 # to Reset vector db
 # # chroma_client.delete_collection(name=collection_name)
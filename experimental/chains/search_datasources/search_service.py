@@ -0,0 +1,178 @@
+"""
+Datasource search service: the RAG demo as an ASGI app serving the HTML search pages and a JSON API.
+
+Needs the `server` extra (`pip install ".[server]"`). Run from this directory with an ASGI server, for example:
+
+    uvicorn search_service:app --host 0.0.0.0 --port 8000
+
+Searches run the lexical fast path inline, everything else goes through a micro-batcher that embeds
+concurrent queries in one OpenAI request and vector searches them in one index query on a worker
+pool, so the event loop never blocks on Chroma or OpenAI.
+
+Environment:
+    VECTOR_BACKEND: `chroma` (default) or `local` for the in-process NumPy index
+    SEARCH_WORKERS: threads running embedding and vector search batches, default 8
+    SEARCH_MAX_BATCH: queries per batch, default 64
+    SEARCH_BATCH_WAIT_MS: milliseconds a batch waits for more queries, default 5
+    SYNC_ON_STARTUP: `1` to sync the collection with the Tableau site at startup (always done when empty)
+"""
+import os
+import asyncio
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+
+from dotenv import load_dotenv
+from openai import OpenAI
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.templating import Jinja2Templates
+
+from modules import graphql, sync
+from modules.embedding import BatchEmbedder
+from modules.hybrid import HybridSearcher
+from modules.local_collection import LocalCollection
+from modules.micro_batch import MicroBatcher
+
+load_dotenv()
+
+COLLECTION_NAME = 'tableau_datasource_RAG_search'
+MAX_RESULTS = 50
+
+templates = Jinja2Templates(directory=os.path.join(os.path.dirname(__file__), 'templates'))
+
+
+def open_collection(embedding_function):
+    if os.getenv('VECTOR_BACKEND', 'chroma') == 'local':
+        return LocalCollection(os.path.join('data', COLLECTION_NAME), embedding_function=embedding_function)
+    import chromadb
+    chroma_client = chromadb.PersistentClient(path='data')
+    return chroma_client.get_or_create_collection(name=COLLECTION_NAME, embedding_function=embedding_function)
+
+
+class SearchService:
+    """Holds the clients and indexes of one process, created once at startup"""
+
+    def __init__(self):
+        self.embedder = BatchEmbedder(OpenAI(api_key=os.getenv('OPENAI_API_KEY')))
+        self.collection = open_collection(self.embedder)
+        if os.getenv('SYNC_ON_STARTUP') == '1' or self.collection.count() == 0:
+            server, auth = graphql.get_tableau_client()
+            print(f"Collection synced: {sync.sync_datasources(server, auth, self.collection)}")
+        self.searcher = HybridSearcher(self.collection)
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('SEARCH_WORKERS', 8)), thread_name_prefix='search'
+        )
+        self.batcher = MicroBatcher(
+            self._vector_search_batch,
+            self.executor,
+            max_batch=int(os.getenv('SEARCH_MAX_BATCH', 64)),
+            max_wait=float(os.getenv('SEARCH_BATCH_WAIT_MS', 5)) / 1000
+        )
+
+    def _vector_search_batch(self, items):
+        """Embeds a batch of (query, n_results) in one request and searches them in one index query"""
+        vectors = self.embedder.embed([query for query, _ in items])
+        n_results = max(n for _, n in items)
+        results = self.collection.query(query_embeddings=vectors, n_results=n_results)
+        return [
+            {key: results[key][i][:n] for key in ('ids', 'metadatas', 'distances')}
+            for i, (_, n) in enumerate(items)
+        ]
+
+    async def search(self, query, n_results=5):
+        loop = asyncio.get_running_loop()
+        lexical, results = await loop.run_in_executor(
+            self.executor, self.searcher.lexical_search, query, n_results
+        )
+        if results is None:
+            vector_results = await self.batcher.submit((query, n_results * self.searcher.candidates))
+            results = self.searcher.fuse(lexical, vector_results, n_results)
+        return results
+
+
+def to_result(result):
+    metadata = result['metadata']
+    return {
+        'name': metadata.get('name', 'N/A'),
+        'uri': metadata.get('uri', 'N/A'),
+        'luid': metadata.get('luid', 'N/A'),
+        'isCertified': metadata.get('isCertified', 'N/A'),
+        'updatedAt': metadata.get('updatedAt', 'N/A'),
+        'distance': result['distance'],
+        'score': result['score']
+    }
+
+
+async def index(request):
+    return templates.TemplateResponse(request, 'search.html')
+
+
+async def search_form(request):
+    form = parse_qs((await request.body()).decode('utf-8'))
+    user_input = (form.get('query') or [''])[0].strip()
+    if not user_input:
+        return JSONResponse({"error": "No query provided"}, status_code=400)
+
+    results = await request.app.state.service.search(user_input, n_results=5)
+    return templates.TemplateResponse(
+        request, 'results.html', {'results': [to_result(r) for r in results], 'query': user_input}
+    )
+
+
+async def search_api(request):
+    """GET /api/search?q=...&k=5 or POST {"query": "...", "k": 5}"""
+    if request.method == 'POST':
+        body = await request.json()
+        user_input, k = body.get('query'), body.get('k', 5)
+    else:
+        user_input, k = request.query_params.get('q'), request.query_params.get('k', 5)
+    if not user_input or not str(user_input).strip():
+        return JSONResponse({"error": "No query provided"}, status_code=400)
+    try:
+        k = min(max(int(k), 1), MAX_RESULTS)
+    except (TypeError, ValueError):
+        return JSONResponse({"error": "k must be an integer"}, status_code=400)
+
+    results = await request.app.state.service.search(str(user_input).strip(), n_results=k)
+    return JSONResponse({'query': user_input, 'results': [to_result(r) for r in results]})
+
+
+async def health(request):
+    service = request.app.state.service
+    return JSONResponse({
+        'status': 'ok',
+        'documents': service.collection.count(),
+        'fast_path_hits': service.searcher.fast_path_hits,
+        'hybrid_hits': service.searcher.hybrid_hits,
+        'vector_batches': service.batcher.batches,
+        'vector_queries': service.batcher.items
+    })
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # clients and indexes are created once per process, after the server forked its workers
+    service = await asyncio.get_running_loop().run_in_executor(None, SearchService)
+    service.batcher.start()
+    app.state.service = service
+    yield
+    await service.batcher.stop()
+    service.executor.shutdown(wait=False)
+
+
+app = Starlette(
+    routes=[
+        Route('/', index, methods=['GET']),
+        Route('/search', search_form, methods=['POST']),
+        Route('/api/search', search_api, methods=['GET', 'POST']),
+        Route('/health', health, methods=['GET']),
+    ],
+    lifespan=lifespan
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host=os.getenv('HOST', '127.0.0.1'), port=int(os.getenv('PORT', 8000)))
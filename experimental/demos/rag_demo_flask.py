@@ -1,11 +1,12 @@
 from flask import Flask, request, jsonify, render_template
 from modules import graphql
+from modules.embedding import BatchEmbedder
+from modules.hybrid import HybridSearcher
 import chromadb
 import numpy as np
 from openai import OpenAI
 from dotenv import load_dotenv
 import os
-import chromadb.utils.embedding_functions as embedding_functions
 
 # Load environment variables
 load_dotenv()
@@ -15,15 +16,11 @@ app = Flask(__name__)
 
 openai_client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
 
-def get_embedding_openai(text, model="text-embedding-3-small"):
-   text = text.replace("\n", " ")
-   return openai_client.embeddings.create(input = [text], model=model).data[0].embedding
-
+# Batched, cached embeddings: only datasource descriptions not embedded before are sent to OpenAI
+openai_ef = BatchEmbedder(openai_client, model="text-embedding-3-small")
 
-openai_ef = embedding_functions.OpenAIEmbeddingFunction(
-                api_key=os.getenv('OPENAI_API_KEY'),
-                model_name="text-embedding-3-small"
-            )
+def get_embedding_openai(text, model="text-embedding-3-small"):
+   return openai_ef.embed([text])[0]
 
 def convert_to_string(value):
     if isinstance(value, dict):
@@ -76,6 +73,9 @@ except Exception as e:
         ids=ids
     )
 
+# Lexical index over datasource names, descriptions and field names, fused with vector search
+searcher = HybridSearcher(collection)
+
 # Route to display the search form
 @app.route('/', methods=['GET'])
 def index():
@@ -89,39 +89,34 @@ def search():
     if not user_input:
         return jsonify({"error": "No query provided"}), 400
 
-    # Perform the query
-    results = collection.query(
-        query_texts=[user_input],
-        n_results=5  
-    )
-
-    metadatas = results['metadatas']
-    distances = results['distances']
+    # Hybrid lexical + vector search, exact datasource or field names skip the query embedding
+    results = searcher.search(user_input, n_results=5)
 
     # Initialize an empty list to store extracted data
     extracted_data = []
 
-    for meta_list, dist_list in zip(metadatas, distances):
-        for metadata, distance in zip(meta_list, dist_list):
-            name = metadata.get('name', 'N/A')
-            uri = metadata.get('uri', 'N/A')
-            luid = metadata.get('luid', 'N/A')
-            isCertified = metadata.get('isCertified', 'N/A')
-            updatedAt = metadata.get('updatedAt', 'N/A')
-
-            # Append the extracted data to the list, including 'distance'
-            extracted_data.append({
-                'name': name,
-                'uri': uri,
-                'luid': luid,
-                'isCertified': isCertified,
-                'updatedAt': updatedAt,
-                'distance': distance
-            })
+    for result in results:
+        metadata = result['metadata']
+        name = metadata.get('name', 'N/A')
+        uri = metadata.get('uri', 'N/A')
+        luid = metadata.get('luid', 'N/A')
+        isCertified = metadata.get('isCertified', 'N/A')
+        updatedAt = metadata.get('updatedAt', 'N/A')
+
+        # Append the extracted data to the list, including 'distance' (None for lexical only matches)
+        extracted_data.append({
+            'name': name,
+            'uri': uri,
+            'luid': luid,
+            'isCertified': isCertified,
+            'updatedAt': updatedAt,
+            'distance': result['distance']
+        })
 
     # Render the results template
     return render_template('results.html', results=extracted_data, query=user_input)
 
-# Run the Flask app
+# Run the Flask app, for development only: see chains/search_datasources/search_service.py for the
+# ASGI service with a worker pool, micro-batched query embeddings and a JSON API
 if __name__ == '__main__':
     app.run(debug=True)
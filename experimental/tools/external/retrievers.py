@@ -1,4 +1,6 @@
 import os
+import threading
+from typing import Iterable, Optional
 
 from pinecone import Pinecone
 
@@ -6,6 +8,47 @@ from langchain_pinecone import PineconeVectorStore
 from langchain.tools.retriever import create_retriever_tool
 
 from experimental.utilities.models import select_embeddings
+from experimental.utilities.vector_index import VectorIndex, VectorIndexRetriever
+from experimental.utilities.embedding_cache import CachedQueryEmbeddings
+
+
+# query embedding caches shared by every retriever tool using the same model
+_query_embedding_caches = {}
+_query_embedding_caches_lock = threading.Lock()
+
+
+def cached_query_embeddings(
+    model_provider: Optional[str],
+    embedding_model: Optional[str],
+    cache_size: int = 4096,
+    cache_path: Optional[str] = None,
+    prewarm_queries: Optional[Iterable[str]] = None
+) -> CachedQueryEmbeddings:
+    """
+    Embeddings from `select_embeddings` behind a query embedding cache, one per (provider, model, size, path)
+    so that the retriever tools of an agent share hits. `cache_path` defaults to the
+    QUERY_EMBEDDING_CACHE environment variable, unset keeps the cache in memory only.
+    """
+    provider = model_provider or os.environ.get("MODEL_PROVIDER", "openai")
+    model_name = embedding_model or os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+    path = cache_path or os.environ.get("QUERY_EMBEDDING_CACHE")
+
+    with _query_embedding_caches_lock:
+        key = (provider, model_name, cache_size, path)
+        embeddings = _query_embedding_caches.get(key)
+        if embeddings is None:
+            embeddings = CachedQueryEmbeddings(
+                select_embeddings(provider=provider, model_name=model_name),
+                provider=provider,
+                model=model_name,
+                max_entries=cache_size,
+                path=path
+            )
+            _query_embedding_caches[key] = embeddings
+
+    if prewarm_queries:
+        embeddings.prewarm(prewarm_queries)
+    return embeddings
 
 
 def pinecone_retriever_tool(
@@ -16,7 +59,10 @@ def pinecone_retriever_tool(
     embedding_model: str,
     text_key: str = "text",
     search_k: int = 6,
-    max_concurrency: int = 5
+    max_concurrency: int = 5,
+    query_cache_size: int = 4096,
+    query_cache_path: Optional[str] = None,
+    prewarm_queries: Optional[Iterable[str]] = None
 ):
     """
     Initializes a Pinecone retriever using langchain-pinecone and creates a LangChain tool.
@@ -33,6 +79,9 @@ def pinecone_retriever_tool(
         text_key: Pinecone metadata containing the content, default: `text`,  `_node_content` is another example.
         search_k: The number of documents to retrieve (k). Defaults to 6.
         max_concurrency: The maximum concurrency for retriever requests. Defaults to 5.
+        query_cache_size: Query embeddings kept in memory. Defaults to 4096.
+        query_cache_path: SQLite file persisting query embeddings, defaults to QUERY_EMBEDDING_CACHE.
+        prewarm_queries: Common retrieval strings embedded in one batch when the tool is created.
 
     Returns:
         A LangChain BaseTool configured to use the specified Pinecone retriever.
@@ -45,9 +94,13 @@ def pinecone_retriever_tool(
     # Initialize Pinecone client
     pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
 
-    embeddings = select_embeddings(
-        provider = model_provider or os.environ.get("MODEL_PROVIDER", "openai"),
-        model_name = embedding_model or os.environ.get("EMBEDDING_MODEL", "text-embedding-3-small")
+    # repeated retrieval strings are answered from the cache instead of the embedding API
+    embeddings = cached_query_embeddings(
+        model_provider,
+        embedding_model,
+        cache_size=query_cache_size,
+        cache_path=query_cache_path,
+        prewarm_queries=prewarm_queries
     )
 
     def make_retriever(index_name: str):
@@ -73,3 +126,56 @@ def pinecone_retriever_tool(
     )
 
     return retriever_tool
+
+
+def local_retriever_tool(
+    name: str,
+    description: str,
+    index_path: str,
+    model_provider: str,
+    embedding_model: str,
+    search_k: int = 6,
+    where: dict = None,
+    query_cache_size: int = 4096,
+    query_cache_path: Optional[str] = None,
+    prewarm_queries: Optional[Iterable[str]] = None
+):
+    """
+    Creates a LangChain retriever tool over an in-process `VectorIndex`, a memory-mapped NumPy matrix
+    on local disk, as an alternative to `pinecone_retriever_tool` without an external vector store.
+
+    Args:
+        name: The name to assign to the created LangChain tool.
+        description: The description for the created LangChain tool.
+        index_path: Directory of the `VectorIndex`.
+        model_provider: The model vendor such as `openai`, `azure` or `anthropic`
+        embedding_model: The embedding model the index was built with, such as `text-embedding-3-small`
+        search_k: The number of documents to retrieve (k). Defaults to 6.
+        where: Optional metadata filter such as {"isCertified": "True", "projectName": ["Finance"]}.
+        query_cache_size: Query embeddings kept in memory. Defaults to 4096.
+        query_cache_path: SQLite file persisting query embeddings, defaults to QUERY_EMBEDDING_CACHE.
+        prewarm_queries: Common retrieval strings embedded in one batch when the tool is created.
+
+    Returns:
+        A LangChain BaseTool configured to use the local retriever.
+    """
+    embeddings = cached_query_embeddings(
+        model_provider,
+        embedding_model,
+        cache_size=query_cache_size,
+        cache_path=query_cache_path,
+        prewarm_queries=prewarm_queries
+    )
+
+    retriever = VectorIndexRetriever(
+        index=VectorIndex(index_path),
+        embeddings=embeddings,
+        k=search_k,
+        where=where
+    )
+
+    return create_retriever_tool(
+        retriever,
+        name=name,
+        description=description
+    )
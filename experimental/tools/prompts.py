@@ -1,3 +1,5 @@
+from types import MappingProxyType
+
 # vds_schema = {
 #     "FieldBase": {
 #         "type": "object",
@@ -1411,6 +1413,14 @@ vds_prompt_data = {
     "previous_vds_payload": {}
 }
 
+# Static part of the query writing prompt rendered once at import. It is read-only and shared by every tool
+# call, which only supplies a small overlay of per-call keys (task, data_dictionary, data_model, errors)
+vds_prompt_static = MappingProxyType({
+    "vds_schema": str(vds_schema),
+    "sample_queries": str(sample_queries),
+    "error_queries": str(error_queries)
+})
+
 vds_query = """
 Task:
 Your job is to write the main body of a request to the Tableau VizQL Data Service (VDS) API to
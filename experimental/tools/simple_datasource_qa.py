@@ -1,21 +1,86 @@
 import json
-from typing import Optional
+import asyncio
+from typing import Optional, Annotated, List
 from pydantic import BaseModel, Field
 
 from langchain.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
 from langchain_core.tools import tool, ToolException
+from langgraph.prebuilt import InjectedState
 
-from experimental.tools.prompts import vds_query, vds_prompt_data, vds_response
-from experimental.utilities.auth import jwt_connected_app
+from experimental.tools.prompts import vds_query, vds_prompt_static, vds_response
+from experimental.tools.vds_query_model import StructuredQueryWriter, query_text
+from experimental.utilities.admission import AdmissionController, AdmissionRejected, INTERACTIVE, BATCH
 from experimental.utilities.models import select_model
+from experimental.utilities.model_router import QueryWriterRouter
+from experimental.utilities.query_merging import VDSQueryMerger
+from experimental.utilities.rollup import RollupCache
+from experimental.utilities.columnar import field_types_from_metadata, query_vds_arrays
+from experimental.utilities.fast_path import FastQueryBuilder
+from experimental.utilities.metadata_store import MetadataSnapshotStore, user_scope
+from experimental.utilities.session_pool import TableauSessionPool, is_auth_failure
+from experimental.utilities.vizql_data_service import query_vds_stream
 from experimental.utilities.simple_datasource_qa import (
     env_vars_simple_datasource_qa,
     augment_datasource_metadata,
+    get_datasource_metadata,
     get_headlessbi_data,
     prepare_prompt_inputs
 )
 
 
+# Session scopes are limited to only required authorizations to Tableau resources that support tool operations
+access_scopes = [
+    "tableau:content:read", # for quering Tableau Metadata API
+    "tableau:viz_data_service:read" # for querying VizQL Data Service
+]
+
+class TableauSignInError(ToolException):
+    """Signing in to Tableau failed, so replacing the pooled session would fail the same way"""
+
+
+# Query writing template with the static instructions rendered once and shared by all tool calls,
+# each call only provides the per-call keys produced by `augment_datasource_metadata`
+query_writing_prompt = PromptTemplate(
+    input_variables=[
+        "task",
+        "vds_schema",
+        "sample_queries",
+        "error_queries",
+        "data_dictionary",
+        "data_model",
+        "previous_call_error",
+        "previous_vds_payload"
+    ],
+    template=vds_query
+).partial(**vds_prompt_static)
+
+# Response template for the Agent with further instructions
+response_prompt = PromptTemplate(
+    input_variables=[
+        "data_source_name",
+        "data_source_description",
+        "data_source_maintainer",
+        "vds_query",
+        "data_table",
+        "user_input"
+    ],
+    template=vds_response
+)
+
+
+def query_writer_router(env_vars: dict, structured_output: bool = False) -> Optional[QueryWriterRouter]:
+    """Routes simple questions to the fast tooling model when one is configured"""
+    if not env_vars.get("fast_llm_model"):
+        return None
+    small_model = select_model(provider=env_vars["model_provider"], model_name=env_vars["fast_llm_model"], temperature=0)
+    large_model = select_model(provider=env_vars["model_provider"], model_name=env_vars["tooling_llm_model"], temperature=0)
+    if structured_output:
+        small_model = RunnableLambda(StructuredQueryWriter(small_model).write)
+        large_model = RunnableLambda(StructuredQueryWriter(large_model).write)
+    return QueryWriterRouter(small_model=small_model, large_model=large_model)
+
+
 class DataSourceQAInputs(BaseModel):
     """Describes inputs for usage of the simple_datasource_qa tool"""
 
@@ -51,6 +116,9 @@ class DataSourceQAInputs(BaseModel):
             "{\"fields\":[{\"fieldCaption\":\"Sub-Category\",\"fieldAlias\":\"SubCategory\",\"sortDirection\":\"DESC\",\"sortPriority\":1},{\"function\":\"SUM\",\"fieldCaption\":\"Sales\",\"fieldAlias\":\"TotalSales\"}],\"filters\":[{\"field\":{\"fieldCaption\":\"Order Date\"},\"filterType\":\"QUANTITATIVE_DATE\",\"minDate\":\"2023-04-01\",\"maxDate\":\"2023-10-01\"},{\"field\":{\"fieldCaption\":\"Sales\"},\"filterType\":\"QUANTITATIVE_NUMERICAL\",\"quantitativeFilterType\":\"MIN\",\"min\":200000},{\"field\":{\"fieldCaption\":\"Sub-Category\"},\"filterType\":\"MATCH\",\"exclude\":true,\"contains\":\"Technology\"}]}"
         ],
     )
+    # graph state injected by LangGraph, never generated by the model. Carries the `tableau_credentials`
+    # that client apps send through `stream_graph_updates` so queries can run on behalf of the end user
+    state: Annotated[Optional[dict], InjectedState] = None
 
 
 def initialize_simple_datasource_qa(
@@ -63,7 +131,16 @@ def initialize_simple_datasource_qa(
     tableau_user: Optional[str] = None,
     datasource_luid: Optional[str] = None,
     model_provider: Optional[str] = None,
-    tooling_llm_model: Optional[str] = None
+    tooling_llm_model: Optional[str] = None,
+    fast_llm_model: Optional[str] = None,
+    structured_output: bool = False,
+    max_rows: Optional[int] = None,
+    session_pool: Optional[TableauSessionPool] = None,
+    query_merge_window: float = 0,
+    rollup_cache_ttl: float = 300.0,
+    metadata_store: Optional[MetadataSnapshotStore] = None,
+    admission: Optional[AdmissionController] = None,
+    fast_query_builder: Optional[FastQueryBuilder] = None
 ):
     """
     Initializes the Langgraph tool called 'simple_datasource_qa' for analytical
@@ -79,6 +156,27 @@ def initialize_simple_datasource_qa(
         tableau_user (Optional[str]): The Tableau user to authenticate as.
         datasource_luid (Optional[str]): The LUID of the data source to perform QA on.
         tooling_llm_model (Optional[str]): The LLM model to use for tooling operations.
+        fast_llm_model (Optional[str]): Smaller model writing the queries of simple questions, escalating
+            to `tooling_llm_model` when its query does not validate (see `QueryWriterRouter`).
+        structured_output (bool): Write queries with the model's structured output mode constrained to
+            `VDSQuery` instead of extracting JSON from free text, see `StructuredQueryWriter`.
+        max_rows (Optional[int]): Row budget of query results, defaults to VDS_MAX_ROWS. When set, results are
+            streamed from VDS and reading stops after `max_rows` rows with a truncation note, so a very large
+            result never has to be held in memory. Streamed queries bypass query merging and the roll-up cache.
+        session_pool (Optional[TableauSessionPool]): Pool of per-user Tableau sessions, one is created
+            from the Connected App settings if not provided. Share a pool between tools to share sessions.
+        query_merge_window (float): Seconds a VDS query waits for concurrent tool calls asking for other
+            measures with the same dimensions and filters, so they are answered by a single query. 0, the default, disables merging.
+        rollup_cache_ttl (float): Seconds VDS results are kept to answer follow-up questions locally when they
+            are a roll-up or filter of data already fetched. 0 disables the cache.
+        metadata_store (Optional[MetadataSnapshotStore]): On-disk snapshots of data source metadata so that
+            new workers skip the Metadata API and read-metadata calls on their first question. Snapshots are
+            kept per Tableau user, questions asked with a client `session` always fetch live metadata.
+        admission (Optional[AdmissionController]): Limits concurrent calls per site and data source and
+            paces VDS and LLM requests. Share one controller between tools and batch jobs of a process.
+            Calls over the limits fail fast with a ToolException instead of queueing indefinitely.
+        fast_query_builder (Optional[FastQueryBuilder]): Builds the VDS query of template-shaped questions
+            ("sales by region last month") without the LLM, other questions are written by the LLM.
 
     Returns:
         function: A decorated function that can be used as a langgraph tool for data source QA.
@@ -92,6 +190,10 @@ def initialize_simple_datasource_qa(
     Note:
         If arguments are not provided, the function will attempt to read them from
         environment variables, typically stored in a .env file.
+
+        When the agent graph state contains `tableau_credentials`, the tool runs on behalf of that
+        end user: an existing `session` token is used as is, otherwise a session is obtained for
+        `user` from the pool. Without credentials in state the configured `tableau_user` is used.
     """
     # if arguments are not provided, the tool obtains environment variables directly from .env
     env_vars = env_vars_simple_datasource_qa(
@@ -104,14 +206,45 @@ def initialize_simple_datasource_qa(
         tableau_user=tableau_user,
         datasource_luid=datasource_luid,
         model_provider=model_provider,
-        tooling_llm_model=tooling_llm_model
+        tooling_llm_model=tooling_llm_model,
+        fast_llm_model=fast_llm_model,
+        max_rows=max_rows
+    )
+
+    if session_pool is None:
+        session_pool = TableauSessionPool(
+            tableau_domain=env_vars["domain"],
+            tableau_api=env_vars["tableau_api_version"],
+            jwt_client_id=env_vars["jwt_client_id"],
+            jwt_secret_id=env_vars["jwt_secret_id"],
+            jwt_secret=env_vars["jwt_secret"]
+        )
+
+    query_router = query_writer_router(env_vars, structured_output)
+
+    # agents often split one question into parallel tool calls that only differ by measure
+    query_merger = (
+        VDSQueryMerger(window=query_merge_window, query_fn=query_vds_arrays) if query_merge_window > 0 else None
     )
+    query_fn = query_merger.query if query_merger else None
+
+    # rate limited below the roll-up cache so that locally answered questions do not use VDS tokens
+    if admission is not None:
+        query_fn = admission.limit_vds(query_fn or query_vds_arrays)
+
+    # follow-up questions are often a coarser view of data that was just fetched, rows are fetched
+    # in the ARRAYS format and kept as objects
+    if rollup_cache_ttl > 0:
+        query_fn = RollupCache(query_fn=query_fn or query_vds_arrays, ttl=rollup_cache_ttl).query
+
+    stream_fn = admission.limit_vds(query_vds_stream) if admission is not None else None
 
     @tool("simple_datasource_qa", args_schema=DataSourceQAInputs)
     def simple_datasource_qa(
         user_input: str,
         previous_call_error: Optional[str] = None,
-        previous_vds_payload: Optional[str] = None
+        previous_vds_payload: Optional[str] = None,
+        state: Annotated[Optional[dict], InjectedState] = None
     ) -> dict:
         """
         Queries a Tableau data source for analytical Q&A. Returns a data set you can use to answer user questions.
@@ -125,22 +258,72 @@ def initialize_simple_datasource_qa(
         If you received an error after using this tool, mention it in your next attempt to help the tool correct itself.
         """
 
-        # Session scopes are limited to only required authorizations to Tableau resources that support tool operations
-        access_scopes = [
-            "tableau:content:read", # for quering Tableau Metadata API
-            "tableau:viz_data_service:read" # for querying VizQL Data Service
-        ]
+        if admission is None:
+            return answer(user_input, previous_call_error, previous_vds_payload, state)
+
+        tableau_credentials = (state or {}).get("tableau_credentials") or {}
         try:
-            tableau_session = jwt_connected_app(
-                tableau_domain=env_vars["domain"],
-                tableau_site=env_vars["site"],
-                jwt_client_id=env_vars["jwt_client_id"],
-                jwt_secret_id=env_vars["jwt_secret_id"],
-                jwt_secret=env_vars["jwt_secret"],
-                tableau_api=env_vars["tableau_api_version"],
-                tableau_user=env_vars["tableau_user"],
+            with admission.admit(
+                site=tableau_credentials.get("site") or env_vars["site"],
+                datasource_luid=env_vars["datasource_luid"],
+                priority=INTERACTIVE
+            ):
+                return answer(user_input, previous_call_error, previous_vds_payload, state)
+        except AdmissionRejected as e:
+            raise ToolException(f"""
+            The Tableau data source is handling too many requests right now and this query was not run: {e}
+
+            INSTRUCTION: Do not retry this tool immediately. Inform the user that the data source is busy
+            and that they can ask again in a moment.
+            """)
+
+    def answer(
+        user_input: str,
+        previous_call_error: Optional[str],
+        previous_vds_payload: Optional[str],
+        state: Optional[dict]
+    ) -> dict:
+        # end user credentials forwarded by the client app through the agent graph state
+        tableau_credentials = (state or {}).get("tableau_credentials") or {}
+        try:
+            return answer_once(user_input, previous_call_error, previous_vds_payload, tableau_credentials)
+        except TableauSignInError:
+            raise
+        except Exception as e:
+            # a pooled session Tableau no longer accepts (signed out, server restarted) is replaced once,
+            # sessions sent by the client are theirs to renew
+            if tableau_credentials.get("session") or not is_auth_failure(e):
+                raise
+            session_pool.invalidate(
+                tableau_user=tableau_credentials.get("user") or env_vars["tableau_user"],
+                tableau_site=tableau_credentials.get("site") or env_vars["site"],
                 scopes=access_scopes
             )
+            return answer_once(user_input, previous_call_error, previous_vds_payload, tableau_credentials)
+
+    def answer_once(
+        user_input: str,
+        previous_call_error: Optional[str],
+        previous_vds_payload: Optional[str],
+        tableau_credentials: dict
+    ) -> dict:
+        try:
+            if tableau_credentials.get("session"):
+                tableau_auth = tableau_credentials["session"]
+                tableau_url = tableau_credentials.get("url") or env_vars["domain"]
+                # the user behind a client session is unknown, its metadata is not snapshotted
+                metadata_scope = None
+            else:
+                tableau_user = tableau_credentials.get("user") or env_vars["tableau_user"]
+                tableau_site = tableau_credentials.get("site") or env_vars["site"]
+                tableau_auth = session_pool.get_token(
+                    tableau_user=tableau_user,
+                    tableau_site=tableau_site,
+                    scopes=access_scopes
+                )
+                # pooled sessions are only valid on the server the pool signs in to
+                tableau_url = session_pool.tableau_domain
+                metadata_scope = user_scope(tableau_url, tableau_site, tableau_user)
         except Exception as e:
             auth_error_string = f"""
             CRITICAL ERROR: Could not authenticate to the Tableau site successfully.
@@ -152,39 +335,22 @@ def initialize_simple_datasource_qa(
             user that you are not able to access their Tableau environment at this time. You can also describe
             the nature of the error to help them understand why you can't service their request.
             """
-            raise ToolException(auth_error_string)
-
-        # credentials to access Tableau environment on behalf of the user
-        tableau_auth =  tableau_session['credentials']['token']
+            # a failed sign-in is not a stale session, it is not retried
+            raise TableauSignInError(auth_error_string) from None
 
-        # Data source for VDS querying
+        # data source for VDS querying
         tableau_datasource = env_vars["datasource_luid"]
 
         # 0. Obtain metadata about the data source to enhance the query writing prompt
         query_writing_data = augment_datasource_metadata(
             task = user_input,
             api_key = tableau_auth,
-            url = domain,
+            url = tableau_url,
             datasource_luid = tableau_datasource,
-            prompt = vds_prompt_data,
             previous_errors = previous_call_error,
-            previous_vds_payload = previous_vds_payload
-        )
-
-        # 1. Insert instruction data into the template
-        query_writing_prompt = PromptTemplate(
-            input_variables=[
-                "task"
-                "instructions",
-                "vds_schema",
-                "sample_queries",
-                "error_queries",
-                "data_dictionary",
-                "data_model",
-                "previous_call_error",
-                "previous_vds_payload"
-            ],
-            template=vds_query
+            previous_vds_payload = previous_vds_payload,
+            metadata_store = metadata_store,
+            metadata_scope = metadata_scope
         )
 
         # 2. Instantiate language model to execute the prompt to write a VizQL Data Service query
@@ -196,14 +362,18 @@ def initialize_simple_datasource_qa(
 
         # 3. Query data from Tableau's VizQL Data Service using the AI written payload
         def get_data(vds_query):
-            payload = vds_query.content
+            payload = query_text(vds_query)
 
             try:
                 data = get_headlessbi_data(
                     api_key = tableau_auth,
-                    url = domain,
+                    url = tableau_url,
                     datasource_luid = tableau_datasource,
-                    payload = payload
+                    payload = payload,
+                    query_fn = query_fn,
+                    max_rows = env_vars["max_rows"],
+                    field_types = field_types_from_metadata(query_writing_data['data_model']),
+                    stream_fn = stream_fn
                 )
 
                 return {
@@ -211,10 +381,12 @@ def initialize_simple_datasource_qa(
                     "data_table": data,
                 }
             except Exception as e:
+                if is_auth_failure(e):
+                    raise
                 query_error_message = f"""
                 Tableau's VizQL Data Service return an error for the generated query:
 
-                {str(vds_query.content)}
+                {payload}
 
                 The user_input used to write this query was:
 
@@ -245,21 +417,24 @@ def initialize_simple_datasource_qa(
             inputs = prepare_prompt_inputs(data=data, user_string=user_input)
             return inputs
 
-        # 5. Response template for the Agent with further instructions
-        response_prompt = PromptTemplate(
-            input_variables=[
-                "data_source_name",
-                "data_source_description",
-                "data_source_maintainer",
-                "vds_query",
-                "data_table",
-                "user_input"
-            ],
-            template=vds_response
-        )
-
         # this chain defines the flow of data through the system
-        chain = query_writing_prompt | query_writer | get_data | response_inputs | response_prompt
+        writer_prompt = query_writing_prompt | admission.throttle_llm if admission is not None else query_writing_prompt
+        # template-shaped questions skip the LLM, retries after an error always go to the LLM
+        fast_query = None
+        if fast_query_builder is not None and not previous_call_error:
+            fast_query = fast_query_builder.build(user_input, query_writing_data)
+
+        if fast_query is not None:
+            write_query = RunnableLambda(lambda inputs: fast_query)
+        elif query_router is not None:
+            write_query = RunnableLambda(lambda inputs: query_router.write_query(writer_prompt, inputs))
+        elif structured_output:
+            structured_writer = StructuredQueryWriter(query_writer)
+            captions = [f.get("fieldCaption") for f in query_writing_data["data_model"]]
+            write_query = writer_prompt | RunnableLambda(lambda prompt_value: structured_writer.write(prompt_value, captions))
+        else:
+            write_query = writer_prompt | query_writer
+        chain = write_query | get_data | response_inputs | response_prompt
 
 
         # invoke the chain to generate a query and obtain data
@@ -269,3 +444,248 @@ def initialize_simple_datasource_qa(
         return vizql_data
 
     return simple_datasource_qa
+
+
+def initialize_simple_datasource_qa_batch(
+    domain: Optional[str] = None,
+    site: Optional[str] = None,
+    jwt_client_id: Optional[str] = None,
+    jwt_secret_id: Optional[str] = None,
+    jwt_secret: Optional[str] = None,
+    tableau_api_version: Optional[str] = None,
+    tableau_user: Optional[str] = None,
+    datasource_luid: Optional[str] = None,
+    model_provider: Optional[str] = None,
+    tooling_llm_model: Optional[str] = None,
+    fast_llm_model: Optional[str] = None,
+    structured_output: bool = False,
+    max_rows: Optional[int] = None,
+    session_pool: Optional[TableauSessionPool] = None,
+    max_llm_concurrency: int = 5,
+    max_vds_concurrency: int = 4,
+    metadata_store: Optional[MetadataSnapshotStore] = None,
+    admission: Optional[AdmissionController] = None,
+    fast_query_builder: Optional[FastQueryBuilder] = None
+):
+    """
+    Initializes a batch variant of 'simple_datasource_qa' that answers many questions about the same
+    Tableau Data Source in one pass, such as the questions of a scheduled report.
+
+    Authentication and data source metadata are obtained once for the whole batch. Queries are then
+    written by the tooling model with at most `max_llm_concurrency` requests in flight and executed
+    against VizQL Data Service with at most `max_vds_concurrency` queries in flight.
+
+    Args:
+        domain (Optional[str]): The domain of the Tableau server.
+        site (Optional[str]): The site name on the Tableau server.
+        jwt_client_id (Optional[str]): The client ID for JWT authentication.
+        jwt_secret_id (Optional[str]): The secret ID for JWT authentication.
+        jwt_secret (Optional[str]): The secret for JWT authentication.
+        tableau_api_version (Optional[str]): The version of the Tableau API to use.
+        tableau_user (Optional[str]): The Tableau user to authenticate as.
+        datasource_luid (Optional[str]): The LUID of the data source to perform QA on.
+        tooling_llm_model (Optional[str]): The LLM model to use for tooling operations.
+        fast_llm_model (Optional[str]): Smaller model writing the queries of simple questions, escalating
+            to `tooling_llm_model` when its query does not validate (see `QueryWriterRouter`).
+        structured_output (bool): Write queries with the model's structured output mode constrained to
+            `VDSQuery` instead of extracting JSON from free text, see `StructuredQueryWriter`.
+        max_rows (Optional[int]): Row budget of query results, defaults to VDS_MAX_ROWS. When set, results are
+            streamed from VDS and reading stops after `max_rows` rows with a truncation note, so a very large
+            result never has to be held in memory. Streamed queries bypass query merging and the roll-up cache.
+        session_pool (Optional[TableauSessionPool]): Pool of per-user Tableau sessions, one is created
+            from the Connected App settings if not provided.
+        max_llm_concurrency (int): Maximum number of concurrent query writing requests to the model.
+        max_vds_concurrency (int): Maximum number of concurrent VizQL Data Service queries.
+        metadata_store (Optional[MetadataSnapshotStore]): On-disk snapshots of data source metadata.
+        admission (Optional[AdmissionController]): Shared with the interactive tool, batches wait behind
+            interactive calls for site and data source slots and share the same VDS and LLM rate limits.
+        fast_query_builder (Optional[FastQueryBuilder]): Builds the VDS query of template-shaped questions
+            without the LLM, only the remaining questions are sent to the model.
+
+    Returns:
+        function: An async function taking a list of questions and optional `tableau_credentials`
+        (same shape as in the agent graph state) that returns one result per question, in order:
+        {"user_input", "vds_query", "data_table", "response", "error"}. A failed question has its
+        `error` set and does not affect the others.
+
+    Note:
+        If arguments are not provided, the function will attempt to read them from
+        environment variables, typically stored in a .env file.
+    """
+    env_vars = env_vars_simple_datasource_qa(
+        domain=domain,
+        site=site,
+        jwt_client_id=jwt_client_id,
+        jwt_secret_id=jwt_secret_id,
+        jwt_secret=jwt_secret,
+        tableau_api_version=tableau_api_version,
+        tableau_user=tableau_user,
+        datasource_luid=datasource_luid,
+        model_provider=model_provider,
+        tooling_llm_model=tooling_llm_model,
+        fast_llm_model=fast_llm_model,
+        max_rows=max_rows
+    )
+
+    if session_pool is None:
+        session_pool = TableauSessionPool(
+            tableau_domain=env_vars["domain"],
+            tableau_api=env_vars["tableau_api_version"],
+            jwt_client_id=env_vars["jwt_client_id"],
+            jwt_secret_id=env_vars["jwt_secret_id"],
+            jwt_secret=env_vars["jwt_secret"]
+        )
+
+    query_router = query_writer_router(env_vars, structured_output)
+
+    async def simple_datasource_qa_batch(
+        questions: List[str],
+        tableau_credentials: Optional[dict] = None
+    ) -> List[dict]:
+        if admission is None:
+            return await answer_batch(questions, tableau_credentials)
+
+        # one slot for the whole batch, waiting behind interactive callers
+        ticket = await asyncio.to_thread(
+            admission.acquire,
+            site=(tableau_credentials or {}).get("site") or env_vars["site"],
+            datasource_luid=env_vars["datasource_luid"],
+            priority=BATCH
+        )
+        try:
+            return await answer_batch(questions, tableau_credentials)
+        finally:
+            admission.release(ticket)
+
+    async def answer_batch(
+        questions: List[str],
+        tableau_credentials: Optional[dict] = None
+    ) -> List[dict]:
+        tableau_credentials = tableau_credentials or {}
+        session_key = dict(
+            tableau_user=tableau_credentials.get("user") or env_vars["tableau_user"],
+            tableau_site=tableau_credentials.get("site") or env_vars["site"],
+            scopes=access_scopes
+        )
+
+        # 0. Authenticate and obtain data source metadata once for every question in the batch
+        if tableau_credentials.get("session"):
+            tableau_auth = tableau_credentials["session"]
+            tableau_url = tableau_credentials.get("url") or env_vars["domain"]
+            metadata_scope = None
+        else:
+            tableau_auth = await asyncio.to_thread(session_pool.get_token, **session_key)
+            # pooled sessions are only valid on the server the pool signs in to
+            tableau_url = session_pool.tableau_domain
+            metadata_scope = user_scope(tableau_url, session_key["tableau_site"], session_key["tableau_user"])
+        tableau_datasource = env_vars["datasource_luid"]
+
+        try:
+            datasource_metadata = await asyncio.to_thread(
+                get_datasource_metadata,
+                api_key=tableau_auth,
+                url=tableau_url,
+                datasource_luid=tableau_datasource,
+                metadata_store=metadata_store,
+                metadata_scope=metadata_scope
+            )
+        except Exception as e:
+            # the first call of the batch, a stale pooled session is replaced before any query runs
+            if tableau_credentials.get("session") or not is_auth_failure(e):
+                raise
+            session_pool.invalidate(**session_key)
+            tableau_auth = await asyncio.to_thread(session_pool.get_token, **session_key)
+            datasource_metadata = await asyncio.to_thread(
+                get_datasource_metadata,
+                api_key=tableau_auth,
+                url=tableau_url,
+                datasource_luid=tableau_datasource,
+                metadata_store=metadata_store,
+                metadata_scope=metadata_scope
+            )
+        metadata = datasource_metadata['meta']
+        field_types = field_types_from_metadata(datasource_metadata['data_model'])
+
+        # 1. Write all VDS queries with bounded concurrency, failures are returned instead of raised
+        query_writer = select_model(
+            provider=env_vars["model_provider"],
+            model_name=env_vars["tooling_llm_model"],
+            temperature=0
+        )
+        prompts = [
+            {**datasource_metadata, "task": question, "previous_call_error": {}, "previous_vds_payload": {}}
+            for question in questions
+        ]
+        writer_prompt = query_writing_prompt | admission.throttle_llm if admission is not None else query_writing_prompt
+        if query_router is not None:
+            writer_chain = RunnableLambda(lambda inputs: query_router.write_query(writer_prompt, inputs))
+        elif structured_output:
+            structured_writer = StructuredQueryWriter(query_writer)
+            captions = [f.get("fieldCaption") for f in datasource_metadata["data_model"]]
+            writer_chain = writer_prompt | RunnableLambda(lambda prompt_value: structured_writer.write(prompt_value, captions))
+        else:
+            writer_chain = writer_prompt | query_writer
+        # template-shaped questions are built without the LLM, only the others are sent to the model
+        vds_queries = [
+            fast_query_builder.build(question, datasource_metadata) if fast_query_builder is not None else None
+            for question in questions
+        ]
+        pending = [i for i, vds_query in enumerate(vds_queries) if vds_query is None]
+        if pending:
+            written = await writer_chain.abatch(
+                [prompts[i] for i in pending],
+                config={"max_concurrency": max_llm_concurrency},
+                return_exceptions=True
+            )
+            for i, vds_query in zip(pending, written):
+                vds_queries[i] = vds_query
+
+        # 2. Query VDS in parallel, limited to max_vds_concurrency requests in flight
+        vds_slots = asyncio.Semaphore(max_vds_concurrency)
+        get_data = admission.limit_vds(get_headlessbi_data) if admission is not None else get_headlessbi_data
+
+        async def answer(question: str, vds_query) -> dict:
+            result = {
+                "user_input": question,
+                "vds_query": None,
+                "data_table": None,
+                "response": None,
+                "error": None
+            }
+            if isinstance(vds_query, Exception):
+                result["error"] = f"Failed to write a VDS query: {vds_query}"
+                return result
+
+            result["vds_query"] = query_text(vds_query)
+            try:
+                async with vds_slots:
+                    result["data_table"] = await asyncio.to_thread(
+                        get_data,
+                        api_key=tableau_auth,
+                        url=tableau_url,
+                        datasource_luid=tableau_datasource,
+                        payload=result["vds_query"],
+                        max_rows=env_vars["max_rows"],
+                        field_types=field_types
+                    )
+            except Exception as e:
+                result["error"] = str(e)
+                return result
+
+            # 3. Structured response for the caller, same template as the single question tool
+            data = {
+                "query": result["vds_query"],
+                "data_source_name": metadata.get('datasource_name'),
+                "data_source_description": metadata.get('datasource_description'),
+                "data_source_maintainer": metadata.get('datasource_owner'),
+                "data_table": result["data_table"],
+            }
+            inputs = prepare_prompt_inputs(data=data, user_string=question)
+            result["response"] = response_prompt.format(**inputs)
+            return result
+
+        return await asyncio.gather(*(
+            answer(question, vds_query) for question, vds_query in zip(questions, vds_queries)
+        ))
+
+    return simple_datasource_qa_batch
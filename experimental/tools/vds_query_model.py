@@ -0,0 +1,176 @@
+import json
+from typing import Any, Dict, Iterable, List, Literal, Optional, Union
+from pydantic import BaseModel, ConfigDict, Field
+
+from langchain.chat_models.base import BaseChatModel
+
+from experimental.tools.prompts import vds_schema
+
+
+# enumerations and descriptions are read from `vds_schema` so the model stays in sync with the prompt
+FUNCTIONS = tuple(vds_schema["Function"]["enum"])
+FILTER_TYPES = tuple(vds_schema["Filter"]["properties"]["filterType"]["enum"])
+SORT_DIRECTIONS = tuple(vds_schema["SortDirection"]["enum"])
+QUANTITATIVE_FILTER_TYPES = tuple(
+    vds_schema["QuantitativeFilterBase"]["allOf"][1]["properties"]["quantitativeFilterType"]["enum"]
+)
+_relative_date = vds_schema["RelativeDateFilter"]["allOf"][1]["properties"]
+PERIOD_TYPES = tuple(_relative_date["periodType"]["enum"])
+DATE_RANGE_TYPES = tuple(_relative_date["dateRangeType"]["enum"])
+
+
+def _describe(schema: str, prop: str) -> Optional[str]:
+    definition = vds_schema[schema]
+    properties = definition.get("properties") or definition.get("allOf", [{}, {}])[-1].get("properties", {})
+    return properties.get(prop, {}).get("description")
+
+
+class QueryField(BaseModel):
+    """A column of the query: a data source field, optionally aggregated, or a Tableau calculation"""
+    model_config = ConfigDict(extra="forbid")
+
+    fieldCaption: str = Field(..., description=_describe("FieldBase", "fieldCaption"))
+    function: Optional[Literal[FUNCTIONS]] = Field(None, description=vds_schema["Function"]["description"])
+    calculation: Optional[str] = Field(None, description="A Tableau calculation which will be returned as a Field in the Query")
+    fieldAlias: Optional[str] = Field(None, description=_describe("FieldBase", "fieldAlias"))
+    logicalTableId: Optional[str] = Field(None, description=_describe("FieldBase", "logicalTableId"))
+    maxDecimalPlaces: Optional[int] = Field(None, description=_describe("FieldBase", "maxDecimalPlaces"))
+    sortDirection: Optional[Literal[SORT_DIRECTIONS]] = Field(None, description=vds_schema["SortDirection"]["description"])
+    sortPriority: Optional[int] = Field(None, description=_describe("FieldBase", "sortPriority"))
+
+
+class FilterField(BaseModel):
+    """The field a filter applies to, by caption (optionally aggregated) or as a calculation"""
+    model_config = ConfigDict(extra="forbid")
+
+    fieldCaption: Optional[str] = Field(None, description="The caption of the field to filter on")
+    function: Optional[Literal[FUNCTIONS]] = None
+    calculation: Optional[str] = Field(None, description="A Tableau calculation which will be used to Filter on")
+    logicalTableId: Optional[str] = None
+
+
+class QueryFilter(BaseModel):
+    """
+    A filter of the query. `filterType` selects which of the optional properties apply:
+    QUANTITATIVE_DATE and QUANTITATIVE_NUMERICAL use quantitativeFilterType with min/max or minDate/maxDate,
+    SET uses values, MATCH uses contains/startsWith/endsWith, DATE uses periodType/dateRangeType/rangeN
+    and TOP uses howMany/fieldToMeasure/direction.
+    """
+    model_config = ConfigDict(extra="forbid")
+
+    field: FilterField
+    filterType: Literal[FILTER_TYPES]
+    context: Optional[bool] = Field(None, description=_describe("Filter", "context"))
+    exclude: Optional[bool] = None
+    # quantitative filters
+    quantitativeFilterType: Optional[Literal[QUANTITATIVE_FILTER_TYPES]] = None
+    includeNulls: Optional[bool] = None
+    min: Optional[float] = Field(None, description=_describe("QuantitativeNumericalFilter", "min"))
+    max: Optional[float] = Field(None, description=_describe("QuantitativeNumericalFilter", "max"))
+    minDate: Optional[str] = Field(None, description=_describe("QuantitativeDateFilter", "minDate"))
+    maxDate: Optional[str] = Field(None, description=_describe("QuantitativeDateFilter", "maxDate"))
+    # set filters
+    values: Optional[List[Union[str, int, float, bool]]] = Field(None, description=_describe("SetFilter", "values"))
+    # match filters
+    contains: Optional[str] = None
+    startsWith: Optional[str] = None
+    endsWith: Optional[str] = None
+    # relative date filters
+    periodType: Optional[Literal[PERIOD_TYPES]] = Field(None, description=_relative_date["periodType"]["description"])
+    dateRangeType: Optional[Literal[DATE_RANGE_TYPES]] = Field(None, description=_relative_date["dateRangeType"]["description"])
+    rangeN: Optional[int] = Field(None, description=_relative_date["rangeN"]["description"])
+    anchorDate: Optional[str] = Field(None, description=_relative_date["anchorDate"]["description"])
+    # top N filters
+    direction: Optional[Literal["TOP", "BOTTOM"]] = None
+    howMany: Optional[int] = Field(None, description=_describe("TopNFilter", "howMany"))
+    fieldToMeasure: Optional[FilterField] = None
+
+
+class VDSQuery(BaseModel):
+    """Query to the Tableau VizQL Data Service: the fields to return and optional filters"""
+    model_config = ConfigDict(extra="forbid")
+
+    fields: List[QueryField] = Field(..., min_length=1, description=vds_schema["Query"]["properties"]["fields"]["description"])
+    filters: Optional[List[QueryFilter]] = Field(None, description=vds_schema["Query"]["properties"]["filters"]["description"])
+
+
+def query_text(output: Any) -> str:
+    """
+    The query written by a query writer as text: a serialized `VDSQuery` or query dict (such as those of
+    `FastQueryBuilder`) or the content of a chat message
+    """
+    if isinstance(output, VDSQuery):
+        return output.model_dump_json(exclude_none=True)
+    if isinstance(output, dict):
+        return json.dumps(output)
+    return output.content
+
+
+class PartialQueryValidator:
+    """
+    Validates a query while it is being generated, on the partial objects of a streamed structured output,
+    so that a query using an unknown field or function fails as soon as that field is complete instead of
+    after the whole response. Only items followed by another item, or all items once `complete`, are checked
+    since the last one may still be streaming.
+
+    Args:
+        captions (Optional[Iterable[str]]): Field captions of the data source, not checked when empty.
+    """
+
+    def __init__(self, captions: Optional[Iterable[str]] = None):
+        self.captions = set(captions or ())
+
+    def _check_field(self, field: Any, kind: str) -> None:
+        if not isinstance(field, dict):
+            raise ValueError(f"{kind} must be an object, got {field!r}")
+        function = field.get("function")
+        if function is not None and function not in FUNCTIONS:
+            raise ValueError(f"{kind} '{field.get('fieldCaption')}' uses unknown function {function}")
+        caption = field.get("fieldCaption")
+        if self.captions and "calculation" not in field and caption not in self.captions:
+            raise ValueError(f"{kind} '{caption}' does not exist in the data source")
+
+    def check(self, partial: Dict[str, Any], complete: bool = False) -> None:
+        unexpected = set(partial) - {"fields", "filters"}
+        if unexpected:
+            raise ValueError(f"Unexpected query properties {sorted(unexpected)}")
+
+        fields = partial.get("fields") or []
+        for field in fields if complete else fields[:-1]:
+            self._check_field(field, "Field")
+
+        filters = partial.get("filters") or []
+        for query_filter in filters if complete else filters[:-1]:
+            if query_filter.get("filterType") not in FILTER_TYPES:
+                raise ValueError(f"Unknown filterType {query_filter.get('filterType')}")
+            self._check_field(query_filter.get("field"), "Filter field")
+
+
+class StructuredQueryWriter:
+    """
+    Writes VDS queries with the provider's structured output mode instead of parsing JSON out of free text.
+
+    The model is constrained to the JSON schema of `VDSQuery` and its output streamed as partial objects that
+    `PartialQueryValidator` checks as they grow. `write` returns a parsed `VDSQuery` or raises ValueError as
+    soon as the query is known to be invalid, without waiting for the rest of the response.
+
+    Args:
+        model (BaseChatModel): The tooling model.
+        method (str): Structured output method of the model, "function_calling" works with every OpenAI and
+            Azure OpenAI API version, "json_schema" needs a model and API version supporting it.
+    """
+
+    def __init__(self, model: BaseChatModel, method: str = "function_calling"):
+        # a JSON schema rather than the Pydantic class, so the output streams as partial dicts
+        self.runnable = model.with_structured_output(VDSQuery.model_json_schema(), method=method)
+
+    def write(self, prompt_value: Any, captions: Optional[Iterable[str]] = None) -> VDSQuery:
+        validator = PartialQueryValidator(captions)
+        query = None
+        for query in self.runnable.stream(prompt_value):
+            if query:
+                validator.check(query)
+        if not query:
+            raise ValueError("The model did not return a query")
+        validator.check(query, complete=True)
+        return VDSQuery.model_validate(query)
@@ -0,0 +1,247 @@
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Optional, Tuple
+
+
+# caller priorities, lower is served first
+INTERACTIVE = 0
+BATCH = 1
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised when a call is rejected instead of queued, because a queue is full or would take too long"""
+
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket allowing `rate` calls per second on average with bursts up to `capacity`.
+
+    A call that would have to wait longer than `max_wait` seconds for its token is rejected right
+    away, without waiting, so overload surfaces as an explicit error rather than a timeout.
+    """
+
+    def __init__(self, rate: float, capacity: float, max_wait: float = 5.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0, max_wait: Optional[float] = None) -> float:
+        """Takes tokens, sleeping until they are available. Returns the seconds waited"""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (tokens - self._tokens) / self.rate)
+            if wait > max_wait:
+                raise AdmissionRejected(
+                    f"Rate limit: the next call is allowed in {wait:.1f}s, more than the {max_wait:.1f}s allowed",
+                    reason="rate_limited"
+                )
+            # reserve the tokens now, the balance goes negative while this caller sleeps
+            self._tokens -= tokens
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class PrioritySemaphore:
+    """
+    Thread-safe semaphore whose waiters are served by priority, then arrival order, with a bounded
+    queue: once `max_queued` callers wait, further callers are rejected immediately.
+    """
+
+    def __init__(self, limit: int, max_queued: int):
+        self.limit = limit
+        self.max_queued = max_queued
+        self.in_use = 0
+        self.queued = 0
+        self._waiters: list = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def acquire(self, priority: int = INTERACTIVE, timeout: Optional[float] = None) -> None:
+        with self._lock:
+            if self.in_use < self.limit and not self.queued:
+                self.in_use += 1
+                return
+            if self.queued >= self.max_queued:
+                raise AdmissionRejected(f"Queue full ({self.queued} waiting)", reason="queue_full")
+            # [priority, order, event, granted, cancelled]
+            waiter = [priority, next(self._counter), threading.Event(), False, False]
+            heapq.heappush(self._waiters, waiter)
+            self.queued += 1
+
+        waiter[2].wait(timeout)
+        with self._lock:
+            if waiter[3]:
+                return
+            waiter[4] = True
+            self.queued -= 1
+        raise AdmissionRejected(f"Waited more than {timeout:.1f}s in queue", reason="queue_timeout")
+
+    def release(self) -> None:
+        with self._lock:
+            while self._waiters:
+                waiter = heapq.heappop(self._waiters)
+                if waiter[4]:
+                    continue
+                # hand the slot over to the next waiter
+                waiter[3] = True
+                self.queued -= 1
+                waiter[2].set()
+                return
+            self.in_use -= 1
+
+
+class AdmissionController:
+    """
+    Admission control for tool executions on a shared Tableau deployment.
+
+    Every call first takes a slot of its site and of its data source (at most `max_per_site` and
+    `max_per_datasource` executions at once). Waiting callers are queued by priority, interactive
+    agent calls ahead of batch jobs, and a call is rejected with `AdmissionRejected` as soon as its
+    queue is full or after waiting `max_queue_time` (`batch_max_queue_time` for batch callers).
+    VDS and LLM calls are additionally paced by token buckets so bursts do not trigger 429s from
+    Tableau or the model provider.
+
+    `metrics()` reports admissions, rejections by reason, queue times and current occupancy.
+
+    Args:
+        max_per_site (int): Concurrent executions per Tableau site.
+        max_per_datasource (int): Concurrent executions per data source.
+        max_queued (int): Callers waiting per site or data source before new ones are rejected.
+        max_queue_time (float): Seconds an interactive caller may wait for its slots.
+        batch_max_queue_time (float): Seconds a batch caller may wait for its slots.
+        vds_rate (float): VDS queries per second, `vds_burst` at once.
+        llm_rate (float): LLM requests per second, `llm_burst` at once.
+        max_rate_wait (float): Seconds a call may wait for a rate limiter token before being rejected.
+    """
+
+    def __init__(
+        self,
+        max_per_site: int = 16,
+        max_per_datasource: int = 4,
+        max_queued: int = 32,
+        max_queue_time: float = 5.0,
+        batch_max_queue_time: float = 120.0,
+        vds_rate: float = 10.0,
+        vds_burst: float = 20.0,
+        llm_rate: float = 5.0,
+        llm_burst: float = 10.0,
+        max_rate_wait: float = 5.0
+    ):
+        self.max_per_site = max_per_site
+        self.max_per_datasource = max_per_datasource
+        self.max_queued = max_queued
+        self.queue_times = {INTERACTIVE: max_queue_time, BATCH: batch_max_queue_time}
+        self.vds_bucket = TokenBucket(vds_rate, vds_burst, max_wait=max_rate_wait)
+        self.llm_bucket = TokenBucket(llm_rate, llm_burst, max_wait=max_rate_wait)
+        self._semaphores: Dict[Tuple[str, str], PrioritySemaphore] = {}
+        self._lock = threading.Lock()
+        self._waits: deque = deque(maxlen=1000)
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {}
+
+    def _semaphore(self, kind: str, key: str) -> PrioritySemaphore:
+        with self._lock:
+            semaphore = self._semaphores.get((kind, key))
+            if semaphore is None:
+                limit = self.max_per_site if kind == "site" else self.max_per_datasource
+                semaphore = PrioritySemaphore(limit, self.max_queued)
+                self._semaphores[(kind, key)] = semaphore
+            return semaphore
+
+    def _rejected(self, e: AdmissionRejected) -> None:
+        with self._lock:
+            self.rejected[e.reason] = self.rejected.get(e.reason, 0) + 1
+
+    def acquire(self, site: str, datasource_luid: str, priority: int = INTERACTIVE) -> Tuple:
+        """Takes the site and data source slots, returns a ticket for `release`"""
+        started = time.monotonic()
+        deadline = started + self.queue_times.get(priority, self.queue_times[BATCH])
+        site_slot = self._semaphore("site", site)
+        datasource_slot = self._semaphore("datasource", datasource_luid)
+        try:
+            # always site before data source, so concurrent callers cannot deadlock
+            site_slot.acquire(priority, timeout=max(0.0, deadline - time.monotonic()))
+            try:
+                datasource_slot.acquire(priority, timeout=max(0.0, deadline - time.monotonic()))
+            except AdmissionRejected:
+                site_slot.release()
+                raise
+        except AdmissionRejected as e:
+            self._rejected(e)
+            raise
+        waited = time.monotonic() - started
+        with self._lock:
+            self.admitted += 1
+            self._waits.append(waited)
+        return site_slot, datasource_slot
+
+    def release(self, ticket: Tuple) -> None:
+        site_slot, datasource_slot = ticket
+        datasource_slot.release()
+        site_slot.release()
+
+    @contextmanager
+    def admit(self, site: str, datasource_luid: str, priority: int = INTERACTIVE):
+        ticket = self.acquire(site, datasource_luid, priority)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def throttle_llm(self, value: Any) -> Any:
+        """Waits for an LLM rate limiter token, usable as a step of a chain before the model"""
+        try:
+            self.llm_bucket.acquire()
+        except AdmissionRejected as e:
+            self._rejected(e)
+            raise
+        return value
+
+    def limit_vds(self, query_fn: Callable) -> Callable:
+        """Wraps a VDS calling function taking keyword arguments, such as `query_vds`, so every call waits for a VDS token"""
+        def limited(**kwargs):
+            try:
+                self.vds_bucket.acquire()
+            except AdmissionRejected as e:
+                self._rejected(e)
+                raise
+            return query_fn(**kwargs)
+        return limited
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._waits)
+            occupancy = {
+                f"{kind}:{key}": {"in_use": s.in_use, "queued": s.queued}
+                for (kind, key), s in self._semaphores.items()
+                if s.in_use or s.queued
+            }
+            rejected = dict(self.rejected)
+            admitted = self.admitted
+
+        def percentile(p: float) -> float:
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+        return {
+            "admitted": admitted,
+            "rejected": rejected,
+            "queue_time_p50": percentile(0.5),
+            "queue_time_p95": percentile(0.95),
+            "queue_time_max": waits[-1] if waits else 0.0,
+            "occupancy": occupancy,
+        }
@@ -1,11 +1,11 @@
 
 from typing import Dict, Any, List
-import requests
 import jwt
 from datetime import datetime, timedelta, timezone
 from uuid import uuid4
 
 from experimental.utilities.utils import http_post
+from experimental.utilities.transport import post_json, response_json
 
 def jwt_connected_app(
         tableau_domain: str,
@@ -73,11 +73,11 @@ def jwt_connected_app(
         }
     }
 
-    response = requests.post(endpoint, headers=headers, json=payload)
+    response = post_json(endpoint, headers, payload)
 
     # Check if the request was successful (status code 200)
     if response.status_code == 200:
-        return response.json()
+        return response_json(response)
     else:
         error_message = (
             f"Failed to authenticate to the Tableau site. "
@@ -0,0 +1,163 @@
+from typing import Dict, Any, List, Optional, Iterator
+
+import numpy as np
+
+from experimental.utilities.query_merging import column_name
+from experimental.utilities.vizql_data_service import query_vds, to_vds_query
+
+
+# result type of a field by its function, the field's own dataType applies to everything else
+FUNCTION_TYPES = {
+    "COUNT": "INTEGER",
+    "COUNTD": "INTEGER",
+    "AVG": "REAL",
+    "MEDIAN": "REAL",
+    "STDEV": "REAL",
+    "VAR": "REAL",
+    "YEAR": "INTEGER",
+    "QUARTER": "INTEGER",
+    "MONTH": "INTEGER",
+    "WEEK": "INTEGER",
+    "DAY": "INTEGER",
+    "TRUNC_YEAR": "DATE",
+    "TRUNC_QUARTER": "DATE",
+    "TRUNC_MONTH": "DATE",
+    "TRUNC_WEEK": "DATE",
+    "TRUNC_DAY": "DATE",
+}
+
+
+def field_types_from_metadata(metadata: Any) -> Dict[str, str]:
+    """
+    Maps field captions to their dataType from a `read-metadata` response, or from its normalized
+    'data_model' list as produced by `get_datasource_metadata`.
+    """
+    fields = metadata.get("data", []) if isinstance(metadata, dict) else metadata or []
+    return {
+        f.get("fieldCaption") or f.get("fieldName"): f.get("dataType", "UNKNOWN")
+        for f in fields
+        if f.get("fieldCaption") or f.get("fieldName")
+    }
+
+
+def result_type(field: Dict[str, Any], field_types: Dict[str, str]) -> str:
+    """The dataType of a query field's values, taking its function into account"""
+    function = field.get("function")
+    if function in FUNCTION_TYPES:
+        return FUNCTION_TYPES[function]
+    return field_types.get(field.get("fieldCaption"), "UNKNOWN")
+
+
+def _buffer(values: List[Any], data_type: str):
+    """
+    Typed column buffer: int64/float64/bool arrays for numeric columns, lists for everything else.
+    Integer columns with nulls are masked int64 arrays so their values still render as integers.
+    """
+    if data_type == "REAL":
+        return np.array([np.nan if v is None else float(v) for v in values], dtype=np.float64)
+    if data_type == "INTEGER":
+        if any(v is None for v in values):
+            return np.ma.masked_array(
+                [0 if v is None else int(v) for v in values],
+                mask=[v is None for v in values],
+                dtype=np.int64
+            )
+        return np.array([int(v) for v in values], dtype=np.int64)
+    if data_type == "BOOLEAN" and not any(v is None for v in values):
+        return np.array([v in (True, "true", "TRUE", "True") for v in values], dtype=bool)
+    return list(values)
+
+
+def _python(value: Any) -> Any:
+    if value is np.ma.masked:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+class ColumnarResult:
+    """
+    Column oriented VDS result decoded from the ARRAYS return format.
+
+    Column names and types are resolved once from the query fields and the `read-metadata` types
+    rather than being repeated on every row as with OBJECTS, and values are stored in one typed
+    buffer per column.
+    """
+
+    def __init__(self, columns: List[str], types: List[str], buffers: List[Any]):
+        self.columns = columns
+        self.types = types
+        self.buffers = buffers
+
+    @classmethod
+    def from_vds(
+        cls,
+        response: Dict[str, Any],
+        query: Dict[str, Any],
+        field_types: Optional[Dict[str, str]] = None
+    ) -> "ColumnarResult":
+        """
+        Decodes a `query_vds(..., return_format="ARRAYS")` response.
+
+        Args:
+            response (Dict[str, Any]): The VDS response, rows are lists in the order of the query fields.
+            query (Dict[str, Any]): The VDS query that produced the response.
+            field_types (Optional[Dict[str, str]]): dataType by field caption, see `field_types_from_metadata`.
+        """
+        fields = query.get("fields", [])
+        columns = [column_name(f) for f in fields]
+        types = [result_type(f, field_types or {}) for f in fields]
+        rows = response.get("data", [])
+
+        if rows and isinstance(rows[0], dict):
+            # the server answered with objects anyway
+            values = [[row.get(c) for row in rows] for c in columns]
+        else:
+            values = [list(column) for column in zip(*rows)] if rows else [[] for _ in columns]
+        if len(values) != len(columns):
+            raise ValueError(
+                f"VDS returned {len(values)} columns for a query with {len(columns)} fields"
+            )
+
+        return cls(columns, types, [_buffer(v, t) for v, t in zip(values, types)])
+
+    def __len__(self) -> int:
+        return len(self.buffers[0]) if self.buffers else 0
+
+    def column(self, name: str):
+        """Typed buffer of a column"""
+        return self.buffers[self.columns.index(name)]
+
+    def iter_rows(self) -> Iterator[List[Any]]:
+        """Rows as lists of plain Python values, nulls as None"""
+        for i in range(len(self)):
+            yield [_python(buffer[i]) for buffer in self.buffers]
+
+    def to_objects(self) -> List[Dict[str, Any]]:
+        """Rows in the OBJECTS shape, for consumers that expect it"""
+        return [dict(zip(self.columns, row)) for row in self.iter_rows()]
+
+
+def query_vds_arrays(
+    api_key: str,
+    datasource_luid: str,
+    url: str,
+    query: Dict[str, Any],
+    field_types: Optional[Dict[str, str]] = None,
+    **kwargs: Any
+) -> Dict[str, Any]:
+    """
+    Same contract as `query_vds`, rows are returned as objects, but they are requested in the ARRAYS
+    format and decoded with `ColumnarResult`. Use it as the `query_fn` of `VDSQueryMerger` and
+    `RollupCache`, which key rows by column, so their VDS responses do not repeat every column name.
+    """
+    query = to_vds_query(query, field_types)
+    response = query_vds(
+        api_key=api_key, datasource_luid=datasource_luid, url=url, query=query, return_format="ARRAYS", **kwargs
+    )
+    if not isinstance(response, dict) or not isinstance(response.get("data"), list):
+        return response
+    return {**response, "data": ColumnarResult.from_vds(response, query, field_types).to_objects()}
@@ -0,0 +1,135 @@
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Iterable
+
+import numpy as np
+
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_query(text: str) -> str:
+    """Case and whitespace folded query text, so trivially different retrieval strings share an embedding"""
+    return " ".join(text.lower().split())
+
+
+class CachedQueryEmbeddings(Embeddings):
+    """
+    Wraps an `Embeddings` model with a cache of query embeddings keyed by (provider, model, normalized
+    text): an in-memory LRU and, if `path` is set, a SQLite file shared across processes and restarts.
+    Only the key is normalized, the model embeds the query as given so acronyms like "KPI" keep their case.
+
+    Agents repeat the same retrieval strings across turns and users ("KPI metrics summary"), every
+    cache hit saves an embedding API call on the retrieval hot path. Document embeddings are passed
+    through uncached.
+
+    Args:
+        embeddings (Embeddings): The embedding model, such as one from `select_embeddings`.
+        provider (str): Model vendor, part of the cache key.
+        model (str): Embedding model name, part of the cache key.
+        max_entries (int): Query embeddings kept in memory.
+        path (Optional[str]): SQLite file of the persistent cache, None keeps it in memory only.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        provider: str,
+        model: str,
+        max_entries: int = 4096,
+        path: Optional[str] = None
+    ):
+        self.embeddings = embeddings
+        self.provider = provider
+        self.model = model
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if path:
+            connection = self._connection()
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+        return connection
+
+    def _key(self, text: str) -> str:
+        text = normalize_query(text)
+        return hashlib.sha256(f"{self.provider}\0{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._memory[key] = vector
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _lookup(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                return vector
+        if self.path:
+            row = self._connection().execute(
+                "SELECT vector FROM query_embeddings WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None:
+                vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+                self._remember(key, vector)
+                return vector
+        return None
+
+    def _store(self, items: List[tuple]) -> None:
+        for key, vector in items:
+            self._remember(key, vector)
+        if self.path and items:
+            connection = self._connection()
+            connection.executemany(
+                "INSERT OR REPLACE INTO query_embeddings (key, vector) VALUES (?, ?)",
+                [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+            )
+            connection.commit()
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        vector = self._lookup(key)
+        if vector is not None:
+            self.hits += 1
+            return vector
+        self.misses += 1
+        vector = self.embeddings.embed_query(text)
+        self._store([(key, vector)])
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def prewarm(self, queries: Iterable[str], max_workers: int = 8) -> int:
+        """
+        Embeds common queries ahead of time, skipping cached ones. Queries go through `embed_query` as some
+        models embed queries and documents differently, up to `max_workers` at once rather than one after
+        another. Returns the number of queries embedded.
+        """
+        texts = {}
+        for query in queries:
+            texts.setdefault(self._key(query), query)
+        missing = [(key, text) for key, text in texts.items() if self._lookup(key) is None]
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+                vectors = list(executor.map(self.embeddings.embed_query, [text for _, text in missing]))
+            self._store([(key, vector) for (key, _), vector in zip(missing, vectors)])
+        return len(missing)
@@ -0,0 +1,353 @@
+import re
+import threading
+from typing import Dict, Any, List, Optional, Set, Tuple
+
+from experimental.utilities.vizql_data_service import _adapt_old_request_to_new_query
+
+
+# words carrying no meaning for the query, any other word not understood sends the question to the LLM
+STOPWORDS = {
+    "a", "an", "the", "what", "whats", "which", "show", "me", "give", "get", "list", "tell", "display", "find",
+    "is", "are", "was", "were", "did", "do", "does", "our", "my", "we", "us", "i", "please", "of", "for", "by",
+    "per", "each", "every", "across", "and", "with", "in", "to", "all", "how", "much", "many", "breakdown",
+    "broken", "down", "split", "grouped", "group", "view", "data", "values", "value", "have", "had", "has",
+    "see", "can", "you", "overall", "during", "on", "at", "as",
+}
+
+# aggregation words, "number of" and "sum of" are matched as two tokens
+AGGREGATIONS = {
+    ("total",): "SUM", ("sum",): "SUM", ("sum", "of"): "SUM",
+    ("average",): "AVG", ("avg",): "AVG", ("mean",): "AVG",
+    ("median",): "MEDIAN",
+    ("minimum",): "MIN", ("min",): "MIN",
+    ("maximum",): "MAX", ("max",): "MAX",
+    ("count",): "COUNT", ("number", "of"): "COUNT",
+    ("distinct",): "COUNTD", ("unique",): "COUNTD", ("count", "distinct"): "COUNTD",
+}
+
+# default aggregation of a measure in the Metadata API to a VDS function
+DEFAULT_FUNCTIONS = {"sum": "SUM", "avg": "AVG", "average": "AVG", "median": "MEDIAN", "min": "MIN",
+                     "max": "MAX", "count": "COUNT", "countd": "COUNTD"}
+
+# date grains, as a dimension ("by month", "monthly") and as units of relative periods ("last 3 months")
+GRAINS = {
+    "day": "DAY", "days": "DAY", "daily": "DAY",
+    "week": "WEEK", "weeks": "WEEK", "weekly": "WEEK",
+    "month": "MONTH", "months": "MONTH", "monthly": "MONTH",
+    "quarter": "QUARTER", "quarters": "QUARTER", "quarterly": "QUARTER",
+    "year": "YEAR", "years": "YEAR", "yearly": "YEAR", "annual": "YEAR", "annually": "YEAR",
+}
+
+NUMBERS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+           "ten": 10, "fifteen": 15, "twenty": 20, "fifty": 50, "hundred": 100}
+
+DATE_TYPES = {"DATE", "DATETIME"}
+NUMERIC_TYPES = {"INTEGER", "REAL"}
+
+
+def tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", (text or "").lower().replace("'", ""))
+
+
+def _number(token: str) -> Optional[int]:
+    if token.isdigit():
+        return int(token)
+    return NUMBERS.get(token)
+
+
+def _variants(tokens: Tuple[str, ...]) -> Set[Tuple[str, ...]]:
+    """Phrase variants of a caption: as written, joined (sub category -> subcategory), singular and plural"""
+    variants = {tokens}
+    if len(tokens) > 1:
+        variants.add(("".join(tokens),))
+    for phrase in list(variants):
+        last = phrase[-1]
+        if last.endswith("ies"):
+            variants.add(phrase[:-1] + (last[:-3] + "y",))
+        elif last.endswith("s") and len(last) > 3:
+            variants.add(phrase[:-1] + (last[:-1],))
+        elif last.endswith("y"):
+            variants.add(phrase[:-1] + (last[:-1] + "ies",))
+        else:
+            variants.add(phrase[:-1] + (last + "s",))
+    return variants
+
+
+class FieldIndex:
+    """
+    Maps the phrases of a question to the fields of a data source: captions with their singular, plural
+    and joined forms plus optional synonyms, along with each field's role (measure, dimension or date)
+    and default aggregation.
+
+    Args:
+        fields (Dict[str, Dict[str, Any]]): Field properties by caption: "role" and "function", the default
+            aggregation of a measure or None when it cannot be aggregated by a plain function.
+        synonyms (Optional[Dict[str, List[str]]]): Additional phrases by caption, such as
+            {"Sales": ["revenue"], "Customer Name": ["customer"]}.
+    """
+
+    def __init__(self, fields: Dict[str, Dict[str, Any]], synonyms: Optional[Dict[str, List[str]]] = None):
+        self.fields = fields
+        self.phrases: Dict[Tuple[str, ...], Set[str]] = {}
+        for caption in fields:
+            names = [caption] + list((synonyms or {}).get(caption, []))
+            for name in names:
+                tokens = tuple(tokenize(name))
+                if not tokens:
+                    continue
+                for phrase in _variants(tokens):
+                    self.phrases.setdefault(phrase, set()).add(caption)
+        self.max_phrase = max((len(p) for p in self.phrases), default=0)
+        self.date_fields = [caption for caption, field in fields.items() if field["role"] == "date"]
+
+    @classmethod
+    def from_metadata(
+        cls,
+        data_dictionary: List[Dict[str, Any]],
+        data_model: List[Dict[str, Any]],
+        synonyms: Optional[Dict[str, List[str]]] = None
+    ) -> "FieldIndex":
+        """Builds the index from the `data_dictionary` and `data_model` keys of `get_datasource_metadata`"""
+        catalog = {f.get("name"): f for f in data_dictionary or [] if f.get("name")}
+        fields = {}
+        for field in data_model or []:
+            caption = field.get("fieldCaption")
+            if not caption:
+                continue
+            data_type = field.get("dataType") or catalog.get(caption, {}).get("dataType") or "UNKNOWN"
+            entry = catalog.get(caption, {})
+            if data_type in DATE_TYPES:
+                role = "date"
+            elif entry.get("role"):
+                role = "measure" if str(entry["role"]).upper() == "MEASURE" else "dimension"
+            else:
+                role = "measure" if data_type in NUMERIC_TYPES else "dimension"
+            aggregation = str(entry.get("aggregation") or "").lower()
+            if aggregation:
+                function = DEFAULT_FUNCTIONS.get(aggregation)
+            else:
+                # calculations such as ratios must not be summed, their aggregation is left to the LLM
+                function = None if entry.get("formula") else "SUM"
+            fields[caption] = {"role": role, "function": function}
+        return cls(fields, synonyms)
+
+    def match(self, tokens: List[str], start: int) -> Optional[Tuple[int, Set[str]]]:
+        """Longest phrase starting at `start`: its length in tokens and the captions it may refer to"""
+        for length in range(min(self.max_phrase, len(tokens) - start), 0, -1):
+            captions = self.phrases.get(tuple(tokens[start:start + length]))
+            if captions:
+                return length, captions
+        return None
+
+
+def _period(tokens: List[str], i: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """Date filter phrase at `i`: tokens consumed and the filter, without its field"""
+    token = tokens[i]
+    following = tokens[i + 1] if i + 1 < len(tokens) else None
+
+    if token in ("ytd", "qtd", "mtd"):
+        unit = {"ytd": "YEARS", "qtd": "QUARTERS", "mtd": "MONTHS"}[token]
+        return 1, {"filterType": "DATE", "periodType": unit, "dateRangeType": "TODATE"}
+    if following == "to" and tokens[i + 2:i + 3] == ["date"] and token in GRAINS:
+        return 3, {"filterType": "DATE", "periodType": GRAINS[token] + "S", "dateRangeType": "TODATE"}
+    if token in ("this", "current") and following in GRAINS:
+        return 2, {"filterType": "DATE", "periodType": GRAINS[following] + "S", "dateRangeType": "CURRENT"}
+    if token in ("last", "past", "previous", "prior"):
+        if following in GRAINS:
+            return 2, {"filterType": "DATE", "periodType": GRAINS[following] + "S", "dateRangeType": "LAST"}
+        count = _number(following) if following else None
+        unit = tokens[i + 2] if i + 2 < len(tokens) else None
+        if count and unit in GRAINS:
+            return 3, {"filterType": "DATE", "periodType": GRAINS[unit] + "S", "dateRangeType": "LASTN", "rangeN": count}
+    if token == "yesterday":
+        return 1, {"filterType": "DATE", "periodType": "DAYS", "dateRangeType": "LAST"}
+    if token == "today":
+        return 1, {"filterType": "DATE", "periodType": "DAYS", "dateRangeType": "CURRENT"}
+    if re.fullmatch(r"(19|20)\d\d", token):
+        return 1, {
+            "filterType": "QUANTITATIVE_DATE",
+            "quantitativeFilterType": "RANGE",
+            "minDate": f"{token}-01-01",
+            "maxDate": f"{token}-12-31"
+        }
+    return None
+
+
+def parse_question(
+    question: str,
+    index: FieldIndex,
+    default_date_field: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Parses template-shaped questions, "[top|bottom N] measure(s) by dimension(s) [by grain] [for period]",
+    into a VDS query without a model. Returns None as soon as anything is ambiguous or not understood:
+    an unknown word, a phrase matching several fields, a dimension without a measure or a date grain or
+    period when the date field cannot be determined.
+
+    Args:
+        question (str): The user question.
+        index (FieldIndex): Fields of the data source.
+        default_date_field (Optional[str]): Date field of periods and grains when the question names none
+            and the data source has several, such as "Order Date".
+
+    Returns:
+        Optional[Dict[str, Any]]: The VDS query or None to write it with the LLM.
+    """
+    tokens = tokenize(question)
+    measures: List[Tuple[str, str]] = []
+    dimensions: List[str] = []
+    date_field = None
+    grain = None
+    period = None
+    limit = None
+    direction = "TOP"
+    function = None
+
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+
+        if token in ("top", "bottom"):
+            limit = _number(tokens[i + 1]) if i + 1 < len(tokens) else None
+            if not limit:
+                return None
+            direction = token.upper()
+            i += 2
+            continue
+
+        found = _period(tokens, i)
+        if found:
+            if period is not None:
+                return None
+            consumed, period = found
+            i += consumed
+            continue
+
+        length = 2 if tuple(tokens[i:i + 2]) in AGGREGATIONS else 1
+        if tuple(tokens[i:i + length]) in AGGREGATIONS:
+            if function is not None:
+                return None
+            function = AGGREGATIONS[tuple(tokens[i:i + length])]
+            i += length
+            continue
+
+        match = index.match(tokens, i)
+        if match:
+            length, captions = match
+            if len(captions) > 1:
+                return None
+            caption = next(iter(captions))
+            role = index.fields[caption]["role"]
+            if function is not None or role == "measure":
+                if function is None:
+                    function = index.fields[caption]["function"]
+                    if function is None:
+                        return None
+                elif function == "COUNT" and role != "measure":
+                    # "number of customers" counts distinct members of a dimension
+                    function = "COUNTD"
+                measures.append((caption, function))
+                function = None
+            elif role == "date":
+                if date_field not in (None, caption):
+                    return None
+                date_field = caption
+            elif caption not in dimensions:
+                dimensions.append(caption)
+            i += length
+            continue
+
+        if token in GRAINS:
+            if grain is not None:
+                return None
+            grain = GRAINS[token]
+            i += 1
+            continue
+
+        if token in STOPWORDS:
+            i += 1
+            continue
+
+        # not understood, the LLM writes this query
+        return None
+
+    if not measures or function is not None:
+        return None
+    if limit and not dimensions:
+        return None
+
+    if (grain or period) and date_field is None:
+        date_field = default_date_field or (index.date_fields[0] if len(index.date_fields) == 1 else None)
+        if date_field is None:
+            return None
+    if date_field is not None and grain is None and period is None:
+        # "sales by order date": the grain is a guess, leave it to the LLM
+        return None
+
+    group_by = [{"fieldCaption": caption} for caption in dimensions]
+    if grain:
+        group_by.append({"fieldCaption": date_field, "function": "TRUNC_" + grain})
+    if limit:
+        order_by = [{"fieldCaption": measures[0][0], "direction": "DESC" if direction == "TOP" else "ASC"}]
+    elif grain and not dimensions:
+        order_by = [{"fieldCaption": date_field, "direction": "ASC"}]
+    elif dimensions:
+        order_by = [{"fieldCaption": measures[0][0], "direction": "DESC"}]
+    else:
+        order_by = []
+
+    return _adapt_old_request_to_new_query({
+        "columns": [{"fieldCaption": caption, "function": fn} for caption, fn in measures],
+        "groupBy": group_by,
+        "orderBy": order_by,
+        "filters": [{"field": {"fieldCaption": date_field}, **period}] if period else [],
+        "limit": limit
+    })
+
+
+class FastQueryBuilder:
+    """
+    Answers template-shaped questions without the LLM: `build` returns a VDS query when `parse_question`
+    parses the question unambiguously against the data source's fields, None otherwise.
+
+    Field indexes are built once per data source and reused by every question.
+
+    Args:
+        synonyms (Optional[Dict[str, List[str]]]): Additional phrases by field caption.
+        default_date_field (Optional[str]): Date field of periods and grains in data sources with several.
+    """
+
+    def __init__(self, synonyms: Optional[Dict[str, List[str]]] = None, default_date_field: Optional[str] = None):
+        self.synonyms = synonyms
+        self.default_date_field = default_date_field
+        self._indexes: Dict[Tuple, FieldIndex] = {}
+        self._lock = threading.Lock()
+        self.built = 0
+        self.fallbacks = 0
+
+    def index(self, metadata: Dict[str, Any]) -> FieldIndex:
+        data_model = metadata.get("data_model") or []
+        key = ((metadata.get("meta") or {}).get("datasource_luid"),) + tuple(
+            (f.get("fieldCaption"), f.get("dataType")) for f in data_model
+        )
+        with self._lock:
+            index = self._indexes.get(key)
+        if index is None:
+            index = FieldIndex.from_metadata(metadata.get("data_dictionary") or [], data_model, self.synonyms)
+            with self._lock:
+                self._indexes[key] = index
+        return index
+
+    def build(self, task: str, metadata: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Args:
+            task (str): The user question.
+            metadata (Dict[str, Any]): The keys of `get_datasource_metadata`.
+        """
+        query = parse_question(task, self.index(metadata), self.default_date_field)
+        with self._lock:
+            if query is None:
+                self.fallbacks += 1
+            else:
+                self.built += 1
+        return query
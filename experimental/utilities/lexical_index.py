@@ -0,0 +1,143 @@
+import re
+import math
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercased alphanumeric tokens, without stemming so field names and acronyms match exactly"""
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+def normalize_phrase(text: Optional[str]) -> str:
+    return " ".join(tokenize(text))
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """
+    Fuses ranked id lists with Reciprocal Rank Fusion: each id scores the sum of 1 / (k + rank) over
+    the lists it appears in. Only ranks are used, so BM25 and cosine scores need no calibration.
+    """
+    scores: Dict[str, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking, start=1):
+            scores[id_] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """
+    BM25F inverted index over documents made of weighted text fields, such as a datasource's name,
+    description and field names. Each field keeps its own postings and length normalization and
+    the per-field BM25 scores are summed with the field weights.
+
+    Phrases listed in `exact_fields` are also kept whole, so a query that is exactly a datasource or
+    field name can be recognized as a confident match (see `search`).
+
+    Args:
+        weights (Dict[str, float]): Weight of every indexed field.
+        exact_fields (Sequence[str]): Fields whose values (a string or list of strings) are matched as whole phrases.
+        k1 (float): BM25 term frequency saturation.
+        b (float): BM25 length normalization.
+    """
+
+    def __init__(
+        self,
+        weights: Dict[str, float],
+        exact_fields: Sequence[str] = (),
+        k1: float = 1.2,
+        b: float = 0.75
+    ):
+        self.weights = weights
+        self.exact_fields = tuple(exact_fields)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        # field -> term -> {doc id: term frequency}
+        self._postings: Dict[str, Dict[str, Dict[str, int]]] = {f: defaultdict(dict) for f in weights}
+        self._lengths: Dict[str, Dict[str, int]] = {f: {} for f in weights}
+        self._total_length: Dict[str, int] = {f: 0 for f in weights}
+        self._terms: Dict[str, Dict[str, List[str]]] = {}
+        # normalized phrase -> doc ids
+        self._phrases: Dict[str, set] = defaultdict(set)
+        self._doc_phrases: Dict[str, List[str]] = {}
+        self.metadata: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.metadata)
+
+    @staticmethod
+    def _values(value: Any) -> List[str]:
+        return [v for v in value if v] if isinstance(value, (list, tuple)) else [value] if value else []
+
+    def upsert(self, id_: str, fields: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Indexes a document, fields map to a string or a list of strings"""
+        with self._lock:
+            self._remove(id_)
+            self._terms[id_] = {}
+            for field in self.weights:
+                tokens = [t for value in self._values(fields.get(field)) for t in tokenize(value)]
+                for term, count in Counter(tokens).items():
+                    self._postings[field][term][id_] = count
+                self._lengths[field][id_] = len(tokens)
+                self._total_length[field] += len(tokens)
+                self._terms[id_][field] = list(set(tokens))
+            phrases = {normalize_phrase(v) for f in self.exact_fields for v in self._values(fields.get(f))}
+            for phrase in phrases:
+                self._phrases[phrase].add(id_)
+            self._doc_phrases[id_] = list(phrases)
+            self.metadata[id_] = metadata or {}
+
+    def delete(self, ids: Sequence[str]) -> None:
+        with self._lock:
+            for id_ in ids:
+                self._remove(id_)
+
+    def _remove(self, id_: str) -> None:
+        if id_ not in self._terms:
+            return
+        for field, terms in self._terms.pop(id_).items():
+            for term in terms:
+                postings = self._postings[field][term]
+                postings.pop(id_, None)
+                if not postings:
+                    del self._postings[field][term]
+            self._total_length[field] -= self._lengths[field].pop(id_, 0)
+        for phrase in self._doc_phrases.pop(id_, []):
+            self._phrases[phrase].discard(id_)
+            if not self._phrases[phrase]:
+                del self._phrases[phrase]
+        self.metadata.pop(id_, None)
+
+    def search(self, query: str, k: int = 10) -> List[Dict[str, Any]]:
+        """
+        The k best documents by BM25F score, best first, as {"id", "score", "exact", "metadata"}.
+        `exact` is set when the whole query equals one of the document's exact-match phrases.
+        """
+        terms = set(tokenize(query))
+        exact = self._phrases.get(normalize_phrase(query), set())
+        scores: Dict[str, float] = defaultdict(float)
+        with self._lock:
+            documents = len(self.metadata)
+            for field, weight in self.weights.items():
+                average = self._total_length[field] / documents if documents else 0
+                for term in terms:
+                    postings = self._postings[field].get(term)
+                    if not postings:
+                        continue
+                    idf = math.log(1 + (documents - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for id_, tf in postings.items():
+                        length = self._lengths[field][id_]
+                        norm = 1 - self.b + self.b * length / average if average else 1
+                        scores[id_] += weight * idf * tf * (self.k1 + 1) / (tf + self.k1 * norm)
+            for id_ in exact:
+                scores.setdefault(id_, 0.0)
+            ranked = sorted(scores.items(), key=lambda item: (item[0] in exact, item[1]), reverse=True)[:k]
+            return [
+                {"id": id_, "score": score, "exact": id_ in exact, "metadata": self.metadata[id_]}
+                for id_, score in ranked
+            ]
@@ -1,32 +1,31 @@
-import json
-import requests
-from typing import Dict
-from langchain_tableau.utilities.utils import http_post
+from typing import Dict, List
+from experimental.utilities.utils import http_post
+from experimental.utilities.transport import post_json, response_json
+from experimental.utilities.single_flight import single_flight
 
 
-def get_datasource_query(luid):
-    query = f"""
-    query datasourceFieldInfo {{
-        publishedDatasources(filter: {{ luid: "{luid}" }}) {{
+# fields requested for every published data source, shared by the single and bulk queries
+DATASOURCE_SELECTION = """
+          luid
           name
           description
-          owner {{
+          owner {
             name
-          }}
-          fields {{
+          }
+          fields {
             name
             isHidden
             description
-            descriptionInherited {{
+            descriptionInherited {
               attribute
               value
-            }}
+            }
             fullyQualifiedName
             __typename
-            ... on AnalyticsField {{
+            ... on AnalyticsField {
               __typename
-            }}
-            ... on ColumnField {{
+            }
+            ... on ColumnField {
               dataCategory
               role
               dataType
@@ -34,8 +33,8 @@ def get_datasource_query(luid):
               semanticRole
               aggregation
               aggregationParam
-            }}
-            ... on CalculatedField {{
+            }
+            ... on CalculatedField {
               dataCategory
               role
               dataType
@@ -46,42 +45,87 @@ def get_datasource_query(luid):
               formula
               isAutoGenerated
               hasUserReference
-            }}
-            ... on BinField {{
+            }
+            ... on BinField {
               dataCategory
               role
               dataType
               formula
               binSize
-            }}
-            ... on GroupField {{
+            }
+            ... on GroupField {
               dataCategory
               role
               dataType
               hasOther
-            }}
-            ... on CombinedSetField {{
+            }
+            ... on CombinedSetField {
               delimiter
               combinationType
-            }}
-          }}
-        }}
-      }}
+            }
+          }
+"""
+
+DATASOURCE_QUERY = """
+    query datasourceFieldInfo($luid: String!) {
+        publishedDatasources(filter: { luid: $luid }) {{DATASOURCE_SELECTION}        }
+      }
+    """.replace("{DATASOURCE_SELECTION}", DATASOURCE_SELECTION)
+
+DATASOURCES_BULK_QUERY = """
+    query datasourcesFieldInfo($luids: [String], $first: Int, $after: String) {
+        publishedDatasourcesConnection(filter: { luidWithin: $luids }, first: $first, after: $after) {
+          nodes {{DATASOURCE_SELECTION}          }
+          pageInfo {
+            hasNextPage
+            endCursor
+          }
+        }
+      }
+    """.replace("{DATASOURCE_SELECTION}", DATASOURCE_SELECTION)
+
+
+def get_datasource_query(luid: str) -> Dict:
+    """
+    GraphQL request body for the fields of one published data source, the LUID is passed as a
+    variable rather than interpolated into the query text
     """
+    return {
+        "query": DATASOURCE_QUERY,
+        "variables": {"luid": luid}
+    }
 
-    return query
 
+def format_data_dictionary(json_data: Dict, datasource_luid: str) -> Dict:
+    """Shapes a `publishedDatasources` node into the data dictionary used by the tools"""
+    # Keep the raw data as the primary source of truth
+    raw_fields = json_data.get('fields', [])
+    visible_fields = [f for f in raw_fields if not f.get('isHidden')]
 
-async def get_data_dictionary_async(api_key: str, domain: str, datasource_luid: str) -> Dict:
-    full_url = f"{domain}/api/metadata/graphql"
+    return {
+        'datasource_name': json_data.get('name'),
+        'datasource_description': json_data.get('description'),
+        'datasource_owner': (json_data.get('owner') or {}).get('name'),
+        'datasource_luid': datasource_luid,
 
-    query = get_datasource_query(datasource_luid)
+        # Raw GraphQL data - let the LLM work with full fidelity
+        'fields': visible_fields,
 
-    payload = {
-        "query": query,
-        "variables": {}
+        # Minimal helpful additions without losing data
+        'field_count': len(visible_fields),
+        'field_names': [f['name'] for f in visible_fields],
+
+        # Full raw response for power users
+        'raw_graphql_response': json_data
     }
 
+
+@single_flight
+async def get_data_dictionary_async(api_key: str, domain: str, datasource_luid: str) -> Dict:
+    full_url = f"{domain}/api/metadata/graphql"
+
+    payload = get_datasource_query(datasource_luid)
+
     headers = {
         'Content-Type': 'application/json',
         'Accept': 'application/json',
@@ -100,26 +144,7 @@ async def get_data_dictionary_async(api_key: str, domain: str, datasource_luid:
 
         json_data = response_data['data']['publishedDatasources'][0]
 
-        # Keep the raw data as the primary source of truth
-        raw_fields = json_data.get('fields', [])
-        visible_fields = [f for f in raw_fields if not f.get('isHidden')]
-
-        return {
-            'datasource_name': json_data.get('name'),
-            'datasource_description': json_data.get('description'),
-            'datasource_owner': json_data.get('owner', {}).get('name'),
-            'datasource_luid': datasource_luid,
-
-            # Raw GraphQL data - let the LLM work with full fidelity
-            'fields': visible_fields,
-
-            # Minimal helpful additions without losing data
-            'field_count': len(visible_fields),
-            'field_names': [f['name'] for f in visible_fields],
-
-            # Full raw response for power users
-            'raw_graphql_response': json_data
-        }
+        return format_data_dictionary(json_data, datasource_luid)
     else:
         error_message = (
             f"Failed to query Tableau's Metadata API. "
@@ -128,15 +153,11 @@ async def get_data_dictionary_async(api_key: str, domain: str, datasource_luid:
         raise RuntimeError(error_message)
 
 
+@single_flight
 def get_data_dictionary(api_key: str, domain: str, datasource_luid: str) -> Dict:
     full_url = f"{domain}/api/metadata/graphql"
 
-    query = get_datasource_query(datasource_luid)
-
-    payload = json.dumps({
-        "query": query,
-        "variables": {}
-    })
+    payload = get_datasource_query(datasource_luid)
 
     headers = {
         'Content-Type': 'application/json',
@@ -144,33 +165,73 @@ def get_data_dictionary(api_key: str, domain: str, datasource_luid: str) -> Dict
         'X-Tableau-Auth': api_key
     }
 
-    response = requests.post(full_url, headers=headers, data=payload)
+    response = post_json(full_url, headers, payload)
     response.raise_for_status()  # Raise an exception for bad status codes
 
-    response_data = response.json()
+    response_data = response_json(response)
     if 'errors' in response_data:
         error_message = f"GraphQL errors: {response_data['errors']}"
         raise RuntimeError(error_message)
 
     json_data = response_data['data']['publishedDatasources'][0]
 
-    # Keep the raw data as the primary source of truth
-    raw_fields = json_data.get('fields', [])
-    visible_fields = [f for f in raw_fields if not f.get('isHidden')]
-
-    return {
-        'datasource_name': json_data.get('name'),
-        'datasource_description': json_data.get('description'),
-        'datasource_owner': json_data.get('owner', {}).get('name'),
-        'datasource_luid': datasource_luid,
+    return format_data_dictionary(json_data, datasource_luid)
 
-        # Raw GraphQL data - let the LLM work with full fidelity
-        'fields': visible_fields,
 
-        # Minimal helpful additions without losing data
-        'field_count': len(visible_fields),
-        'field_names': [f['name'] for f in visible_fields],
+def get_data_dictionaries(
+    api_key: str,
+    domain: str,
+    datasource_luids: List[str],
+    *,
+    page_size: int = 50,
+    chunk_size: int = 500
+) -> Dict[str, Dict]:
+    """
+    Bulk variant of `get_data_dictionary` that fetches the dictionaries of many data sources with a
+    `luidWithin` filter, paging through the results with cursors instead of one request per data source.
+
+    Args:
+        api_key (str): The API key for authentication.
+        domain (str): The base URL of the Tableau site.
+        datasource_luids (List[str]): LUIDs of the published data sources.
+        page_size (int): Data sources per page, keep it small for data sources with many fields.
+        chunk_size (int): LUIDs sent per `luidWithin` filter.
+
+    Returns:
+        Dict[str, Dict]: Data dictionaries by LUID, LUIDs not visible to the user are absent.
+    """
+    full_url = f"{domain}/api/metadata/graphql"
 
-        # Full raw response for power users
-        'raw_graphql_response': json_data
+    headers = {
+        'Content-Type': 'application/json',
+        'Accept': 'application/json',
+        'X-Tableau-Auth': api_key
     }
+
+    luids = list(dict.fromkeys(datasource_luids))
+    dictionaries = {}
+    for start in range(0, len(luids), chunk_size):
+        cursor = None
+        while True:
+            payload = {
+                "query": DATASOURCES_BULK_QUERY,
+                "variables": {"luids": luids[start:start + chunk_size], "first": page_size, "after": cursor}
+            }
+            response = post_json(full_url, headers, payload)
+            response.raise_for_status()
+
+            response_data = response_json(response)
+            if 'errors' in response_data:
+                error_message = f"GraphQL errors: {response_data['errors']}"
+                raise RuntimeError(error_message)
+
+            connection = response_data['data']['publishedDatasourcesConnection']
+            for node in connection['nodes']:
+                dictionaries[node['luid']] = format_data_dictionary(node, node['luid'])
+
+            page_info = connection['pageInfo']
+            if not page_info['hasNextPage']:
+                break
+            cursor = page_info['endCursor']
+
+    return dictionaries
@@ -0,0 +1,180 @@
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+from experimental.utilities.metadata import get_data_dictionary, get_data_dictionaries
+from experimental.utilities.vizql_data_service import query_vds_metadata
+from experimental.utilities.transport import dumps, loads
+
+
+# bump whenever the shape of the stored outputs changes so old snapshots are ignored
+SCHEMA_VERSION = 1
+
+DATA_DICTIONARY = "data_dictionary"
+VDS_METADATA = "vds_metadata"
+
+
+def user_scope(url: str, site: str, user: str) -> str:
+    """Scope of snapshots fetched as a Tableau user, see `MetadataSnapshotStore`"""
+    return f"{url}|{site}|{user}"
+
+
+class MetadataSnapshotStore:
+    """
+    On-disk snapshots of `get_data_dictionary` and `query_vds_metadata` outputs, so that a freshly
+    started worker answers its first question without refetching metadata from Tableau.
+
+    Metadata depends on who asks: users only see the data sources and fields they are allowed to.
+    Every snapshot is therefore stored under the `scope` it was fetched as, such as `user_scope` of the
+    server, site and user, and only served to callers of the same scope. Share snapshots across users only
+    by fetching them as a service identity whose view every one of them is allowed to see.
+
+    Snapshots live in a single SQLite file keyed by (kind, scope, datasource LUID, schema version), with the
+    JSON body zlib compressed. The file is read through SQLite's memory-mapped I/O and snapshots are
+    only loaded and decoded when a data source is first asked for, then kept in memory.
+
+    A snapshot older than `validate_after` seconds is still served immediately, while a background
+    thread refetches it from the live site and replaces it if it changed.
+
+    Args:
+        path (str): SQLite database file, shared by all workers on the host.
+        validate_after (float): Age in seconds after which served snapshots are revalidated.
+        mmap_size (int): Bytes of the database file SQLite may memory map.
+    """
+
+    def __init__(self, path: str, validate_after: float = 15 * 60, mmap_size: int = 256 * 1024 * 1024):
+        self.path = path
+        self.validate_after = validate_after
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self._memory: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._validating: set = set()
+        self._validator = ThreadPoolExecutor(max_workers=1, thread_name_prefix="metadata-validate")
+
+        connection = self._connection()
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS scoped_snapshots (
+                kind TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                luid TEXT NOT NULL,
+                schema_version INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                body BLOB NOT NULL,
+                PRIMARY KEY (kind, scope, luid, schema_version)
+            )
+        """)
+        connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread, sqlite3 connections are not shared across threads"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            # WAL lets several worker processes read while one writes
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.connection = connection
+        return connection
+
+    def get(self, kind: str, scope: str, luid: str) -> Optional[Dict[str, Any]]:
+        """Returns {"value", "fetched_at"} for a snapshot, loading it from disk on first use"""
+        key = (kind, scope, luid)
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+
+        row = self._connection().execute(
+            "SELECT fetched_at, body FROM scoped_snapshots WHERE kind = ? AND scope = ? AND luid = ? AND schema_version = ?",
+            (kind, scope, luid, SCHEMA_VERSION)
+        ).fetchone()
+        if row is None:
+            return None
+
+        snapshot = {"value": loads(zlib.decompress(row[1])), "fetched_at": row[0]}
+        with self._lock:
+            self._memory[key] = snapshot
+        return snapshot
+
+    def put(self, kind: str, scope: str, luid: str, value: Dict[str, Any]) -> None:
+        """Stores a snapshot on disk and in memory"""
+        fetched_at = time.time()
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO scoped_snapshots (kind, scope, luid, schema_version, fetched_at, body) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, scope, luid, SCHEMA_VERSION, fetched_at, zlib.compress(dumps(value), 6))
+        )
+        connection.commit()
+        with self._lock:
+            self._memory[(kind, scope, luid)] = {"value": value, "fetched_at": fetched_at}
+
+    def _revalidate(self, kind: str, scope: str, luid: str, fetch: Callable[[], Dict[str, Any]]) -> None:
+        try:
+            live = fetch()
+            snapshot = self.get(kind, scope, luid)
+            if snapshot is None or dumps(snapshot["value"]) != dumps(live):
+                logging.info(f"Metadata snapshot {kind} for {luid} changed on the site, replacing it")
+            self.put(kind, scope, luid, live)
+        except Exception as e:
+            logging.warning(f"Could not validate metadata snapshot {kind} for {luid}: {e}")
+        finally:
+            with self._lock:
+                self._validating.discard((kind, scope, luid))
+
+    def get_or_fetch(self, kind: str, scope: str, luid: str, fetch: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Serves a snapshot of the scope if one exists, scheduling a background revalidation when it is older
+        than `validate_after`. Without a snapshot the live value is fetched and stored. `fetch` must run as
+        the identity `scope` names.
+        """
+        snapshot = self.get(kind, scope, luid)
+        if snapshot is None:
+            value = fetch()
+            self.put(kind, scope, luid, value)
+            return value
+
+        if time.time() - snapshot["fetched_at"] > self.validate_after:
+            key = (kind, scope, luid)
+            with self._lock:
+                stale = key not in self._validating
+                self._validating.add(key)
+            if stale:
+                self._validator.submit(self._revalidate, kind, scope, luid, fetch)
+        return snapshot["value"]
+
+    def data_dictionary(self, api_key: str, domain: str, datasource_luid: str, scope: str) -> Dict[str, Any]:
+        """`get_data_dictionary` served from the snapshots of `scope`, the identity `api_key` belongs to"""
+        return self.get_or_fetch(
+            DATA_DICTIONARY,
+            scope,
+            datasource_luid,
+            lambda: get_data_dictionary(api_key=api_key, domain=domain, datasource_luid=datasource_luid)
+        )
+
+    def vds_metadata(self, api_key: str, url: str, datasource_luid: str, scope: str) -> Dict[str, Any]:
+        """`query_vds_metadata` served from the snapshots of `scope`, the identity `api_key` belongs to"""
+        return self.get_or_fetch(
+            VDS_METADATA,
+            scope,
+            datasource_luid,
+            lambda: query_vds_metadata(api_key=api_key, url=url, datasource_luid=datasource_luid, debug=False)
+        )
+
+    def prewarm(self, api_key: str, domain: str, datasource_luids: List[str], scope: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetches the data dictionaries of many data sources with paginated bulk Metadata API queries
+        (see `get_data_dictionaries`) and stores them under `scope`, the identity `api_key` belongs to,
+        instead of one query per data source on first use. Returns the dictionaries by LUID.
+        """
+        dictionaries = get_data_dictionaries(api_key=api_key, domain=domain, datasource_luids=datasource_luids)
+        for luid, dictionary in dictionaries.items():
+            self.put(DATA_DICTIONARY, scope, luid, dictionary)
+        missing = set(datasource_luids) - set(dictionaries)
+        if missing:
+            logging.warning(f"No metadata returned for data sources {sorted(missing)}, they are not visible to this user")
+        return dictionaries
@@ -0,0 +1,157 @@
+import re
+import json
+import logging
+import threading
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from langchain_core.runnables import Runnable
+
+
+# cues in the user question that make a VDS query harder to write, by kind
+COMPLEXITY_CUES = {
+    "filter": re.compile(
+        r"\b(only|excluding|exclude|except|without|where|whose|which|that have|not in|between|above|below|"
+        r"over|under|more than|less than|at least|at most|greater|fewer)\b"
+    ),
+    "date": re.compile(
+        r"\b(today|yesterday|last|previous|next|past|current|since|until|ytd|qtd|mtd|years?|quarters?|months?|"
+        r"weeks?|days?|daily|weekly|monthly|quarterly|yearly|annual|19\d\d|20\d\d|"
+        # month names and abbreviations as whole words, "may" is left out as it is mostly the verb
+        r"jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|june?|july?|aug(?:ust)?|sept?(?:ember)?|oct(?:ober)?|"
+        r"nov(?:ember)?|dec(?:ember)?)\b"
+    ),
+    "top_n": re.compile(r"\b(top|bottom|best|worst|highest|lowest|most|least|rank\w*|largest|smallest)\b"),
+    "calculation": re.compile(
+        r"(%|\b(ratio|percent\w*|share|growth|change|margin|rate|difference|versus|vs|compared?|comparison|"
+        r"yoy|mom|running|cumulative|moving|rolling|contribution|median|distinct)\b)"
+    ),
+}
+
+# how much each kind of cue adds to the complexity score
+CUE_WEIGHTS = {"filter": 1, "date": 1, "top_n": 1, "calculation": 2}
+
+
+def query_complexity(task: str, data_model: Optional[List[Dict[str, Any]]] = None) -> Tuple[int, List[str]]:
+    """
+    Scores how hard a question is to turn into a VDS query from filter, date, top-N and calculation
+    cues in the question and from the number of fields the query writer has to choose from.
+
+    Args:
+        task (str): The user question.
+        data_model (Optional[List[Dict[str, Any]]]): Fields of the data source, as in the `data_model` prompt key.
+
+    Returns:
+        Tuple[int, List[str]]: The score and the kinds of cues found.
+    """
+    text = (task or "").lower()
+    cues = [kind for kind, pattern in COMPLEXITY_CUES.items() if pattern.search(text)]
+    score = sum(CUE_WEIGHTS[kind] for kind in cues)
+    # several cues of the same kind, such as two date ranges to compare
+    score += sum(1 for pattern in COMPLEXITY_CUES.values() if len(pattern.findall(text)) > 2)
+
+    fields = len(data_model or [])
+    if fields > 150:
+        score += 2
+    elif fields > 50:
+        score += 1
+    return score, cues
+
+
+def parse_query(content: str) -> Dict[str, Any]:
+    """Parses a model written VDS query, with or without a ```json fence"""
+    raw = (content or "").strip()
+    if raw.startswith("```"):
+        raw = "\n".join(raw.splitlines()[1:-1])
+    return json.loads(raw)
+
+
+def validate_vds_query(content: Any, captions: Iterable[str]) -> Optional[str]:
+    """
+    Checks a model written VDS query before it is sent: valid JSON, a non-empty `fields` array and
+    only field captions that exist in the data source. Returns the problem found or None.
+
+    `content` is the text written by the model or an already parsed query (a dict or a `VDSQuery`).
+    """
+    if hasattr(content, "model_dump"):
+        content = content.model_dump(exclude_none=True)
+    try:
+        query = content if isinstance(content, dict) else parse_query(content)
+    except (json.JSONDecodeError, TypeError) as e:
+        return f"not valid JSON: {e}"
+    if not isinstance(query, dict):
+        return "not a JSON object"
+
+    fields = query.get("fields")
+    if not isinstance(fields, list) or not fields:
+        return "no 'fields' array"
+
+    known = set(captions)
+    referenced = [f.get("fieldCaption") for f in fields if isinstance(f, dict) and "calculation" not in f]
+    referenced += [
+        (f.get("field") or {}).get("fieldCaption")
+        for f in query.get("filters") or []
+        if isinstance(f, dict) and "calculation" not in (f.get("field") or {})
+    ]
+    unknown = [caption for caption in referenced if caption not in known]
+    if known and unknown:
+        return f"unknown fields {unknown}"
+    return None
+
+
+class QueryWriterRouter:
+    """
+    Routes query writing between a small, fast model and a larger one.
+
+    Questions scoring below `threshold` with `query_complexity` go to `small_model`. Its answer is
+    validated with `validate_vds_query`. An invalid query, treated as low confidence, is written again by
+    `large_model`. Harder questions go straight to `large_model`. Most questions are simple, so the
+    median call gets the latency and cost of the small model without hurting accuracy on hard queries.
+
+    Args:
+        small_model (Runnable): Model for simple questions, or a structured query writer around it.
+        large_model (Runnable): Model for complex questions and escalations.
+        threshold (int): Complexity score from which questions go to the large model.
+    """
+
+    def __init__(self, small_model: Runnable, large_model: Runnable, threshold: int = 3):
+        self.small_model = small_model
+        self.large_model = large_model
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.routed = {"small": 0, "large": 0, "escalated": 0}
+
+    def _count(self, route: str) -> None:
+        with self._lock:
+            self.routed[route] += 1
+
+    def write_query(self, prompt: Runnable, inputs: Dict[str, Any]):
+        """
+        Writes a VDS query for the prompt `inputs` (the keys of `augment_datasource_metadata`).
+
+        Args:
+            prompt (Runnable): The query writing prompt, optionally followed by steps such as a rate limiter.
+            inputs (Dict[str, Any]): Prompt inputs with the `task` and `data_model` keys.
+
+        Returns:
+            The model message containing the query, or the parsed query of a structured query writer.
+        """
+        data_model = inputs.get("data_model") or []
+        score, cues = query_complexity(inputs.get("task", ""), data_model)
+        # a retry after a failed query is written by the large model
+        if score >= self.threshold or inputs.get("previous_call_error"):
+            self._count("large")
+            return (prompt | self.large_model).invoke(inputs)
+
+        try:
+            message = (prompt | self.small_model).invoke(inputs)
+            problem = validate_vds_query(getattr(message, "content", message), (f.get("fieldCaption") for f in data_model))
+        except ValueError as e:
+            # structured query writers raise as soon as the query is known to be invalid
+            problem = str(e)
+        if problem is None:
+            self._count("small")
+            return message
+
+        logging.info(f"Escalating query writing to the large model, score {score} {cues}: {problem}")
+        self._count("escalated")
+        return (prompt | self.large_model).invoke(inputs)
@@ -0,0 +1,219 @@
+import json
+import time
+import numbers
+import threading
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+from experimental.utilities.vizql_data_service import query_vds
+
+
+# functions that aggregate a field into a measure, every other field in a query is a dimension
+AGGREGATIONS = {"SUM", "AVG", "MEDIAN", "COUNT", "COUNTD", "MIN", "MAX", "STDEV", "VAR", "AGG"}
+
+# field properties that only affect the order of rows, not which rows or values are returned
+SORT_KEYS = ("sortPriority", "sortDirection")
+
+
+def canonical_json(obj: Any) -> str:
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"))
+
+
+def without_sort(field: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in field.items() if k not in SORT_KEYS}
+
+
+def is_measure(field: Dict[str, Any]) -> bool:
+    """True for aggregated fields such as {"fieldCaption": "Sales", "function": "SUM"}"""
+    return field.get("function") in AGGREGATIONS
+
+
+def column_name(field: Dict[str, Any]) -> str:
+    """
+    The key VDS uses for a field in OBJECTS rows: the alias if set, otherwise the caption wrapped in
+    its function such as "SUM(Sales)" or "YEAR(Order Date)", otherwise the caption.
+    """
+    if field.get("fieldAlias"):
+        return field["fieldAlias"]
+    if field.get("function"):
+        return f"{field['function']}({field['fieldCaption']})"
+    return field["fieldCaption"]
+
+
+def query_signature(query: Dict[str, Any]) -> Optional[str]:
+    """
+    Identifies the rows a query returns: its dimensions and filters, ignoring measures and sorting.
+    Queries sharing a signature return the same rows and can be answered by one query with the union
+    of their measures. Returns None for queries that cannot be merged.
+    """
+    fields = query.get("fields")
+    if not isinstance(fields, list) or not fields:
+        return None
+    dimensions = sorted(canonical_json(without_sort(f)) for f in fields if not is_measure(f))
+    filters = sorted(canonical_json(f) for f in query.get("filters", []) or [])
+    extra = {k: v for k, v in query.items() if k not in ("fields", "filters")}
+    return canonical_json({"dimensions": dimensions, "filters": filters, "extra": extra})
+
+
+def merge_queries(queries: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Merges queries with the same signature into one query holding every distinct measure once.
+    Sorting is removed since each caller's order is restored locally by `split_result`.
+    Returns None if two different measures would be returned under the same column name.
+    """
+    base = queries[0]
+    fields = [without_sort(f) for f in base["fields"] if not is_measure(f)]
+    measures: Dict[str, Dict[str, Any]] = {}
+    for query in queries:
+        for f in query["fields"]:
+            if not is_measure(f):
+                continue
+            measure = without_sort(f)
+            name = column_name(measure)
+            if name in measures and measures[name] != measure:
+                return None
+            measures[name] = measure
+
+    merged = {k: v for k, v in base.items() if k != "fields"}
+    merged["fields"] = fields + list(measures.values())
+    return merged
+
+
+def _sort_key(value: Any) -> Tuple:
+    """Orders numbers numerically and everything else by its text, so mixed columns never raise"""
+    if isinstance(value, numbers.Real) and not isinstance(value, bool):
+        return (0, value, "")
+    return (1, 0, str(value))
+
+
+def sort_rows(rows: List[Dict[str, Any]], query: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Orders rows by the sortPriority and sortDirection of the query fields, nulls last"""
+    sorts = sorted(
+        (f for f in query["fields"] if f.get("sortPriority") is not None),
+        key=lambda f: f["sortPriority"]
+    )
+    # stable sort from the lowest to the highest priority key
+    for f in reversed(sorts):
+        name = column_name(f)
+        descending = str(f.get("sortDirection", "ASC")).upper() == "DESC"
+        present = [r for r in rows if r.get(name) is not None]
+        missing = [r for r in rows if r.get(name) is None]
+        present.sort(key=lambda r: _sort_key(r[name]), reverse=descending)
+        rows = present + missing
+    return rows
+
+
+def split_result(result: Dict[str, Any], query: Dict[str, Any]) -> Dict[str, Any]:
+    """Projects the rows of a merged result onto the columns of one caller's query and sorts them"""
+    columns = [column_name(f) for f in query["fields"]]
+    rows = [{c: row.get(c) for c in columns} for row in result.get("data", [])]
+    return {**result, "data": sort_rows(rows, query)}
+
+
+class _Batch:
+    def __init__(self):
+        self.queries: List[Dict[str, Any]] = []
+        self.done = threading.Event()
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[BaseException] = None
+        self.measures: set = set()
+        self.finished_at = 0.0
+
+
+class VDSQueryMerger:
+    """
+    Combines compatible `query-datasource` requests into a single VDS query.
+
+    Agents often issue several tool calls in the same turn that differ only by measure, for example
+    "profit by region" and "discount by region". The first caller for a given signature (same
+    credentials, data source, dimensions and filters) waits `window` seconds for others to join,
+    then runs one query with the union of their measures and hands each caller its own columns.
+
+    Results stay available for `recent_ttl` seconds so that a follow-up query asking for a subset of
+    those measures is answered without calling VDS again.
+
+    Args:
+        window (float): Seconds the first caller waits for compatible queries to join its batch.
+        recent_ttl (float): Seconds a merged result can serve new callers. 0 disables reuse.
+        debug (bool): Passed to `query_fn`.
+        query_fn (Optional[Callable]): Callable with the `query_vds` signature returning rows as objects,
+            such as `columnar.query_vds_arrays`. Defaults to `query_vds`.
+    """
+
+    def __init__(
+        self,
+        window: float = 0.05,
+        recent_ttl: float = 5.0,
+        debug: bool = False,
+        query_fn: Optional[Callable] = None
+    ):
+        self.query_fn = query_fn or query_vds
+        self.window = window
+        self.recent_ttl = recent_ttl
+        self.debug = debug
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple, _Batch] = {}
+        self._recent: Dict[Tuple, _Batch] = {}
+
+    def query(self, api_key: str, datasource_luid: str, url: str, query: Dict[str, Any]) -> Dict[str, Any]:
+        """Same contract as `query_vds`, but may share the request with concurrent callers"""
+        signature = query_signature(query)
+        if signature is None:
+            return self.query_fn(api_key=api_key, datasource_luid=datasource_luid, url=url, query=query, debug=self.debug)
+
+        key = (api_key, url, datasource_luid, signature)
+        wanted = {canonical_json(without_sort(f)) for f in query["fields"] if is_measure(f)}
+
+        with self._lock:
+            recent = self._recent.get(key)
+            if recent and time.monotonic() - recent.finished_at < self.recent_ttl and wanted <= recent.measures:
+                return split_result(recent.result, query)
+
+            batch = self._pending.get(key)
+            # a different measure under an already used column name cannot join, it runs on its own
+            solo = batch is not None and merge_queries(batch.queries + [query]) is None
+            leader = batch is None
+            if leader:
+                batch = _Batch()
+                self._pending[key] = batch
+            if not solo:
+                batch.queries.append(query)
+
+        if solo:
+            return self.query_fn(api_key=api_key, datasource_luid=datasource_luid, url=url, query=query, debug=self.debug)
+
+        if not leader:
+            batch.done.wait()
+            if batch.error is not None:
+                raise batch.error
+            return split_result(batch.result, query)
+
+        # leader: let compatible calls join, then close the batch and run it
+        time.sleep(self.window)
+        with self._lock:
+            if self._pending.get(key) is batch:
+                del self._pending[key]
+
+        try:
+            merged = merge_queries(batch.queries)
+            batch.result = self.query_fn(
+                api_key=api_key, datasource_luid=datasource_luid, url=url, query=merged, debug=self.debug
+            )
+            batch.measures = {canonical_json(f) for f in merged["fields"] if is_measure(f)}
+            batch.finished_at = time.monotonic()
+            if self.recent_ttl > 0:
+                with self._lock:
+                    self._recent[key] = batch
+                    self._expire_recent()
+        except BaseException as e:
+            batch.error = e
+            raise
+        finally:
+            batch.done.set()
+
+        return split_result(batch.result, query)
+
+    def _expire_recent(self) -> None:
+        """Drops merged results older than recent_ttl, must hold self._lock"""
+        now = time.monotonic()
+        for key in [k for k, b in self._recent.items() if now - b.finished_at >= self.recent_ttl]:
+            del self._recent[key]
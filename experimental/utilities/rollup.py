@@ -0,0 +1,288 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable, Tuple
+
+import numpy as np
+
+from experimental.utilities.vizql_data_service import query_vds
+from experimental.utilities.query_merging import (
+    canonical_json,
+    without_sort,
+    is_measure,
+    column_name,
+    sort_rows
+)
+
+
+# measures whose value for a coarser group can be computed from the values of the finer groups
+ADDITIVE = {"SUM", "MIN", "MAX", "COUNT"}
+
+# measure properties that do not change which values are aggregated
+PRESENTATION_KEYS = ("sortPriority", "sortDirection", "maxDecimalPlaces", "fieldAlias")
+
+
+def _identity(field: Dict[str, Any]) -> str:
+    """What a measure computes, regardless of its alias, rounding and sorting"""
+    return canonical_json({k: v for k, v in field.items() if k not in PRESENTATION_KEYS})
+
+
+def augment_query(query: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Prepares a query for caching: sorting and rounding are dropped since both are applied locally
+    for each caller, and the auxiliary SUM and COUNT of every AVG measure are added so the cached
+    result can later answer the same average at a coarser grain (an AVG of averages is not the average).
+    """
+    fields = [
+        {k: v for k, v in f.items() if k != "maxDecimalPlaces"} if is_measure(f) else f
+        for f in map(without_sort, query["fields"])
+    ]
+    present = {_identity(f) for f in fields if is_measure(f)}
+    for f in query["fields"]:
+        if f.get("function") == "AVG" and "calculation" not in f:
+            for function in ("SUM", "COUNT"):
+                aux = {"fieldCaption": f["fieldCaption"], "function": function}
+                if _identity(aux) not in present:
+                    present.add(_identity(aux))
+                    fields.append(aux)
+    return {**query, "fields": fields}
+
+
+class _Entry:
+    def __init__(self, query: Dict[str, Any], rows: List[Dict[str, Any]]):
+        self.rows = rows
+        self.created_at = time.monotonic()
+        self.dimensions = {
+            canonical_json(without_sort(f)): column_name(f) for f in query["fields"] if not is_measure(f)
+        }
+        self.measures = {_identity(f): column_name(f) for f in query["fields"] if is_measure(f)}
+        self.filters = {canonical_json(f) for f in query.get("filters", []) or []}
+        self.extra = canonical_json({k: v for k, v in query.items() if k not in ("fields", "filters")})
+        self.has_top = any(f.get("filterType") == "TOP" for f in query.get("filters", []) or [])
+
+    def dimension(self, caption: str) -> Optional[str]:
+        """Column of a plain (not date-part or calculated) dimension, if cached"""
+        return self.dimensions.get(canonical_json({"fieldCaption": caption}))
+
+
+def _grain_dependent(f: Dict[str, Any], entry: _Entry) -> bool:
+    """
+    Whether a filter keeps different rows at a different level of detail: filters on aggregated or
+    calculated fields, and quantitative filters on anything but a cached dimension, such as SUM(Sales) >= 100.
+    """
+    field = f.get("field", {})
+    if "function" in field or "calculation" in field:
+        return True
+    return f.get("filterType") == "QUANTITATIVE_NUMERICAL" and entry.dimension(field.get("fieldCaption")) is None
+
+
+def plan_rollup(entry: _Entry, query: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Subsumption check: decides whether a cached result provably contains the answer to a query.
+
+    The cached result must have the same options, a subset of the query filters with the others being
+    SET filters on its dimensions (filters on aggregated values only carry over at the same grain), a superset of the query dimensions and, for every query measure,
+    either the same measure at the same grain or the ingredients to roll it up: SUM/MIN/MAX/COUNT
+    from themselves, AVG from the auxiliary SUM and COUNT, COUNTD from a cached dimension.
+    Cached results of TOP filtered queries are incomplete and never used.
+
+    Returns the plan for `rollup`, or None if VDS has to be queried.
+    """
+    if entry.has_top:
+        return None
+    if canonical_json({k: v for k, v in query.items() if k not in ("fields", "filters")}) != entry.extra:
+        return None
+
+    filters = query.get("filters", []) or []
+    if not entry.filters <= {canonical_json(f) for f in filters}:
+        return None
+    local_filters = []
+    for f in filters:
+        if canonical_json(f) in entry.filters:
+            continue
+        field = f.get("field", {})
+        column = entry.dimension(field.get("fieldCaption")) if set(field) == {"fieldCaption"} else None
+        if f.get("filterType") != "SET" or column is None:
+            return None
+        local_filters.append((column, set(f.get("values", [])), bool(f.get("exclude", False))))
+
+    group_by = []
+    for f in query["fields"]:
+        if not is_measure(f):
+            column = entry.dimensions.get(canonical_json(without_sort(f)))
+            if column is None:
+                return None
+            group_by.append((column_name(f), column))
+    # one cached row per output row: any cached measure is reused as is
+    same_grain = not local_filters and len(group_by) == len(entry.dimensions)
+    # SUM(Sales) >= 100 per (Region, Category) is not SUM(Sales) >= 100 per Region
+    if not same_grain and any(_grain_dependent(f, entry) for f in filters if canonical_json(f) in entry.filters):
+        return None
+
+    measures = []
+    for f in query["fields"]:
+        if not is_measure(f):
+            continue
+        function = f["function"]
+        cached = entry.measures.get(_identity(f))
+        plain = "calculation" not in f
+        if cached and same_grain:
+            step = ("VALUE", (cached,))
+        elif cached and function in ADDITIVE:
+            step = (function, (cached,))
+        elif plain and function == "AVG":
+            total = entry.measures.get(_identity({"fieldCaption": f["fieldCaption"], "function": "SUM"}))
+            count = entry.measures.get(_identity({"fieldCaption": f["fieldCaption"], "function": "COUNT"}))
+            if not (total and count):
+                return None
+            step = ("AVG", (total, count))
+        elif plain and function == "COUNTD" and entry.dimension(f["fieldCaption"]):
+            step = ("COUNTD", (entry.dimension(f["fieldCaption"]),))
+        else:
+            return None
+        measures.append((column_name(f),) + step + (f.get("maxDecimalPlaces"),))
+
+    return {"filters": local_filters, "group_by": group_by, "measures": measures}
+
+
+def _column(rows: List[Dict[str, Any]], name: str) -> np.ndarray:
+    return np.array([np.nan if r.get(name) is None else r[name] for r in rows], dtype=np.float64)
+
+
+def rollup(rows: List[Dict[str, Any]], plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Filters and aggregates cached rows according to a plan from `plan_rollup`"""
+    for column, values, exclude in plan["filters"]:
+        rows = [r for r in rows if (r.get(column) in values) != exclude]
+
+    # group id of every row from the tuple of its group-by values
+    groups: Dict[Tuple, int] = {}
+    ids = np.fromiter(
+        (groups.setdefault(tuple(r.get(src) for _, src in plan["group_by"]), len(groups)) for r in rows),
+        dtype=np.int64,
+        count=len(rows)
+    )
+    size = len(groups)
+
+    def total(name: str) -> np.ndarray:
+        values = _column(rows, name)
+        present = ~np.isnan(values)
+        sums = np.bincount(ids[present], weights=values[present], minlength=size)
+        seen = np.bincount(ids[present], minlength=size)
+        return np.where(seen > 0, sums, np.nan)
+
+    results = {}
+    for name, function, sources, decimals in plan["measures"]:
+        if function == "VALUE":
+            # same grain: exactly one row per group
+            results[name] = [None] * size
+            for group, r in zip(ids, rows):
+                results[name][group] = r.get(sources[0])
+            continue
+        if function == "SUM":
+            out = total(sources[0])
+        elif function == "COUNT":
+            out = np.nan_to_num(total(sources[0]))
+        elif function in ("MIN", "MAX"):
+            out = np.full(size, np.nan)
+            (np.fmin if function == "MIN" else np.fmax).at(out, ids, _column(rows, sources[0]))
+        elif function == "AVG":
+            sums, counts = total(sources[0]), total(sources[1])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                out = np.where(counts > 0, sums / counts, np.nan)
+        else:  # COUNTD of a cached dimension
+            distinct = [set() for _ in range(size)]
+            for group, r in zip(ids, rows):
+                if r.get(sources[0]) is not None:
+                    distinct[group].add(r[sources[0]])
+            out = np.array([len(d) for d in distinct], dtype=np.float64)
+
+        as_int = function in ("COUNT", "COUNTD")
+        results[name] = [
+            None if np.isnan(v) else int(v) if as_int else float(v) for v in out
+        ]
+
+    output = []
+    for key, group in groups.items():
+        row = {name: value for (name, _), value in zip(plan["group_by"], key)}
+        for name, _, _, decimals in plan["measures"]:
+            value = results[name][group]
+            row[name] = round(value, decimals) if decimals is not None and isinstance(value, float) else value
+        output.append(row)
+    return output
+
+
+def _present(rows: List[Dict[str, Any]], query: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Projects cached rows onto the caller's columns with its rounding and sorting"""
+    decimals = {column_name(f): f["maxDecimalPlaces"] for f in query["fields"] if "maxDecimalPlaces" in f}
+    columns = [column_name(f) for f in query["fields"]]
+    projected = []
+    for row in rows:
+        out = {c: row.get(c) for c in columns}
+        for c, places in decimals.items():
+            if isinstance(out[c], float):
+                out[c] = round(out[c], places)
+        projected.append(out)
+    return sort_rows(projected, query)
+
+
+class RollupCache:
+    """
+    Answers follow-up questions from previously fetched VDS results when possible.
+
+    Queries go through `query`: if a cached result for the same credentials and data source provably
+    contains the answer (see `plan_rollup`), it is computed locally with a NumPy group-by. Otherwise VDS
+    is queried through `query_fn` with auxiliary SUM/COUNT measures added for every AVG, and the result
+    is cached for later roll-ups such as "sales by region" after "sales by region and category".
+
+    Args:
+        query_fn (Optional[Callable]): Callable with the `query_vds` signature, such as
+            `VDSQueryMerger.query`. Defaults to `query_vds`.
+        max_entries (int): Maximum number of cached results, least recently used are evicted.
+        ttl (float): Seconds a cached result may answer queries, bounds how stale answers can be.
+    """
+
+    def __init__(self, query_fn: Optional[Callable] = None, max_entries: int = 64, ttl: float = 300.0):
+        self.query_fn = query_fn or query_vds
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _find(self, scope: Tuple, query: Dict[str, Any]):
+        now = time.monotonic()
+        with self._lock:
+            for key, entry in reversed(self._entries.items()):
+                if key[:3] != scope or now - entry.created_at >= self.ttl:
+                    continue
+                plan = plan_rollup(entry, query)
+                if plan is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry, plan
+            self.misses += 1
+        return None, None
+
+    def query(self, api_key: str, datasource_luid: str, url: str, query: Dict[str, Any]) -> Dict[str, Any]:
+        """Same contract as `query_vds`, answered locally when a cached result subsumes the query"""
+        if not isinstance(query.get("fields"), list):
+            return self.query_fn(api_key=api_key, datasource_luid=datasource_luid, url=url, query=query)
+
+        scope = (api_key, url, datasource_luid)
+        entry, plan = self._find(scope, query)
+        if entry is not None:
+            return {"data": _present(rollup(entry.rows, plan), query)}
+
+        augmented = augment_query(query)
+        result = self.query_fn(api_key=api_key, datasource_luid=datasource_luid, url=url, query=augmented)
+        rows = result.get("data") if isinstance(result, dict) else None
+        if not isinstance(rows, list):
+            return result
+
+        with self._lock:
+            self._entries[scope + (canonical_json(augmented),)] = _Entry(augmented, rows)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        return {**result, "data": _present(rows, query)}
@@ -0,0 +1,179 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from experimental.utilities.auth import jwt_connected_app
+
+
+def is_auth_failure(error: BaseException) -> bool:
+    """
+    Whether Tableau rejected the session token with a 401, in the error or any exception it wraps,
+    such as the RuntimeError of `query_vds` inside the error of a tool
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        response = getattr(error, "response", None)
+        if getattr(response, "status_code", None) == 401 or "Status code: 401" in str(error):
+            return True
+        error = error.__cause__ if error.__cause__ is not None or error.__suppress_context__ else error.__context__
+    return False
+
+
+class TableauSessionPool:
+    """
+    Keeps Tableau REST API sessions obtained via a Connected App, one per (user, site, scopes).
+
+    Row-level security requires that queries run under the identity of the end user, so a single
+    service session cannot be shared across users. Signing in on every tool call is slow, so this pool
+    caches the session token for each user and only signs in again once the token approaches expiry.
+
+    Sessions are only valid on `tableau_domain`, the server the pool signs in to: send their queries
+    there. A session Tableau rejects before its TTL (see `is_auth_failure`) is dropped with `invalidate`.
+
+    The pool is bounded: least recently used sessions are evicted once `max_sessions` is reached.
+    Concurrent requests for the same key share a single sign-in and the total number of sign-ins in
+    flight at any time is limited by `max_concurrent_refresh` to avoid bursts against the auth endpoint.
+
+    Args:
+        tableau_domain (str): The domain of the Tableau Server or Tableau Online instance.
+        tableau_api (str): The version of the Tableau API to use for authentication.
+        jwt_client_id (str): The client ID used for generating the JWT.
+        jwt_secret_id (str): The key ID associated with the JWT secret.
+        jwt_secret (str): The secret key used to sign the JWT.
+        max_sessions (int): Maximum number of sessions held before evicting the least recently used.
+        session_ttl (float): Seconds a session is reused before signing in again. Tableau sessions last
+            2 hours by default, the default leaves a margin so tokens are never used right at expiry.
+        max_concurrent_refresh (int): Maximum number of sign-in requests in flight at once.
+    """
+
+    def __init__(
+        self,
+        tableau_domain: str,
+        tableau_api: str,
+        jwt_client_id: str,
+        jwt_secret_id: str,
+        jwt_secret: str,
+        *,
+        max_sessions: int = 256,
+        session_ttl: float = 110 * 60,
+        max_concurrent_refresh: int = 4,
+    ):
+        self.tableau_domain = tableau_domain
+        self.tableau_api = tableau_api
+        self.jwt_client_id = jwt_client_id
+        self.jwt_secret_id = jwt_secret_id
+        self.jwt_secret = jwt_secret
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+
+        self._sessions: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._key_locks: Dict[Tuple, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._refresh_slots = threading.BoundedSemaphore(max_concurrent_refresh)
+        self._metrics = {
+            'hits': 0,
+            'misses': 0,
+            'refreshes': 0,
+            'refresh_failures': 0,
+            'evictions': 0,
+            'invalidations': 0,
+            'refresh_seconds': 0.0,
+        }
+
+    @staticmethod
+    def _key(tableau_user: str, tableau_site: str, scopes: List[str]) -> Tuple:
+        return (tableau_user, tableau_site, tuple(sorted(scopes)))
+
+    def _lookup(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        """Returns a live session for the key and marks it as recently used, must hold self._lock"""
+        entry = self._sessions.get(key)
+        if entry and entry['expires_at'] > time.monotonic():
+            self._sessions.move_to_end(key)
+            return entry
+        return None
+
+    def get_session(self, tableau_user: str, tableau_site: str, scopes: List[str]) -> Dict[str, Any]:
+        """
+        Returns the sign-in response for the user, signing in only if no live session is pooled.
+
+        Args:
+            tableau_user (str): The username of the Tableau user to authenticate.
+            tableau_site (str): The content URL of the specific Tableau site to authenticate against.
+            scopes (List[str]): A list of scopes that define the permissions granted by the JWT.
+
+        Returns:
+            Dict[str, Any]: The response from the Tableau authentication endpoint, the same shape
+            returned by `jwt_connected_app`.
+        """
+        key = self._key(tableau_user, tableau_site, scopes)
+
+        with self._lock:
+            entry = self._lookup(key)
+            if entry:
+                self._metrics['hits'] += 1
+                return entry['session']
+            self._metrics['misses'] += 1
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # only one thread signs in per key, the others wait and reuse its session
+        with key_lock:
+            with self._lock:
+                entry = self._lookup(key)
+                if entry:
+                    return entry['session']
+
+            with self._refresh_slots:
+                started = time.monotonic()
+                try:
+                    session = jwt_connected_app(
+                        tableau_domain=self.tableau_domain,
+                        tableau_site=tableau_site,
+                        tableau_api=self.tableau_api,
+                        tableau_user=tableau_user,
+                        jwt_client_id=self.jwt_client_id,
+                        jwt_secret_id=self.jwt_secret_id,
+                        jwt_secret=self.jwt_secret,
+                        scopes=list(scopes),
+                    )
+                except Exception:
+                    with self._lock:
+                        self._metrics['refresh_failures'] += 1
+                    raise
+                elapsed = time.monotonic() - started
+
+            with self._lock:
+                self._metrics['refreshes'] += 1
+                self._metrics['refresh_seconds'] += elapsed
+                self._sessions[key] = {
+                    'session': session,
+                    'expires_at': time.monotonic() + self.session_ttl,
+                }
+                self._sessions.move_to_end(key)
+                while len(self._sessions) > self.max_sessions:
+                    evicted, _ = self._sessions.popitem(last=False)
+                    self._key_locks.pop(evicted, None)
+                    self._metrics['evictions'] += 1
+
+        return session
+
+    def get_token(self, tableau_user: str, tableau_site: str, scopes: List[str]) -> str:
+        """Returns the X-Tableau-Auth token for the user, see `get_session`"""
+        return self.get_session(tableau_user, tableau_site, scopes)['credentials']['token']
+
+    def invalidate(self, tableau_user: str, tableau_site: str, scopes: List[str]) -> None:
+        """Drops a pooled session, for example after Tableau rejected its token with a 401"""
+        key = self._key(tableau_user, tableau_site, scopes)
+        with self._lock:
+            if self._sessions.pop(key, None) is not None:
+                self._metrics['invalidations'] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Returns a snapshot of pool counters and the number of sessions currently held"""
+        with self._lock:
+            snapshot = dict(self._metrics)
+            snapshot['sessions'] = len(self._sessions)
+        lookups = snapshot['hits'] + snapshot['misses']
+        snapshot['hit_rate'] = snapshot['hits'] / lookups if lookups else 0.0
+        return snapshot
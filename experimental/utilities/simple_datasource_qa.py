@@ -2,18 +2,45 @@ import os
 import json
 import re
 import logging
-from typing import Dict, Optional
+from typing import Any, Callable, Dict, Mapping, Optional
 from dotenv import load_dotenv
 
-from experimental.utilities.vizql_data_service import query_vds, query_vds_metadata
-from experimental.utilities.utils import json_to_markdown_table
+from experimental.utilities.vizql_data_service import query_vds, query_vds_metadata, query_vds_stream, to_vds_query
+from experimental.utilities.utils import json_to_markdown_table, batches_to_markdown_table
 from experimental.utilities.metadata import get_data_dictionary
+from experimental.utilities.columnar import ColumnarResult
+from experimental.utilities.query_merging import column_name
 
 
 import json
 import logging
 
-def get_headlessbi_data(payload, url: str, api_key: str, datasource_luid: str):
+def get_headlessbi_data(
+    payload,
+    url: str,
+    api_key: str,
+    datasource_luid: str,
+    query_fn: Optional[Callable] = None,
+    max_rows: Optional[int] = None,
+    field_types: Optional[Dict[str, str]] = None,
+    stream_fn: Optional[Callable] = None
+):
+    """
+    Queries VDS with a model written payload and renders the rows as a markdown table.
+
+    `query_fn` replaces `query_vds` with any callable of the same signature, such as
+    `VDSQueryMerger.query` or `RollupCache.query`.
+
+    With `max_rows`, the response is streamed in the ARRAYS format with `stream_fn` (default
+    `query_vds_stream`) instead of `query_fn` and rendered as it downloads. Reading stops after `max_rows`
+    rows, one more row is read to tell whether the result was truncated, so very large results never have
+    to be held in memory.
+
+    With `field_types` (see `field_types_from_metadata`) and no `query_fn`, rows are requested in the
+    ARRAYS format and decoded into typed column buffers, which is smaller and faster to parse than
+    OBJECTS for wide results. Legacy request payloads are translated here with `field_types` as well,
+    so typed filters (null tests, strict bounds on INTEGER fields) work on every query path.
+    """
     # 1) Normalize payload to a dict
     if isinstance(payload, str):
         raw = payload.strip()
@@ -29,7 +56,46 @@ def get_headlessbi_data(payload, url: str, api_key: str, datasource_luid: str):
 
     # 2) Single call to query_vds
     try:
-        headlessbi_data = query_vds(
+        payload = to_vds_query(payload, field_types)
+
+        if max_rows is not None:
+            truncated = []
+
+            def budgeted(batches):
+                remaining = max_rows
+                for batch in batches:
+                    if len(batch) > remaining:
+                        truncated.append(True)
+                        batch = batch[:remaining]
+                    remaining -= len(batch)
+                    if batch:
+                        yield batch
+
+            markdown_table = batches_to_markdown_table(budgeted((stream_fn or query_vds_stream)(
+                api_key=api_key,
+                datasource_luid=datasource_luid,
+                url=url,
+                query=payload,
+                max_rows=max_rows + 1,
+                return_format="ARRAYS"
+            )), columns=[column_name(f) for f in payload["fields"]])
+            if truncated:
+                markdown_table += f"\nResult truncated to the first {max_rows} rows.\n"
+            return markdown_table
+
+        if field_types is not None and query_fn is None and "fields" in payload:
+            headlessbi_data = query_vds(
+                api_key=api_key,
+                datasource_luid=datasource_luid,
+                url=url,
+                query=payload,
+                return_format="ARRAYS"
+            )
+            if not headlessbi_data or 'data' not in headlessbi_data:
+                raise ValueError("Invalid or empty response from query_vds")
+            return json_to_markdown_table(ColumnarResult.from_vds(headlessbi_data, payload, field_types))
+
+        headlessbi_data = (query_fn or query_vds)(
             api_key=api_key,
             datasource_luid=datasource_luid,
             url=url,
@@ -102,53 +168,51 @@ def get_values(api_key: str, url: str, datasource_luid: str, caption: str):
     return sample_values
 
 
-def augment_datasource_metadata(
-    task: str,
+def get_datasource_metadata(
     api_key: str,
     url: str,
     datasource_luid: str,
-    prompt: Dict[str, str],
-    previous_errors: Optional[str] = None,
-    previous_vds_payload: Optional[str] = None
-):
+    metadata_store=None,
+    metadata_scope: Optional[str] = None
+) -> Dict[str, Any]:
     """
-    Augment datasource metadata with additional information and format as JSON.
+    Retrieves the prompt keys describing a data source: the data dictionary from the Metadata API,
+    name/description/owner under 'meta' and the data model with sample values from VDS.
 
-    This function retrieves the data dictionary and sample field values for a given
-    datasource, adds them to the provided prompt dictionary, and includes any previous
-    errors or queries for debugging purposes.
+    These keys do not depend on the user task, fetch them once to serve many questions about the
+    same data source.
 
     Args:
         api_key (str): The API key for authentication.
         url (str): The base URL for the API endpoints.
         datasource_luid (str): The unique identifier of the datasource.
-        prompt (Dict[str, str]): Initial prompt dictionary to be augmented.
-        previous_errors (Optional[str]): Any errors from previous function calls. Defaults to None.
-        previous_vds_payload (Optional[str]): The query that caused errors in previous calls. Defaults to None.
+        metadata_store (Optional[MetadataSnapshotStore]): Serves both metadata calls from on-disk
+            snapshots when available. Defaults to None, always fetching from Tableau.
+        metadata_scope (Optional[str]): Identity `api_key` belongs to, such as `user_scope`. Snapshots are
+            only shared within a scope, without one the store is not used.
 
     Returns:
-        str: A JSON string containing the augmented prompt dictionary with datasource metadata.
-
-    Note:
-        This function relies on external functions `get_data_dictionary` and `query_vds_metadata`
-        to retrieve the necessary datasource information.
+        Dict[str, Any]: The 'data_dictionary', 'meta' and 'data_model' prompt keys.
     """
-    # insert the user input as a task
-    prompt['task'] = task
+    metadata = {}
+    # snapshots of one user must never be served to another
+    scoped = {"scope": metadata_scope} if metadata_store is not None and metadata_scope else None
 
     # get dictionary for the data source from the Metadata API
-    data_dictionary = get_data_dictionary(
+    fetch_dictionary = metadata_store.data_dictionary if scoped else get_data_dictionary
+    data_dictionary = fetch_dictionary(
         api_key=api_key,
         domain=url,
-        datasource_luid=datasource_luid
+        datasource_luid=datasource_luid,
+        **(scoped or {})
     )
 
     # insert data dictionary from Tableau's Data Catalog (using new 'fields' key)
-    prompt['data_dictionary'] = data_dictionary['fields']
+    metadata['data_dictionary'] = data_dictionary['fields']
 
     # insert data source name, description and owner into 'meta' key
     # (preserve the rich metadata structure without deleting fields)
-    prompt['meta'] = {
+    metadata['meta'] = {
         'datasource_name': data_dictionary['datasource_name'],
         'datasource_description': data_dictionary['datasource_description'],
         'datasource_owner': data_dictionary['datasource_owner'],
@@ -158,10 +222,12 @@ def augment_datasource_metadata(
     }
 
     #  get sample values for fields from VDS metadata endpoint
-    datasource_metadata = query_vds_metadata(
+    fetch_vds_metadata = metadata_store.vds_metadata if scoped else query_vds_metadata
+    datasource_metadata = fetch_vds_metadata(
         api_key=api_key,
         url=url,
-        datasource_luid=datasource_luid
+        datasource_luid=datasource_luid,
+        **(scoped or {})
     )
 
     # Normalize fields: keep logicalTableId, ensure it's always present
@@ -173,16 +239,66 @@ def augment_datasource_metadata(
         normalized.append(f)
 
     # insert the data model with sample values from Tableau's VDS metadata API
-    prompt['data_model'] = normalized
+    metadata['data_model'] = normalized
 
-    # insert the data model with sample values from Tableau's VDS metadata API
-    # prompt['data_model'] = datasource_metadata['data']
+    return metadata
+
+
+def augment_datasource_metadata(
+    task: str,
+    api_key: str,
+    url: str,
+    datasource_luid: str,
+    prompt: Optional[Mapping[str, Any]] = None,
+    previous_errors: Optional[str] = None,
+    previous_vds_payload: Optional[str] = None,
+    metadata_store=None,
+    metadata_scope: Optional[str] = None
+):
+    """
+    Augment datasource metadata with additional information and format as JSON.
+
+    This function retrieves the data dictionary and sample field values for a given
+    datasource, adds them to a per-call copy of the provided prompt dictionary, and includes
+    any previous errors or queries for debugging purposes.
+
+    Args:
+        api_key (str): The API key for authentication.
+        url (str): The base URL for the API endpoints.
+        datasource_luid (str): The unique identifier of the datasource.
+        prompt (Optional[Mapping[str, Any]]): Initial prompt dictionary, it is never modified so shared
+            templates such as `vds_prompt_data` are safe to pass from concurrent calls. Omit it to only
+            obtain the per-call keys, to be layered over `vds_prompt_static`.
+        previous_errors (Optional[str]): Any errors from previous function calls. Defaults to None.
+        previous_vds_payload (Optional[str]): The query that caused errors in previous calls. Defaults to None.
+        metadata_store (Optional[MetadataSnapshotStore]): On-disk metadata snapshots, see `get_datasource_metadata`.
+        metadata_scope (Optional[str]): Identity of `api_key` the snapshots are shared within.
+
+    Returns:
+        dict: A new prompt dictionary with the task and datasource metadata.
+
+    Note:
+        This function relies on external functions `get_data_dictionary` and `query_vds_metadata`
+        to retrieve the necessary datasource information.
+    """
+    # shallow copy: per-call keys are replaced, never written into the shared template
+    prompt = dict(prompt or {})
+
+    # insert the user input as a task
+    prompt['task'] = task
+
+    # insert the data dictionary, 'meta' and data model keys for the data source
+    prompt.update(get_datasource_metadata(
+        api_key=api_key,
+        url=url,
+        datasource_luid=datasource_luid,
+        metadata_store=metadata_store,
+        metadata_scope=metadata_scope
+    ))
 
     # include previous error and query to debug in current run
-    if previous_errors:
-        prompt['previous_call_error'] = previous_errors
-    if previous_vds_payload:
-        prompt['previous_vds_payload'] = previous_vds_payload
+    prompt['previous_call_error'] = previous_errors or prompt.get('previous_call_error', {})
+    prompt['previous_vds_payload'] = previous_vds_payload or prompt.get('previous_vds_payload', {})
 
     return prompt
 
@@ -219,7 +335,9 @@ def env_vars_simple_datasource_qa(
     tableau_user=None,
     datasource_luid=None,
     model_provider=None,
-    tooling_llm_model=None
+    tooling_llm_model=None,
+    fast_llm_model=None,
+    max_rows=None
 ):
     """
     Retrieves Tableau configuration from environment variables if not provided as arguments.
@@ -234,6 +352,8 @@ def env_vars_simple_datasource_qa(
         tableau_user (str, optional): Tableau user
         datasource_luid (str, optional): Datasource LUID
         tooling_llm_model (str, optional): Tooling LLM model
+        fast_llm_model (str, optional): Smaller tooling model for simple questions, routing is off when unset
+        max_rows (int, optional): Row budget of VDS results, streamed and truncated when set
 
     Returns:
         dict: A dictionary containing all the configuration values
@@ -251,7 +371,9 @@ def env_vars_simple_datasource_qa(
         'tableau_user': tableau_user or os.environ['TABLEAU_USER'],
         'datasource_luid': datasource_luid or os.environ['DATASOURCE_LUID'],
         'model_provider': model_provider or os.environ['MODEL_PROVIDER'],
-        'tooling_llm_model': tooling_llm_model or os.environ['TOOLING_MODEL']
+        'tooling_llm_model': tooling_llm_model or os.environ['TOOLING_MODEL'],
+        'fast_llm_model': fast_llm_model or os.environ.get('TOOLING_FAST_MODEL'),
+        'max_rows': int(max_rows or os.environ.get('VDS_MAX_ROWS') or 0) or None
     }
 
     return config
@@ -0,0 +1,114 @@
+import json
+import asyncio
+import threading
+import functools
+from typing import Dict, Any, Callable, Hashable, Optional
+
+
+class _Call:
+    """One in-flight call, shared by the threads asking for the same key"""
+
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls: while a call for a key is in flight, other callers asking for
+    the same key wait for it and receive its result or exception instead of issuing their own request.
+    Nothing is kept once the call returns, so results are never stale, only shared between callers that
+    overlap in time, such as the burst of identical questions after a cache expires.
+
+    `do` serves threads and `ado` coroutines, each waiting only on calls of their own kind.
+    Shared results are the same object for every caller and must be treated as read-only.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    async def ado(self, key: Hashable, fn: Callable, *args, **kwargs) -> Any:
+        # tasks belong to one event loop, identical calls are only shared within a loop
+        key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._tasks.get(key)
+            if task is None:
+                task = asyncio.ensure_future(fn(*args, **kwargs))
+                self._tasks[key] = task
+                task.add_done_callback(lambda _: self._forget(key, task))
+                self.calls += 1
+            else:
+                self.shared += 1
+        # a cancelled caller must not cancel the call the others are waiting for
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        with self._lock:
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+
+def call_key(name: str, args: tuple, kwargs: dict) -> str:
+    """Identifies a call by function name and arguments, dicts compare by content"""
+    return json.dumps([name, args, kwargs], sort_keys=True, default=str, separators=(",", ":"))
+
+
+# shared by every function decorated with `single_flight`
+flights = SingleFlight()
+
+
+def single_flight(fn: Callable) -> Callable:
+    """
+    Decorates a function so that concurrent calls with identical arguments share one execution,
+    see `SingleFlight`. Works on plain functions called from threads and on coroutine functions.
+
+    Arguments are part of the key, including credentials such as the session token, so callers only
+    ever share results they were authorized to obtain themselves.
+    """
+    name = f"{fn.__module__}.{fn.__qualname__}"
+
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            return await flights.ado(call_key(name, args, kwargs), fn, *args, **kwargs)
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return flights.do(call_key(name, args, kwargs), fn, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,180 @@
+"""
+HTTP transport helpers shared by the Tableau REST, Metadata API and VizQL Data Service calls.
+
+Responses are negotiated in the best compression the installed decoders support (gzip and deflate
+always, brotli with `brotli`, zstd with `zstandard` under urllib3 2) and JSON is encoded and decoded
+with `orjson` when installed, falling back to the standard library. Metadata API responses for large data sources are
+multiple MB of highly repetitive JSON, which compresses about 10x on the wire.
+"""
+import gzip
+import json
+import time
+import importlib.util
+from typing import Dict, Any, Optional, Union
+
+import requests
+
+try:
+    import orjson
+except ImportError:  # optional, standard library json is used instead
+    orjson = None
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def _urllib3_zstd() -> bool:
+    """urllib3 2 decodes zstd when `zstandard` is installed, urllib3 1 never does"""
+    try:
+        from urllib3.response import HAS_ZSTD
+    except ImportError:
+        return False
+    return bool(HAS_ZSTD)
+
+
+_BROTLI = _installed("brotli") or _installed("brotlicffi")
+_ZSTD = _urllib3_zstd()
+
+# content codings requests (urllib3) can decode in this environment, best first
+ACCEPT_ENCODING = ", ".join(
+    (["zstd"] if _ZSTD else []) + (["br"] if _BROTLI else []) + ["gzip", "deflate"]
+)
+
+# aiohttp decodes brotli when installed, but not zstd
+AIOHTTP_ACCEPT_ENCODING = ", ".join((["br"] if _BROTLI else []) + ["gzip", "deflate"])
+
+# request bodies smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+
+
+def dumps(obj: Any) -> bytes:
+    """Serializes to compact JSON bytes, with orjson when installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Parses JSON from bytes or text, with orjson when installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def json_request(
+    headers: Optional[Dict[str, str]],
+    payload: Any,
+    *,
+    compress_request: bool = False,
+    accept_encoding: str = ACCEPT_ENCODING
+):
+    """
+    Builds the headers and body of a JSON request: the body is serialized once with the fast
+    codec and, if `compress_request` is set and the body is large enough, gzip compressed.
+    Only enable request compression for endpoints known to accept `Content-Encoding: gzip`.
+    """
+    headers = dict(headers or {})
+    headers.setdefault("Content-Type", "application/json")
+    headers.setdefault("Accept-Encoding", accept_encoding)
+
+    body = dumps(payload)
+    if compress_request and len(body) >= COMPRESS_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return headers, body
+
+
+def post_json(
+    url: str,
+    headers: Optional[Dict[str, str]],
+    payload: Any,
+    *,
+    timeout: Optional[float] = None,
+    compress_request: bool = False,
+    stream: bool = False
+) -> requests.Response:
+    """
+    Drop-in for `requests.post(url, headers=headers, json=payload)` with compressed responses
+    negotiated explicitly and the body encoded by the fast codec. Decode with `response_json`.
+    """
+    headers, body = json_request(headers, payload, compress_request=compress_request)
+    return requests.post(url, headers=headers, data=body, timeout=timeout, stream=stream)
+
+
+def response_json(response: requests.Response) -> Any:
+    """Parses a response body (already decompressed by urllib3) with the fast codec"""
+    return loads(response.content)
+
+
+def benchmark_codecs(payload: Any, rounds: int = 20) -> Dict[str, Dict[str, float]]:
+    """
+    Compares JSON codecs and content codings on a payload, such as a Metadata API response.
+
+    Returns per codec the encode/decode time in milliseconds and per coding the compressed size
+    ratio and compression time, only for the libraries installed here.
+    """
+    results: Dict[str, Dict[str, float]] = {}
+
+    codecs = {"json": (lambda o: json.dumps(o).encode("utf-8"), json.loads)}
+    if orjson is not None:
+        codecs["orjson"] = (orjson.dumps, orjson.loads)
+    for name, (encode, decode) in codecs.items():
+        started = time.perf_counter()
+        for _ in range(rounds):
+            body = encode(payload)
+        encoded = time.perf_counter()
+        for _ in range(rounds):
+            decode(body)
+        decoded = time.perf_counter()
+        results[name] = {
+            "encode_ms": (encoded - started) * 1000 / rounds,
+            "decode_ms": (decoded - encoded) * 1000 / rounds,
+            "bytes": len(body),
+        }
+
+    raw = dumps(payload)
+    compressors = {"gzip": lambda b: gzip.compress(b, compresslevel=5)}
+    if _BROTLI:
+        brotli = importlib.import_module("brotli" if _installed("brotli") else "brotlicffi")
+        compressors["br"] = lambda b: brotli.compress(b, quality=5)
+    if _installed("zstandard"):
+        import zstandard
+        compressors["zstd"] = zstandard.ZstdCompressor(level=3).compress
+    for name, compress in compressors.items():
+        started = time.perf_counter()
+        compressed = compress(raw)
+        results[name] = {
+            "ratio": len(raw) / max(len(compressed), 1),
+            "compress_ms": (time.perf_counter() - started) * 1000,
+            "bytes": len(compressed),
+        }
+
+    return results
+
+
+if __name__ == "__main__":
+    # synthetic Metadata API response shaped like a wide published data source
+    sample = {
+        "data": {
+            "publishedDatasources": [{
+                "name": "Superstore",
+                "fields": [
+                    {
+                        "name": f"Field {i}",
+                        "isHidden": False,
+                        "description": "Sales amount in USD before discounts and returns",
+                        "fullyQualifiedName": f"[Orders].[Field {i}]",
+                        "__typename": "ColumnField",
+                        "dataCategory": "QUANTITATIVE",
+                        "role": "MEASURE",
+                        "dataType": "REAL",
+                        "aggregation": "Sum",
+                    }
+                    for i in range(5000)
+                ],
+            }]
+        }
+    }
+    for name, stats in benchmark_codecs(sample).items():
+        print(f"{name:>7}: " + ", ".join(f"{k}={v:,.2f}" for k, v in stats.items()))
@@ -1,7 +1,10 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Iterable, List, TextIO
+import io
 import aiohttp
 import json
 
+from experimental.utilities.transport import json_request, loads, AIOHTTP_ACCEPT_ENCODING
+
 
 async def http_get(endpoint: str, headers: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
     """
@@ -14,9 +17,10 @@ async def http_get(endpoint: str, headers: Optional[Dict[str, str]] = None) -> D
     Returns:
         Dict[str, Any]: A dictionary containing the status code and either the JSON response or response text.
     """
+    headers = {"Accept-Encoding": AIOHTTP_ACCEPT_ENCODING, **(headers or {})}
     async with aiohttp.ClientSession() as session:
         async with session.get(endpoint, headers=headers) as response:
-            response_data = await response.json() if response.status == 200 else await response.text()
+            response_data = await response.json(loads=loads) if response.status == 200 else await response.text()
             return {
                 'status': response.status,
                 'data': response_data
@@ -35,9 +39,10 @@ async def http_post(endpoint: str, headers: Optional[Dict[str, str]] = None, pay
     Returns:
         Dict[str, Any]: A dictionary containing the status code and either the JSON response or response text.
     """
+    headers, body = json_request(headers, payload, accept_encoding=AIOHTTP_ACCEPT_ENCODING)
     async with aiohttp.ClientSession() as session:
-        async with session.post(endpoint, headers=headers, json=payload) as response:
-            response_data = await response.json() if response.status == 200 else await response.text()
+        async with session.post(endpoint, headers=headers, data=body) as response:
+            response_data = await response.json(loads=loads) if response.status == 200 else await response.text()
             return {
                 'status': response.status,
                 'data': response_data
@@ -45,6 +50,9 @@ async def http_post(endpoint: str, headers: Optional[Dict[str, str]] = None, pay
 
 
 def json_to_markdown_table(json_data):
+    # column oriented results (ColumnarResult) render directly from their typed buffers
+    if hasattr(json_data, "iter_rows"):
+        return columnar_to_markdown_table(json_data)
     if isinstance(json_data, str):
         json_data = json.loads(json_data)
     # Check if the JSON data is a list and not empty
@@ -61,3 +69,54 @@ def json_to_markdown_table(json_data):
         markdown_table += row + "\n"
 
     return markdown_table
+
+
+def batches_to_markdown_table(
+    batches: Iterable[List[Any]],
+    columns: Optional[List[str]] = None,
+    out: Optional[TextIO] = None
+) -> Optional[str]:
+    """
+    Renders rows arriving in batches, such as those yielded by `query_vds_stream`, as a markdown table.
+    Rows are rendered as they arrive and dropped, so no more than one batch is held as Python objects.
+
+    Rows are objects (OBJECTS format) or lists in the order of `columns` (ARRAYS format, `columns` is then
+    required). Lines are written to `out` when given, keeping memory flat whatever the result size,
+    otherwise the table is returned as a string.
+    """
+    buffer = io.StringIO() if out is None else out
+    headers = None
+
+    for batch in batches:
+        for entry in batch:
+            if headers is None:
+                if isinstance(entry, dict):
+                    headers = list(entry.keys())
+                elif columns is None:
+                    raise ValueError("Rows in the ARRAYS format need the column names of the query")
+                else:
+                    headers = list(columns)
+                buffer.write("| " + " | ".join(headers) + " |\n")
+                buffer.write("| " + " | ".join(['---'] * len(headers)) + " |\n")
+            values = (entry.get(header) for header in headers) if isinstance(entry, dict) else entry
+            buffer.write("| " + " | ".join(str(value) for value in values) + " |\n")
+
+    if headers is None:
+        raise ValueError("Invalid JSON data, you may have an error or if the array is empty then it was not possible to resolve the query your wrote: []")
+
+    return buffer.getvalue() if out is None else None
+
+
+def columnar_to_markdown_table(result) -> str:
+    """Renders a `ColumnarResult` as a markdown table, column names are written once"""
+    if not len(result):
+        raise ValueError("Invalid JSON data, you may have an error or if the array is empty then it was not possible to resolve the query your wrote: []")
+
+    lines = [
+        "| " + " | ".join(result.columns) + " |",
+        "| " + " | ".join(['---'] * len(result.columns)) + " |",
+    ]
+    for row in result.iter_rows():
+        lines.append("| " + " | ".join(str(value) for value in row) + " |")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,314 @@
+import os
+import json
+import threading
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+
+def normalize(vectors: Any) -> np.ndarray:
+    """Rows scaled to unit length as contiguous float32, so cosine similarity is a dot product"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return np.ascontiguousarray(vectors / norms)
+
+
+def cosine_scores(query: Any, matrix: Any) -> np.ndarray:
+    """Cosine similarity of a query vector with every row of a matrix, in one matrix product"""
+    return normalize(matrix) @ normalize(query)[0]
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first, in O(n) with argpartition rather than a full sort"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best], kind="stable")]
+
+
+class VectorIndex:
+    """
+    In-process vector index over a contiguous float32 matrix memory-mapped from disk.
+
+    Vectors are stored normalized in `vectors.f32` and ids, texts and metadata in `records.json`. Writes
+    only append: the vectors to `vectors.f32`, then one line per write to the `records.log` journal,
+    which is folded into `records.json` on compaction. On load, vectors written by an upsert whose journal
+    line never made it to disk (a crash between the two) are truncated, so rows always match records.
+
+    Searches are one matrix product with the query followed by `argpartition`, optionally restricted by
+    exact-match metadata filters such as `{"isCertified": "True", "projectName": ["Finance", "Sales"]}`.
+
+    Deletes and updates tombstone the old row; `compact` rewrites the matrix without them and runs
+    automatically once more than `compact_ratio` of the rows are dead.
+
+    Args:
+        path (str): Directory holding the index files, created if missing.
+        dimensions (Optional[int]): Vector length, taken from the first insert if not given.
+        compact_ratio (float): Fraction of dead rows that triggers compaction.
+    """
+
+    def __init__(self, path: str, dimensions: Optional[int] = None, compact_ratio: float = 0.25):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+        os.makedirs(path, exist_ok=True)
+
+        self._records: List[Optional[Dict[str, Any]]] = []
+        self.dimensions = dimensions
+        self._load()
+        self._rows = {r["id"]: i for i, r in enumerate(self._records) if r is not None}
+        self._columns: Dict[str, np.ndarray] = {}
+        self._map()
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def _records_path(self) -> str:
+        return os.path.join(self.path, "records.json")
+
+    @property
+    def _log_path(self) -> str:
+        return os.path.join(self.path, "records.log")
+
+    def _load(self) -> None:
+        """Reads the records and replays the journal, then aligns the vector file with the records"""
+        if os.path.exists(self._records_path):
+            with open(self._records_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.dimensions = state["dimensions"]
+            self._records = state["records"]
+
+        if os.path.exists(self._log_path):
+            with open(self._log_path, "rb+") as f:
+                offset = 0
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # the line being written when the process stopped
+                    if entry["row"] > len(self._records):
+                        break
+                    self.dimensions = entry.get("dimensions") or self.dimensions
+                    for i in entry.get("delete", []):
+                        self._records[i] = None
+                    # entries written before the last records.json are already part of it
+                    self._records.extend(entry.get("add", [])[len(self._records) - entry["row"]:])
+                    offset += len(line)
+                f.truncate(offset)
+
+        if self.dimensions and os.path.exists(self._vectors_path):
+            row_bytes = self.dimensions * np.dtype(np.float32).itemsize
+            size = os.path.getsize(self._vectors_path)
+            if size > len(self._records) * row_bytes:
+                with open(self._vectors_path, "rb+") as f:
+                    f.truncate(len(self._records) * row_bytes)
+            elif size < len(self._records) * row_bytes:
+                self._records = self._records[:size // row_bytes]
+                self._save_records()
+
+    def _journal(self, entry: Dict[str, Any]) -> None:
+        with open(self._log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def _map(self) -> None:
+        """(Re)maps the vector file after it changed, reads go through the OS page cache"""
+        if self.dimensions and os.path.exists(self._vectors_path) and self._records:
+            self._matrix = np.memmap(
+                self._vectors_path, dtype=np.float32, mode="r", shape=(len(self._records), self.dimensions)
+            )
+        else:
+            self._matrix = np.empty((0, self.dimensions or 0), dtype=np.float32)
+        self._alive = np.array([r is not None for r in self._records], dtype=bool)
+        self._columns = {}
+
+    def _save_records(self) -> None:
+        # write then rename so readers never see a partial file, the journal is folded into it
+        temporary = self._records_path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"dimensions": self.dimensions, "records": self._records}, f)
+        os.replace(temporary, self._records_path)
+        open(self._log_path, "w").close()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        vectors: Any,
+        texts: Optional[Sequence[str]] = None,
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None
+    ) -> None:
+        """Appends vectors, replacing existing entries with the same id"""
+        vectors = normalize(vectors)
+        if len(ids) != len(vectors):
+            raise ValueError(f"Got {len(ids)} ids for {len(vectors)} vectors")
+        with self._lock:
+            if self.dimensions is None:
+                self.dimensions = vectors.shape[1]
+            if vectors.shape[1] != self.dimensions:
+                raise ValueError(f"Expected vectors of {self.dimensions} dimensions, got {vectors.shape[1]}")
+
+            replaced = [self._rows.pop(id_) for id_ in ids if id_ in self._rows]
+            for i in replaced:
+                self._records[i] = None
+            added = [
+                {
+                    "id": id_,
+                    "text": texts[n] if texts is not None else None,
+                    "metadata": dict(metadatas[n]) if metadatas is not None else {}
+                }
+                for n, id_ in enumerate(ids)
+            ]
+            # vectors first: a journal line is only written once its rows exist
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            self._journal({"row": len(self._records), "dimensions": self.dimensions, "delete": replaced, "add": added})
+            for record in added:
+                self._rows[record["id"]] = len(self._records)
+                self._records.append(record)
+            self._after_write()
+
+    def delete(self, ids: Sequence[str]) -> None:
+        """Removes entries by id, unknown ids are ignored"""
+        with self._lock:
+            deleted = [self._rows.pop(id_) for id_ in ids if id_ in self._rows]
+            if not deleted:
+                return
+            for i in deleted:
+                self._records[i] = None
+            self._journal({"row": len(self._records), "delete": deleted})
+            self._after_write()
+
+    def _after_write(self) -> None:
+        dead = len(self._records) - len(self._rows)
+        if self._records and dead / len(self._records) > self.compact_ratio:
+            self.compact()
+        else:
+            self._map()
+
+    def compact(self) -> None:
+        """Rewrites the vector file without deleted rows"""
+        with self._lock:
+            # map rows appended since the last write as well
+            self._map()
+            keep = [i for i, r in enumerate(self._records) if r is not None]
+            vectors = np.ascontiguousarray(self._matrix[keep]) if keep else np.empty((0, self.dimensions or 0), np.float32)
+            self._matrix = None
+            temporary = self._vectors_path + ".tmp"
+            with open(temporary, "wb") as f:
+                f.write(vectors.tobytes())
+            os.replace(temporary, self._vectors_path)
+            self._records = [self._records[i] for i in keep]
+            self._rows = {r["id"]: i for i, r in enumerate(self._records)}
+            self._save_records()
+            self._map()
+
+    def get(self, ids: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """Records ({"id", "text", "metadata"}) by id, or all of them"""
+        with self._lock:
+            if ids is None:
+                return [r for r in self._records if r is not None]
+            return [self._records[self._rows[i]] for i in ids if i in self._rows]
+
+    def _column(self, key: str) -> np.ndarray:
+        """Metadata values of every row for one key, built once per key between writes"""
+        column = self._columns.get(key)
+        if column is None:
+            column = np.array([None if r is None else r["metadata"].get(key) for r in self._records], dtype=object)
+            self._columns[key] = column
+        return column
+
+    def _mask(self, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        mask = self._alive.copy()
+        for key, value in (where or {}).items():
+            values = set(value) if isinstance(value, (list, tuple, set)) else {value}
+            column = self._column(key)
+            mask &= np.fromiter((v in values for v in column), dtype=bool, count=len(column))
+        return mask
+
+    def search(
+        self,
+        vector: Any,
+        k: int = 4,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        The k most similar records to a query vector with their cosine similarity, best first.
+
+        Args:
+            vector: The query embedding.
+            k (int): Number of results.
+            where (Optional[Dict[str, Any]]): Metadata key to required value, or list of accepted values.
+        """
+        with self._lock:
+            # rows are tombstoned in place, search a snapshot of the records
+            matrix, records, mask = self._matrix, list(self._records), self._mask(where)
+        if not len(matrix) or not mask.any():
+            return []
+
+        query = normalize(vector)[0]
+        if mask.all():
+            rows = np.arange(len(matrix))
+            scores = matrix @ query
+        else:
+            rows = np.flatnonzero(mask)
+            scores = matrix[rows] @ query
+        best = top_k(scores, k)
+        return [(records[row], float(score)) for row, score in zip(rows[best], scores[best])]
+
+
+class VectorIndexRetriever(BaseRetriever):
+    """LangChain retriever over a `VectorIndex`, embedding queries with `embeddings`"""
+
+    index: Any
+    embeddings: Embeddings
+    k: int = 4
+    where: Optional[Dict[str, Any]] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        results = self.index.search(self.embeddings.embed_query(query), k=self.k, where=self.where)
+        return [
+            Document(
+                page_content=record["text"] or "",
+                metadata={**record["metadata"], "id": record["id"], "score": score}
+            )
+            for record, score in results
+        ]
+
+
+def as_where(filters: Union[Dict[str, Any], None]) -> Optional[Dict[str, Any]]:
+    """
+    Accepts Chroma style `{"key": {"$eq": v}}` / `{"key": {"$in": [...]}}` filters combined with `$and`
+    as well as plain ones. Other operators (`$ne`, `$nin`, `$gt`, `$or`...) raise ValueError.
+    """
+    if not filters:
+        return None
+    where = {}
+    for key, value in filters.items():
+        if key == "$and":
+            for clause in value:
+                where.update(as_where(clause) or {})
+        elif key.startswith("$"):
+            raise ValueError(f"Unsupported filter operator {key}, only $and, $eq and $in are supported")
+        elif isinstance(value, dict):
+            unsupported = set(value) - {"$eq", "$in"}
+            if unsupported or len(value) != 1:
+                raise ValueError(
+                    f"Unsupported filter on '{key}': {sorted(unsupported) or value}, only $eq and $in are supported"
+                )
+            where[key] = value.get("$in", value.get("$eq"))
+        else:
+            where[key] = value
+    return where
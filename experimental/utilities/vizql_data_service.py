@@ -54,85 +54,336 @@
 #         )
 #         raise RuntimeError(error_message)
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Tuple
+import re
 import json
+import codecs
 import requests
+from datetime import date, timedelta
 
+from experimental.utilities.transport import post_json, response_json
+from experimental.utilities.single_flight import single_flight
 
-def _get_caption(col_obj: Dict[str, Any]) -> Optional[str]:
+
+# aggregation and date function names accepted in legacy requests, mapped to VDS functions
+_FUNCTION_ALIASES = {
+    "SUM": "SUM", "TOTAL": "SUM",
+    "AVG": "AVG", "AVERAGE": "AVG", "MEAN": "AVG",
+    "MEDIAN": "MEDIAN",
+    "COUNT": "COUNT",
+    "COUNTD": "COUNTD", "COUNT_DISTINCT": "COUNTD", "DISTINCT_COUNT": "COUNTD",
+    "MIN": "MIN", "MAX": "MAX", "STDEV": "STDEV", "VAR": "VAR", "COLLECT": "COLLECT",
+    "YEAR": "YEAR", "QUARTER": "QUARTER", "MONTH": "MONTH", "WEEK": "WEEK", "DAY": "DAY",
+    "TRUNC_YEAR": "TRUNC_YEAR", "TRUNC_QUARTER": "TRUNC_QUARTER", "TRUNC_MONTH": "TRUNC_MONTH",
+    "TRUNC_WEEK": "TRUNC_WEEK", "TRUNC_DAY": "TRUNC_DAY",
+}
+
+# functions that keep a field a dimension: date parts and truncations
+_DATE_FUNCTIONS = {"YEAR", "QUARTER", "MONTH", "WEEK", "DAY",
+                   "TRUNC_YEAR", "TRUNC_QUARTER", "TRUNC_MONTH", "TRUNC_WEEK", "TRUNC_DAY"}
+
+# "SUM(Sales)" or "MONTH([Order Date])" column expressions
+_CALL = re.compile(r"^\s*([A-Za-z_]+)\s*\(\s*\[?(.+?)\]?\s*\)\s*$")
+
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+def _get_caption(col_obj: Any) -> Optional[str]:
     """
     Extract a field caption/name from either:
-      {"column": {"fieldCaption": "Sales"}}  or  {"fieldCaption": "Sales"}  forms.
+      {"column": {"fieldCaption": "Sales"}}  or  {"fieldCaption": "Sales"}  or  "Sales"  forms.
     """
-    if not isinstance(col_obj, dict):
+    return _get_column(col_obj)[0]
+
+
+def _function(name: Optional[str]) -> Optional[str]:
+    """VDS function for a legacy aggregation name such as "sum", "average" or "count distinct" """
+    if not name:
         return None
-    obj = col_obj.get("column", col_obj)
-    return obj.get("fieldCaption") or obj.get("caption") or obj.get("name")
+    key = re.sub(r"[\s-]+", "_", str(name).strip().upper())
+    if key not in _FUNCTION_ALIASES:
+        raise ValueError(f"Unsupported aggregation '{name}' in legacy request")
+    return _FUNCTION_ALIASES[key]
+
 
+def _get_column(col_obj: Any) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """
+    (caption, function, alias) of a legacy column, group-by or order-by entry. Functions come from a
+    "function"/"aggregation" key, a date truncation ("dateTrunc"/"truncate"/"grain": "month") or an
+    expression caption such as "SUM(Sales)".
+    """
+    if isinstance(col_obj, str):
+        obj: Dict[str, Any] = {"fieldCaption": col_obj}
+        outer: Dict[str, Any] = {}
+    elif isinstance(col_obj, dict):
+        outer = col_obj
+        inner = col_obj.get("column", col_obj)
+        obj = {"fieldCaption": inner} if isinstance(inner, str) else inner
+    else:
+        return None, None, None
+
+    caption = obj.get("fieldCaption") or obj.get("caption") or obj.get("name")
+    function = _function(outer.get("function") or outer.get("aggregation") or obj.get("function"))
+    grain = outer.get("dateTrunc") or outer.get("truncate") or outer.get("grain")
+    if grain:
+        function = _function("TRUNC_" + str(grain).strip().upper())
+    alias = outer.get("alias") or outer.get("fieldAlias") or obj.get("fieldAlias")
+
+    call = _CALL.match(caption) if isinstance(caption, str) else None
+    if call and function is None and re.sub(r"[\s-]+", "_", call.group(1).upper()) in _FUNCTION_ALIASES:
+        caption, function = call.group(2).strip(), _function(call.group(1))
+    return caption, function, alias
+
+
+def _bound(value: Any) -> Tuple[str, Any]:
+    """Filter bound as a (property suffix, value) pair: dates use minDate/maxDate, numbers min/max"""
+    if isinstance(value, str) and _ISO_DATE.match(value):
+        if value[10:].lstrip("T ").strip("0:.Z"):
+            raise ValueError(f"Date filters apply to whole days, got '{value}'")
+        return "Date", value[:10]
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            raise ValueError(f"Range filters need numbers or ISO dates, got '{value}'")
+        value = int(value) if value.is_integer() else value
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"Range filters need numbers or ISO dates, got {value!r}")
+    return "", value
+
+
+def _strict_bound(caption: str, kind: str, value: Any, data_type: Optional[str], step: int) -> Any:
+    """
+    Inclusive bound equivalent to a strict comparison, VDS bounds being inclusive: the next (`step` 1) or
+    previous (-1) day for dates and integer for INTEGER fields. Other numbers have no such bound.
+    """
+    if kind:
+        return (date.fromisoformat(value) + timedelta(days=step)).isoformat()
+    if data_type == "INTEGER" and float(value).is_integer():
+        return int(value) + step
+    raise ValueError(
+        f"Strict comparison on '{caption}' ({data_type or 'unknown type'}) has no inclusive VDS equivalent, "
+        "use >= or <="
+    )
+
+
+def _adapt_filter(legacy: Any, field_types: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    Translates a WHERE-style filter {"column": ..., "operator": ..., "value"/"values": ...} into a typed
+    VDS filter. Filters already in the VDS shape (with a "filterType") are returned unchanged.
 
-def _adapt_old_request_to_new_query(old_req: Dict[str, Any]) -> Dict[str, Any]:
+    The data type of the field ("dataType" of the filter, else `field_types` by caption) decides how null
+    tests and strict comparisons on numbers translate, both raise ValueError when it is unknown.
+    """
+    if not isinstance(legacy, dict):
+        raise ValueError(f"Unsupported filter in legacy request: {legacy!r}")
+    if "filterType" in legacy:
+        return legacy
+
+    caption, function, _ = _get_column(legacy.get("field") or legacy.get("column") or legacy)
+    if not caption:
+        raise ValueError(f"Filter without a field in legacy request: {legacy!r}")
+    field: Dict[str, Any] = {"fieldCaption": caption}
+    if function:
+        field["function"] = function
+    data_type = legacy.get("dataType") or (field_types or {}).get(caption)
+    if function in ("SUM", "AVG", "MEDIAN", "COUNT", "COUNTD", "STDEV", "VAR"):
+        # aggregations are numbers whatever the field, only counts are integers
+        data_type = "INTEGER" if function in ("COUNT", "COUNTD") else "REAL"
+
+    value = legacy.get("values", legacy.get("value"))
+    operator = str(legacy.get("operator") or legacy.get("op") or ("in" if isinstance(value, list) else "=")).strip().lower()
+    operator = re.sub(r"\s+", " ", operator)
+
+    if operator in ("is null", "is not null") or (operator in ("=", "==", "is", "!=", "<>", "is not") and value is None):
+        if data_type in ("INTEGER", "REAL"):
+            filter_type = "QUANTITATIVE_NUMERICAL"
+        elif data_type in ("DATE", "DATETIME"):
+            filter_type = "QUANTITATIVE_DATE"
+        else:
+            raise ValueError(
+                f"Null filter on '{caption}' ({data_type or 'unknown type'}): VDS only filters nulls of numbers and dates"
+            )
+        only = "ONLY_NON_NULL" if operator in ("is not null", "!=", "<>", "is not") else "ONLY_NULL"
+        return {"field": field, "filterType": filter_type, "quantitativeFilterType": only}
+
+    if operator in ("=", "==", "eq", "in", "is", "!=", "<>", "ne", "not in", "is not"):
+        return {
+            "field": field,
+            "filterType": "SET",
+            "values": value if isinstance(value, list) else [value],
+            "exclude": operator in ("!=", "<>", "ne", "not in", "is not")
+        }
+
+    if operator in (">", ">=", "gt", "gte", "<", "<=", "lt", "lte", "between"):
+        if operator == "between":
+            if not isinstance(value, list) or len(value) != 2:
+                raise ValueError(f"'between' filters need two values, got {value!r}")
+            (kind, low), (_, high) = _bound(value[0]), _bound(value[1])
+            bounds, filter_type = {"min" + kind: low, "max" + kind: high}, "RANGE"
+        else:
+            kind, bound = _bound(value)
+            lower = operator in (">", ">=", "gt", "gte")
+            if operator in (">", "gt", "<", "lt"):
+                bound = _strict_bound(caption, kind, bound, data_type, 1 if lower else -1)
+            bounds, filter_type = {("min" if lower else "max") + kind: bound}, "MIN" if lower else "MAX"
+        return {
+            "field": field,
+            "filterType": "QUANTITATIVE_DATE" if kind else "QUANTITATIVE_NUMERICAL",
+            "quantitativeFilterType": filter_type,
+            **bounds
+        }
+
+    if operator in ("like", "not like", "contains", "not contains", "starts with", "startswith",
+                    "ends with", "endswith"):
+        text = str(value)
+        if operator in ("like", "not like"):
+            starts, ends = text.endswith("%"), text.startswith("%")
+            text = text.strip("%")
+            key = "contains" if starts == ends else ("startsWith" if starts else "endsWith")
+        else:
+            key = {"starts with": "startsWith", "startswith": "startsWith",
+                   "ends with": "endsWith", "endswith": "endsWith"}.get(operator, "contains")
+        return {"field": field, "filterType": "MATCH", key: text, "exclude": operator.startswith("not")}
+
+    raise ValueError(f"Unsupported filter operator '{operator}' in legacy request")
+
+
+def _merge_ranges(filters: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Combines a MIN and a MAX filter on the same field, such as x >= a AND x <= b, into one RANGE filter"""
+    merged: List[Dict[str, Any]] = []
+    bounded: Dict[str, Dict[str, Any]] = {}
+    for f in filters:
+        if f.get("quantitativeFilterType") in ("MIN", "MAX"):
+            key = json.dumps([f["field"], f["filterType"]], sort_keys=True)
+            other = bounded.get(key)
+            if other is not None and other["quantitativeFilterType"] != f["quantitativeFilterType"]:
+                other.update({k: v for k, v in f.items() if k.startswith(("min", "max"))})
+                other["quantitativeFilterType"] = "RANGE"
+                continue
+            bounded[key] = f
+        merged.append(f)
+    return merged
+
+
+def _adapt_old_request_to_new_query(
+    old_req: Dict[str, Any],
+    field_types: Optional[Dict[str, str]] = None
+) -> Dict[str, Any]:
     """
     Convert the legacy request shape:
-      { "columns": [...], "aggregation": {...}, "groupBy": [...], "orderBy": [...], "limit": N }
+      { "columns": [...], "aggregation": {...}, "groupBy": [...], "orderBy": [...], "filters"|"where": [...], "limit": N }
     into the new VDS 'query' shape:
       { "fields": [...], "filters": [...] }
 
-    This handles the common pattern (1 dimension group-by, aggregated measures, sort+topN).
+    - groupBy entries become the leading dimension fields, in order, with their date truncation if any
+      ({"fieldCaption": "Order Date", "dateTrunc": "month"} or "MONTH(Order Date)").
+    - columns are aggregated with their own function or the `aggregation` mapping, without one they are
+      dimensions. Aggregations of fields missing from columns are added as well.
+    - every orderBy entry is applied in order as sortPriority 1, 2, ... (default direction DESC), fields only
+      used for sorting are added to the query.
+    - filters/where are translated to typed VDS filters: =, in, != and not in to SET, >=, <= and between to
+      QUANTITATIVE_NUMERICAL or QUANTITATIVE_DATE, a MIN and a MAX on one field to RANGE, like/contains/starts
+      with/ends with to MATCH, is (not) null to ONLY_(NON_)NULL on number and date fields. VDS bounds are
+      inclusive: > and < move dates by a day and INTEGER fields by one, other numbers cannot be translated.
+      A {caption: value(s)} mapping is read as equality filters and VDS shaped filters are kept as is.
+    - limit becomes a TOP filter keeping the first `limit` members of the first dimension by the first sorted
+      measure (BOTTOM when that sort is ascending), or the first measure sorted descending.
+
+    `field_types` maps field captions to their VDS data type (INTEGER, REAL, STRING, DATE...), filters may
+    also carry a "dataType". Anything that cannot be translated raises ValueError rather than being dropped.
     """
-    cols: List[Dict[str, Any]] = old_req.get("columns", []) or []
-    agg: Dict[str, str] = old_req.get("aggregation", {}) or {}
-    gb: List[Dict[str, Any]] = old_req.get("groupBy", []) or []
-    ob: List[Dict[str, Any]] = old_req.get("orderBy", []) or []
+    cols: List[Any] = old_req.get("columns", []) or []
+    gb: List[Any] = old_req.get("groupBy", []) or []
+    ob: List[Any] = old_req.get("orderBy", []) or []
+    where = old_req.get("filters", old_req.get("where")) or []
     limit = old_req.get("limit", None)
+    agg: Dict[str, str] = {caption: _function(fn) for caption, fn in (old_req.get("aggregation", {}) or {}).items()}
 
-    # Determine grouping dimension(s)
-    dim_caps: List[str] = [_get_caption(g) for g in gb if _get_caption(g)] if gb else []
-    if not dim_caps and cols:
-        first_cap = _get_caption(cols[0])
-        if first_cap:
-            dim_caps = [first_cap]
-
-    # Build fields list (dimension(s) first, then measures w/ aggregation)
     fields: List[Dict[str, Any]] = []
+
+    def add(caption: str, function: Optional[str] = None, alias: Optional[str] = None) -> Dict[str, Any]:
+        for f in fields:
+            if f["fieldCaption"] == caption and f.get("function") == function:
+                return f
+        f: Dict[str, Any] = {"fieldCaption": caption}
+        if function:
+            f["function"] = function
+        if alias:
+            f["fieldAlias"] = alias
+        fields.append(f)
+        return f
+
+    # Dimensions first, in group-by order
+    grouped = set()
+    for g in gb:
+        caption, function, alias = _get_column(g)
+        if caption:
+            add(caption, function, alias)
+            grouped.add(caption)
+
+    # Measures (and ungrouped plain columns) in column order
     for c in cols:
-        cap = _get_caption(c)
-        if not cap:
+        caption, function, alias = _get_column(c)
+        if not caption:
             continue
-        if cap in dim_caps:
-            fields.append({"fieldCaption": cap})
-        else:
-            f: Dict[str, Any] = {"fieldCaption": cap}
-            fn = agg.get(cap)
-            if fn:
-                f["function"] = fn
-            fields.append(f)
-
-    # Apply first sort (if any) to the matching field
-    if ob:
-        first = ob[0]
-        sort_cap = _get_caption(first)
-        direction = first.get("direction", "DESC")
-        for f in fields:
-            if f.get("fieldCaption") == sort_cap:
-                f["sortPriority"] = 1
-                f["sortDirection"] = direction
-                break
+        if function is None and caption not in grouped:
+            function = agg.get(caption)
+        if caption in grouped and function is None:
+            continue
+        add(caption, function, alias)
+    for caption, function in agg.items():
+        if caption not in grouped:
+            add(caption, function)
+
+    # Every ordering, in priority order
+    priority = 0
+    for o in ob:
+        caption, function, _ = _get_column(o)
+        if not caption:
+            continue
+        function = function or (agg.get(caption) if caption not in grouped else None)
+        target = next((f for f in fields if f["fieldCaption"] == caption and f.get("function") == function), None)
+        target = target or next((f for f in fields if f["fieldCaption"] == caption), None) or add(caption, function)
+        if "sortPriority" in target:
+            continue
+        direction = str((o.get("direction") or o.get("order") or "DESC") if isinstance(o, dict) else "DESC").upper()
+        priority += 1
+        target["sortPriority"] = priority
+        target["sortDirection"] = "ASC" if direction.startswith("ASC") else "DESC"
+
+    # WHERE-style filters
+    if isinstance(where, dict):
+        where = [{"column": caption, "values": value} for caption, value in where.items()]
+    filters: List[Dict[str, Any]] = _merge_ranges([_adapt_filter(f, field_types) for f in where])
 
     # Translate "limit" into a TOP filter on the first dimension by the sorted measure
-    filters: List[Dict[str, Any]] = []
-    if limit and dim_caps:
-        sort_meas = next((f for f in fields if f.get("sortPriority") == 1 and "function" in f), None)
-        if sort_meas:
-            filters.append({
-                "field": {"fieldCaption": dim_caps[0]},
-                "filterType": "TOP",
-                "howMany": limit,
-                "fieldToMeasure": {
-                    "fieldCaption": sort_meas["fieldCaption"],
-                    "function": sort_meas.get("function", "SUM"),
-                },
-                "direction": "TOP",
-            })
+    if limit:
+        dimension = next((f for f in fields if f.get("function") in (None, *_DATE_FUNCTIONS)), None)
+        measures = [f for f in fields if f.get("function") and f["function"] not in _DATE_FUNCTIONS]
+        sorted_measures = sorted((f for f in measures if "sortPriority" in f), key=lambda f: f["sortPriority"])
+        measure = sorted_measures[0] if sorted_measures else (measures[0] if measures else None)
+        if not (dimension and measure):
+            raise ValueError("A limit needs a dimension to keep the top members of and a measure to rank them by")
+        if "sortPriority" not in measure:
+            measure["sortPriority"] = priority + 1
+            measure["sortDirection"] = "DESC"
+        target = {"fieldCaption": dimension["fieldCaption"]}
+        if dimension.get("function"):
+            target["function"] = dimension["function"]
+        filters.append({
+            "field": target,
+            "filterType": "TOP",
+            "howMany": int(limit),
+            "fieldToMeasure": {
+                "fieldCaption": measure["fieldCaption"],
+                "function": measure["function"],
+            },
+            "direction": "BOTTOM" if measure["sortDirection"] == "ASC" else "TOP",
+        })
+
+    if not fields:
+        raise ValueError("Legacy request without columns, groupBy or aggregation")
 
     new_query: Dict[str, Any] = {"fields": fields}
     if filters:
@@ -140,35 +391,49 @@ def _adapt_old_request_to_new_query(old_req: Dict[str, Any]) -> Dict[str, Any]:
     return new_query
 
 
+@single_flight
+def to_vds_query(query: Dict[str, Any], field_types: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """
+    The query unchanged if it has a 'fields' array, a legacy request adapted with
+    `_adapt_old_request_to_new_query` and `field_types`, anything else raises ValueError.
+    """
+    if "fields" in query:
+        return query
+    if any(k in query for k in ("columns", "aggregation", "groupBy", "orderBy", "where", "limit")):
+        return _adapt_old_request_to_new_query(query, field_types)
+    raise ValueError(f"VDS query must include a 'fields' array. Got keys: {list(query.keys())}")
+
+
 def query_vds(
     api_key: str,
     datasource_luid: str,
     url: str,
     query: Dict[str, Any],
     *,
+    return_format: str = "OBJECTS",
     timeout: int = 60,
     debug: bool = True,
+    field_types: Optional[Dict[str, str]] = None,
 ) -> Dict[str, Any]:
     """
     POST {url}/api/v1/vizql-data-service/query-datasource
 
     Accepts either:
       - a correct VDS 'query' dict with a 'fields' array, or
-      - a legacy 'request' dict (columns/aggregation/groupBy/orderBy/limit), which will be adapted.
+      - a legacy 'request' dict (columns/aggregation/groupBy/orderBy/where/limit), which will be adapted
+        with the data types in `field_types` (see `to_vds_query`).
+
+    With return_format="ARRAYS" each row is a list of values in the order of the query fields
+    instead of an object repeating every column name, decode it with `ColumnarResult.from_vds`.
     """
     # Guard/adapter for shape
-    if "fields" not in query:
-        # If it looks like the legacy shape, adapt it
-        if any(k in query for k in ("columns", "aggregation", "groupBy", "orderBy", "limit")):
-            query = _adapt_old_request_to_new_query(query)
-        else:
-            raise ValueError(f"VDS query must include a 'fields' array. Got keys: {list(query.keys())}")
+    query = to_vds_query(query, field_types)
 
     full_url = f"{url}/api/v1/vizql-data-service/query-datasource"
     payload = {
         "datasource": {"datasourceLuid": datasource_luid},
         "query": query,
-        "options": {"returnFormat": "OBJECTS", "debug": True, "disaggregate": False},
+        "options": {"returnFormat": return_format, "debug": True, "disaggregate": False},
     }
     headers = {
         "X-Tableau-Auth": api_key,
@@ -178,10 +443,10 @@ def query_vds(
     if debug:
         print("DEBUG VDS BODY:", json.dumps(payload, indent=2)[:2000])
 
-    response = requests.post(full_url, headers=headers, json=payload, timeout=timeout)
+    response = post_json(full_url, headers, payload, timeout=timeout)
 
     if response.ok:
-        return response.json()
+        return response_json(response)
 
     error_message = (
         "Failed to query data source via Tableau VizQL Data Service. "
@@ -190,6 +455,110 @@ def query_vds(
     raise RuntimeError(error_message)
 
 
+def iter_json_array(chunks: Iterable[bytes], key: str = "data") -> Iterator[Any]:
+    """
+    Incrementally parses the elements of the array stored under `key` in a JSON object, such as
+    the "data" rows of a VDS response, from an iterable of raw byte chunks.
+
+    Only the element being decoded is held in memory, each one is yielded as soon as it is complete.
+    Stop iterating at any time to stop reading the body.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    opening = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    buffer, pos, in_array = "", 0, False
+
+    for chunk in chunks:
+        buffer = buffer[pos:] + text.decode(chunk)
+        pos = 0
+        if not in_array:
+            match = opening.search(buffer)
+            if not match:
+                continue
+            pos, in_array = match.end(), True
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # element continues in the next chunk
+            if end == len(buffer) and not isinstance(item, (dict, list, str)):
+                break  # a number or literal may continue in the next chunk
+            yield item
+            pos = end
+
+    if not in_array:
+        raise ValueError(f"No '{key}' array found in the response")
+    raise ValueError(f"Response ended before the end of the '{key}' array")
+
+
+def query_vds_stream(
+    api_key: str,
+    datasource_luid: str,
+    url: str,
+    query: Dict[str, Any],
+    *,
+    batch_size: int = 1000,
+    max_rows: Optional[int] = None,
+    return_format: str = "OBJECTS",
+    chunk_size: int = 64 * 1024,
+    timeout: int = 60,
+    debug: bool = False,
+    field_types: Optional[Dict[str, str]] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Streaming variant of `query_vds` that yields the rows of the result in batches of `batch_size`
+    while the response body is still downloading, instead of materializing the whole response.
+
+    Memory stays flat regardless of the result size and consumers (renderers, aggregators,
+    exporters) can start on the first rows right away. Once `max_rows` rows have been yielded the
+    connection is closed and the rest of the result is never read.
+    """
+    query = to_vds_query(query, field_types)
+
+    full_url = f"{url}/api/v1/vizql-data-service/query-datasource"
+    payload = {
+        "datasource": {"datasourceLuid": datasource_luid},
+        "query": query,
+        "options": {"returnFormat": return_format, "debug": True, "disaggregate": False},
+    }
+    headers = {
+        "X-Tableau-Auth": api_key,
+        "Content-Type": "application/json",
+    }
+
+    if debug:
+        print("DEBUG VDS BODY:", json.dumps(payload, indent=2)[:2000])
+
+    with post_json(full_url, headers, payload, timeout=timeout, stream=True) as response:
+        if not response.ok:
+            error_message = (
+                "Failed to query data source via Tableau VizQL Data Service. "
+                f"Status code: {response.status_code}. Response: {response.text}"
+            )
+            raise RuntimeError(error_message)
+
+        batch: List[Dict[str, Any]] = []
+        rows = 0
+        for row in iter_json_array(response.iter_content(chunk_size=chunk_size)):
+            batch.append(row)
+            rows += 1
+            if max_rows is not None and rows >= max_rows:
+                break
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+@single_flight
 def query_vds_metadata(
     api_key: str,
     datasource_luid: str,
@@ -214,10 +583,10 @@ def query_vds_metadata(
     if debug:
         print("DEBUG VDS METADATA BODY:", json.dumps(payload, indent=2))
 
-    response = requests.post(full_url, headers=headers, json=payload, timeout=timeout)
+    response = post_json(full_url, headers, payload, timeout=timeout)
 
     if response.ok:
-        return response.json()
+        return response_json(response)
 
     error_message = (
         "Failed to obtain data source metadata from VizQL Data Service. "
@@ -26,6 +26,7 @@ from langgraph.prebuilt import create_react_agent
 from langchain_tableau.tools.simple_datasource_qa import initialize_simple_datasource_qa
 from langchain_tableau.utilities.auth import jwt_connected_app
 from experimental.utilities.vizql_data_service import query_vds, query_vds_metadata
+from experimental.agents.utils.agent_utils import stream_agent_events
 
 # Optional: show where the package is actually loaded from
 import importlib.util, langchain_tableau as lct
@@ -211,22 +212,28 @@ if raw_prompt is not None:
         with st.chat_message("assistant"):
             placeholder = st.empty()
             try:
-                # Developer streaming: inspect tool events/messages
-                if dev_stream:
-                    with st.expander("🔧 Agent/Tool event stream"):
-                        final_resp = None
-                        for event in agent.stream({"messages": messages_payload}):
-                            st.write(event)  # raw chunks; useful to see tool calls & errors
-                            final_resp = event
-                        # The last chunk contains the final state; ask agent for final response too:
-                        resp = agent.invoke({"messages": messages_payload})
-                else:
-                    resp = agent.invoke(
-                        {"messages": messages_payload},
-                        config={"configurable": {"session_id": st.session_state["session_id"]}},
-                    )
-
-                answer = resp["messages"][-1].content if isinstance(resp, dict) else str(resp)
+                # Single streamed run: answer tokens are rendered as they arrive, tool events are
+                # shown in developer mode from the same stream instead of running the agent twice
+                events_box = st.expander("🔧 Agent/Tool event stream") if dev_stream else None
+                streamed, answer = "", ""
+                for event in stream_agent_events(
+                    agent,
+                    {"messages": messages_payload},
+                    config={"configurable": {"session_id": st.session_state["session_id"]}},
+                ):
+                    if event["event"] == "token":
+                        streamed += event["content"]
+                        placeholder.markdown(streamed + "▌")
+                    elif event["event"] == "message":
+                        answer = event["content"]
+                    elif event["event"] == "tool_start":
+                        # text streamed before a tool call is not the final answer
+                        streamed = ""
+                        placeholder.markdown(f"_Calling {event['name']}…_")
+                    if events_box is not None and event["event"] != "token":
+                        events_box.write(event)  # tool calls, tool results & errors
+
+                answer = answer or streamed
 
                 # If the agent returned the unhelpful fallback, run a known-good VDS query as a safety net
                 generic_fail = "persistent issue" in answer.lower() or "unable to access" in answer.lower()
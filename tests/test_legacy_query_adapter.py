@@ -0,0 +1,161 @@
+import pytest
+from hypothesis import given, strategies as st
+
+from experimental.utilities.vizql_data_service import _adapt_filter, _adapt_old_request_to_new_query, to_vds_query
+
+
+DIMENSIONS = ["Region", "Category", "Segment", "Ship Mode", "State/Province", "Customer Name"]
+MEASURES = ["Sales", "Profit", "Quantity", "Discount"]
+FIELD_TYPES = {
+    **{caption: "STRING" for caption in DIMENSIONS},
+    "Sales": "REAL", "Profit": "REAL", "Discount": "REAL", "Quantity": "INTEGER",
+    "Order Date": "DATE", "Ship Date": "DATE",
+}
+AGGREGATIONS = ["SUM", "AVG", "MIN", "MAX", "COUNTD", "sum", "average"]
+GRAINS = ["year", "quarter", "month", "week", "day"]
+
+group_bys = st.lists(
+    st.one_of(
+        st.sampled_from(DIMENSIONS),
+        st.builds(lambda grain: {"fieldCaption": "Order Date", "dateTrunc": grain}, st.sampled_from(GRAINS)),
+    ),
+    max_size=4,
+    unique_by=lambda g: g if isinstance(g, str) else g["fieldCaption"],
+)
+columns = st.lists(
+    st.builds(lambda caption, fn: {"fieldCaption": caption, "function": fn},
+              st.sampled_from(MEASURES), st.sampled_from(AGGREGATIONS)),
+    min_size=1,
+    max_size=4,
+    unique_by=lambda c: c["fieldCaption"],
+)
+directions = st.sampled_from(["ASC", "DESC", "asc", "desc"])
+
+
+def _caption(entry):
+    return entry if isinstance(entry, str) else entry["fieldCaption"]
+
+
+@given(group_bys, columns)
+def test_dimensions_lead_in_group_by_order(group_by, cols):
+    query = _adapt_old_request_to_new_query({"columns": cols, "groupBy": group_by})
+    leading = [f["fieldCaption"] for f in query["fields"][:len(group_by)]]
+    assert leading == [_caption(g) for g in group_by]
+    assert len(query["fields"]) == len(group_by) + len(cols)
+
+
+@given(group_bys, columns, st.data())
+def test_sort_priorities_follow_order_by(group_by, cols, data):
+    captions = [_caption(g) for g in group_by] + [c["fieldCaption"] for c in cols]
+    sorted_captions = data.draw(st.lists(st.sampled_from(captions), unique=True))
+    order_by = [{"fieldCaption": caption, "direction": data.draw(directions)} for caption in sorted_captions]
+
+    query = _adapt_old_request_to_new_query({"columns": cols, "groupBy": group_by, "orderBy": order_by})
+    ranked = sorted((f for f in query["fields"] if "sortPriority" in f), key=lambda f: f["sortPriority"])
+    assert [f["sortPriority"] for f in ranked] == list(range(1, len(order_by) + 1))
+    assert [f["fieldCaption"] for f in ranked] == sorted_captions
+    assert [f["sortDirection"] for f in ranked] == [o["direction"].upper() for o in order_by]
+
+
+operators = st.sampled_from([
+    "=", "in", "!=", "not in", ">", ">=", "<", "<=", "between", "like", "contains",
+    "starts with", "ends with", "is null", "is not null", "regexp", "~",
+])
+values = st.one_of(
+    st.none(),
+    st.integers(-1000, 1000),
+    st.floats(-1000, 1000, allow_nan=False),
+    st.dates().map(lambda d: d.isoformat()),
+    st.text(max_size=8),
+    st.lists(st.one_of(st.integers(-1000, 1000), st.dates().map(lambda d: d.isoformat()), st.text(max_size=8)), max_size=3),
+)
+clauses = st.builds(
+    lambda caption, operator, value: {"column": caption, "operator": operator, "value": value},
+    st.sampled_from(sorted(FIELD_TYPES)), operators, values,
+)
+
+
+@given(clauses)
+def test_each_where_clause_is_one_filter_or_an_error(clause):
+    try:
+        query = _adapt_old_request_to_new_query({"columns": ["SUM(Sales)"], "where": [clause]}, FIELD_TYPES)
+    except ValueError:
+        return
+    assert len(query["filters"]) == 1
+    assert query["filters"][0]["field"]["fieldCaption"] == clause["column"]
+
+
+@given(st.lists(clauses, max_size=6, unique_by=lambda c: c["column"]))
+def test_where_clauses_on_distinct_fields_keep_their_count(where):
+    try:
+        query = _adapt_old_request_to_new_query({"columns": ["SUM(Sales)"], "where": where}, FIELD_TYPES)
+    except ValueError:
+        return
+    assert [f["field"]["fieldCaption"] for f in query.get("filters", [])] == [c["column"] for c in where]
+
+
+@given(group_bys.filter(bool), columns, st.integers(1, 100), st.data())
+def test_limit_direction_follows_sort_direction(group_by, cols, limit, data):
+    measure = data.draw(st.sampled_from(cols))["fieldCaption"]
+    direction = data.draw(st.one_of(st.none(), directions))
+    order_by = [{"fieldCaption": measure, "direction": direction}] if direction else []
+
+    query = _adapt_old_request_to_new_query({"columns": cols, "groupBy": group_by, "orderBy": order_by, "limit": limit})
+    (top,) = [f for f in query["filters"] if f["filterType"] == "TOP"]
+    assert top["howMany"] == limit
+    assert top["field"]["fieldCaption"] == _caption(group_by[0])
+    assert top["fieldToMeasure"]["fieldCaption"] == (measure if direction else cols[0]["fieldCaption"])
+    assert top["direction"] == ("BOTTOM" if direction and direction.upper() == "ASC" else "TOP")
+
+
+def test_strict_date_bounds_exclude_the_boundary_day():
+    query = _adapt_old_request_to_new_query({
+        "columns": ["SUM(Sales)"],
+        "where": [
+            {"column": "Order Date", "operator": ">=", "value": "2023-01-01"},
+            {"column": "Order Date", "operator": "<", "value": "2024-01-01"},
+        ],
+    })
+    assert query["filters"] == [{
+        "field": {"fieldCaption": "Order Date"},
+        "filterType": "QUANTITATIVE_DATE",
+        "quantitativeFilterType": "RANGE",
+        "minDate": "2023-01-01",
+        "maxDate": "2023-12-31",
+    }]
+
+
+def test_strict_integer_bounds_move_by_one():
+    query = _adapt_old_request_to_new_query(
+        {"columns": ["SUM(Sales)"], "where": [{"column": "Quantity", "operator": ">", "value": 3}]}, FIELD_TYPES
+    )
+    assert query["filters"][0]["min"] == 4
+
+
+@pytest.mark.parametrize("field_types", [None, FIELD_TYPES])
+def test_strict_real_bounds_are_rejected(field_types):
+    with pytest.raises(ValueError):
+        _adapt_old_request_to_new_query(
+            {"columns": ["SUM(Sales)"], "where": [{"column": "Sales", "operator": ">", "value": 100}]}, field_types
+        )
+
+
+def test_limit_without_a_dimension_is_rejected():
+    with pytest.raises(ValueError):
+        _adapt_old_request_to_new_query({"columns": ["Sales"], "aggregation": {"Sales": "SUM"}, "limit": 5})
+
+
+def test_null_filters_follow_the_field_type():
+    assert _adapt_filter({"column": "Order Date", "operator": "is null"}, FIELD_TYPES)["filterType"] == "QUANTITATIVE_DATE"
+    assert _adapt_filter({"column": "Profit", "operator": "is not null"}, FIELD_TYPES)["filterType"] == "QUANTITATIVE_NUMERICAL"
+    with pytest.raises(ValueError):
+        _adapt_filter({"column": "Region", "operator": "is null"}, FIELD_TYPES)
+
+
+def test_to_vds_query_adapts_legacy_requests_with_field_types():
+    query = to_vds_query({"columns": ["Region"], "where": [{"column": "Discount", "operator": "is null"}]}, FIELD_TYPES)
+    assert query["filters"][0]["quantitativeFilterType"] == "ONLY_NULL"
+    vds = {"fields": [{"fieldCaption": "Region"}]}
+    assert to_vds_query(vds, FIELD_TYPES) is vds
+    with pytest.raises(ValueError):
+        to_vds_query({"rows": []})
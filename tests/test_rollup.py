@@ -0,0 +1,60 @@
+from experimental.utilities.rollup import _Entry, augment_query, plan_rollup, rollup
+
+
+SALES_AT_LEAST_100 = {
+    "field": {"fieldCaption": "Sales", "function": "SUM"},
+    "filterType": "QUANTITATIVE_NUMERICAL",
+    "quantitativeFilterType": "MIN",
+    "min": 100,
+}
+
+
+def _query(dimensions, filters=()):
+    fields = [{"fieldCaption": d} for d in dimensions] + [{"fieldCaption": "Sales", "function": "SUM"}]
+    return {"fields": fields, "filters": list(filters)}
+
+
+def _entry(query, rows):
+    return _Entry(augment_query(query), rows)
+
+
+def test_sum_rolls_up_to_coarser_grain():
+    entry = _entry(_query(["Region", "Category"]), [
+        {"Region": "W", "Category": "A", "SUM(Sales)": 150.0},
+        {"Region": "W", "Category": "B", "SUM(Sales)": 50.0},
+        {"Region": "E", "Category": "A", "SUM(Sales)": 20.0},
+    ])
+    plan = plan_rollup(entry, _query(["Region"]))
+    assert plan is not None
+    assert rollup(entry.rows, plan) == [{"Region": "W", "SUM(Sales)": 200.0}, {"Region": "E", "SUM(Sales)": 20.0}]
+
+
+def test_aggregate_filter_is_not_rolled_up():
+    # VDS keeps W at 200, rolling up the filtered (Region, Category) rows would give 150
+    entry = _entry(_query(["Region", "Category"], [SALES_AT_LEAST_100]), [
+        {"Region": "W", "Category": "A", "SUM(Sales)": 150.0},
+    ])
+    assert plan_rollup(entry, _query(["Region"], [SALES_AT_LEAST_100])) is None
+
+
+def test_quantitative_filter_on_measure_is_not_rolled_up():
+    discount = {"field": {"fieldCaption": "Discount"}, "filterType": "QUANTITATIVE_NUMERICAL", "min": 0.1}
+    entry = _entry(_query(["Region", "Category"], [discount]), [])
+    assert plan_rollup(entry, _query(["Region"], [discount])) is None
+
+
+def test_aggregate_filter_is_reused_at_same_grain():
+    entry = _entry(_query(["Region", "Category"], [SALES_AT_LEAST_100]), [
+        {"Region": "W", "Category": "A", "SUM(Sales)": 150.0},
+    ])
+    assert plan_rollup(entry, _query(["Category", "Region"], [SALES_AT_LEAST_100])) is not None
+
+
+def test_set_filter_on_dimension_still_rolls_up():
+    west = {"field": {"fieldCaption": "Region"}, "filterType": "SET", "values": ["W"]}
+    entry = _entry(_query(["Region", "Category"], [west]), [
+        {"Region": "W", "Category": "A", "SUM(Sales)": 150.0},
+        {"Region": "W", "Category": "B", "SUM(Sales)": 50.0},
+    ])
+    plan = plan_rollup(entry, _query(["Region"], [west]))
+    assert rollup(entry.rows, plan) == [{"Region": "W", "SUM(Sales)": 200.0}]